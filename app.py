@@ -7,13 +7,38 @@ Flask App: Hệ thống OCR và Flashcard
 import os
 import sys
 import json
+import time
+import hashlib
+import uuid
+import atexit
+import click
+import importlib.util
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, send_file, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import base64
 from io import BytesIO
 from PIL import Image
+from flashcard_store import FlashcardStore
+from ocr_pool import OCRPool, PoolFullError, PoolTimeoutError, PoolUnavailableError, default_workers
+import ocr_engine
+import image_io
+import preprocess
+from ocr_cache import OCRResultCache, image_key
+from image_hash import UploadIndex, DEFAULT_THRESHOLD, DEFAULT_SIMILARITY, dedupe_directory
+from search_index import SearchIndex
+from flashcard_index import FacetIndex, OriginalIndex, FLAG_FIELDS, normalize_original, project
+import scheduler
+from stats_index import StatsIndex
+from upload_retention import UploadRefIndex, UploadRetention, upload_name
+import thumbnails
+import metrics
+from job_queue import JobQueue, JobQueueFullError
+from translation_service import (TranslationService, TranslationError, TranslationUnavailableError,
+                                 RateLimitedError, create_backend)
 
 # Fix encoding
 if sys.platform == 'win32':
@@ -62,78 +87,32 @@ try:
 except:
     pass
 
-# Tránh conflict
+# Tránh conflict: đưa thư mục dự án xuống cuối sys.path để ưu tiên paddleocr đã cài
+# (vẫn giữ lại để worker process import được các module của dự án)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir in sys.path:
     sys.path.remove(current_dir)
+    sys.path.append(current_dir)
 
-# Import PaddleOCR sau khi đã set environment
-try:
-    from paddleocr import PaddleOCR
-    PADDLEOCR_AVAILABLE = True
-except Exception as e:
-    PADDLEOCR_AVAILABLE = False
-    print(f"⚠️  PaddleOCR not available: {e}")
-
-# Khởi tạo translator - sẽ khởi tạo lại mỗi lần sử dụng để tránh TKK token issue
-translator = None
-TRANSLATE_AVAILABLE = False
-
-def get_translator():
-    """Lấy translator instance - sử dụng deep-translator để tránh TKK token issue"""
-    global translator, TRANSLATE_AVAILABLE
-    try:
-        # Thử sử dụng deep-translator trước (ổn định hơn, không có TKK token issue)
-        try:
-            from deep_translator import GoogleTranslator
-            # Clear SSL certificate paths để tránh lỗi
-            import os
-            if 'SSL_CERT_FILE' in os.environ and 'PostgreSQL' in os.environ.get('SSL_CERT_FILE', ''):
-                os.environ.pop('SSL_CERT_FILE', None)
-            if 'REQUESTS_CA_BUNDLE' in os.environ and 'PostgreSQL' in os.environ.get('REQUESTS_CA_BUNDLE', ''):
-                os.environ.pop('REQUESTS_CA_BUNDLE', None)
-            # Khởi tạo mới mỗi lần để tránh cache issues
-            translator = GoogleTranslator(source='en', target='vi')
-            TRANSLATE_AVAILABLE = True
-            return translator
-        except ImportError:
-            print("⚠️  deep-translator not available, trying googletrans...")
-        except Exception as e:
-            print(f"⚠️  deep-translator error: {e}, trying googletrans...")
-        
-        # Fallback: sử dụng googletrans nếu deep-translator không có
-        try:
-            from googletrans import Translator
-            # Thử không chỉ định service_urls trước (đơn giản nhất)
-            new_translator = Translator()
-            translator = new_translator
-            TRANSLATE_AVAILABLE = True
-            return translator
-        except Exception as e:
-            print(f"⚠️  googletrans also failed: {e}")
-        
-        TRANSLATE_AVAILABLE = False
-        return None
-    except Exception as e:
-        translator = None
-        TRANSLATE_AVAILABLE = False
-        print(f"⚠️  Translation not available: {e}")
-        return None
-
-# Không khởi tạo ngay, sẽ khởi tạo khi cần (lazy initialization)
-# Điều này giúp tránh lỗi TKK token khi start server
-TRANSLATE_AVAILABLE = True  # Giả định có sẵn, sẽ kiểm tra khi thực sự dịch
+# Chỉ kiểm tra PaddleOCR đã cài chưa; import paddle/paddlex (vài giây) để worker OCR làm trên thread nền
+# -> server phục vụ trang ngay, GET /healthz cho biết khi nào model sẵn sàng
+PADDLEOCR_AVAILABLE = importlib.util.find_spec('paddleocr') is not None
+if not PADDLEOCR_AVAILABLE:
+    print("⚠️  PaddleOCR not available: No module named 'paddleocr'")
 
 # Dictionary API
 try:
-    from dictionary_api import get_word_info
+    from dictionary_api import get_word_info, get_word_info_many
     DICTIONARY_AVAILABLE = True
 except:
     DICTIONARY_AVAILABLE = False
     def get_word_info(word):
         return {}
+    def get_word_info_many(words):
+        return {}
 
 app = Flask(__name__)
+STARTED_AT = time.time()
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 # Tất cả lưu vào thư mục dự án (ổ D)
@@ -141,134 +120,448 @@ current_dir = Path(__file__).parent.absolute()
 app.config['UPLOAD_FOLDER'] = str(current_dir / 'uploads')
 app.config['FLASHCARD_FOLDER'] = str(current_dir / 'flashcards')
 app.config['MODEL_FOLDER'] = str(current_dir / '.paddleocr')
+app.config['CACHE_FOLDER'] = str(current_dir / '.cache')
 
 # Tạo thư mục
 Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['FLASHCARD_FOLDER']).mkdir(exist_ok=True)
 Path(app.config['MODEL_FOLDER']).mkdir(exist_ok=True)
+Path(app.config['CACHE_FOLDER']).mkdir(exist_ok=True)
 
 print(f"📁 Upload folder: {app.config['UPLOAD_FOLDER']}")
 print(f"📚 Flashcard folder: {app.config['FLASHCARD_FOLDER']}")
 print(f"🤖 Model folder: {app.config['MODEL_FOLDER']}")
 
-# Khởi tạo OCR (lazy loading)
-ocr_instance = None
+# Chạy nhiều worker process (gunicorn, xem wsgi.py): kho flashcard + trạng thái job dùng chung qua đĩa
+app.config['SHARED_STATE'] = os.environ.get('SHARED_STATE', 'false').lower() == 'true'
 
-def get_ocr():
-    """Lazy load OCR với inference model để tránh lỗi OneDNN"""
-    global ocr_instance
-    
-    # Đảm bảo OneDNN bị tắt HOÀN TOÀN
-    os.environ['FLAGS_use_mkldnn'] = 'False'
-    os.environ['FLAGS_ir_optim'] = 'False'
-    os.environ['MKLDNN_ENABLED'] = '0'
-    os.environ['FLAGS_use_mkldnn'] = '0'
-    os.environ['FLAGS_ir_optim'] = '0'
-    
-    # Đảm bảo model lưu vào thư mục dự án
-    if 'PADDLEOCR_HOME' not in os.environ:
-        os.environ['PADDLEOCR_HOME'] = app.config['MODEL_FOLDER']
-    
-    if ocr_instance is None and PADDLEOCR_AVAILABLE:
+# OCR pool: N worker khởi tạo sẵn, request xếp hàng trong queue có giới hạn
+app.config['OCR_WORKERS'] = int(os.environ.get('OCR_WORKERS', default_workers()))
+app.config['OCR_WORKER_MODE'] = os.environ.get('OCR_WORKER_MODE', 'thread')  # 'thread' | 'process'
+app.config['OCR_QUEUE_SIZE'] = int(os.environ.get('OCR_QUEUE_SIZE', 8))
+app.config['OCR_TIMEOUT'] = float(os.environ.get('OCR_TIMEOUT', 120))
+app.config['OCR_BATCH_SIZE'] = int(os.environ.get('OCR_BATCH_SIZE', 4))  # Số ảnh mỗi lần predict_iter
+app.config['BATCH_MAX_CONTENT_LENGTH'] = 512 * 1024 * 1024  # Giới hạn request của /api/ocr/batch
+app.config['OCR_MAX_PIXELS'] = int(os.environ.get('OCR_MAX_PIXELS', 4000000))  # Ảnh lớn hơn được thu nhỏ trước OCR
+
+ocr_pool = OCRPool(
+    factory=ocr_engine.build_ocr,
+    task=ocr_engine.run_ocr,
+    warmup=ocr_engine.warmup_ocr,
+    workers=app.config['OCR_WORKERS'],
+    mode=app.config['OCR_WORKER_MODE'],
+    queue_size=app.config['OCR_QUEUE_SIZE'],
+    timeout=app.config['OCR_TIMEOUT'],
+)
+
+# Ghi file upload ở background (không chặn request OCR)
+upload_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='upload-writer')
+atexit.register(upload_writer.shutdown, wait=True)
+
+def save_upload_async(filepath, data):
+    """Lưu bytes ảnh gốc vào uploads/ trên thread nền"""
+    def write():
         try:
-            print("🔄 Initializing PaddleOCR với inference model...")
-            print(f"   Model folder: {app.config['MODEL_FOLDER']}")
-            
-            # Sử dụng inference model với tất cả tùy chọn tắt OneDNN
-            try:
-                # Thử với PP-OCRv4 và inference model
-                ocr_instance = PaddleOCR(
-                    lang='en',
-                    ocr_version='PP-OCRv4',
-                    use_textline_orientation=False,  # Tắt để tránh lỗi
-                    enable_mkldnn=False,
-                    use_gpu=False,
-                    # Model sẽ được tải vào app.config['MODEL_FOLDER']
-                )
-                print("✅ PaddleOCR ready với PP-OCRv4!")
-            except Exception as e1:
-                print(f"⚠️  Error with PP-OCRv4: {e1}")
-                try:
-                    # Fallback: không dùng ocr_version, chỉ dùng lang
-                    ocr_instance = PaddleOCR(
-                        lang='en',
-                        use_textline_orientation=False,
-                        enable_mkldnn=False,
-                        use_gpu=False
-                    )
-                    print("✅ PaddleOCR ready (fallback 1)!")
-                except Exception as e2:
-                    print(f"⚠️  Error fallback 1: {e2}")
-                    # Fallback cuối cùng: minimal config
-                    ocr_instance = PaddleOCR(
-                        lang='en',
-                        enable_mkldnn=False,
-                        use_gpu=False
-                    )
-                    print("✅ PaddleOCR ready (fallback 2)!")
+            Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+            with open(filepath, 'wb') as f:
+                f.write(data)
         except Exception as e:
-            print(f"❌ Cannot initialize OCR: {e}")
-            import traceback
-            traceback.print_exc()
-            ocr_instance = False
-    elif ocr_instance is False:
-        # Nếu đã thử và thất bại, không thử lại
+            print(f"❌ Cannot save upload {filepath}: {e}")
+    return upload_writer.submit(write)
+
+# Cache kết quả OCR theo nội dung ảnh: quét lại cùng một ảnh trả về ngay
+app.config['OCR_CACHE_ENTRIES'] = int(os.environ.get('OCR_CACHE_ENTRIES', 512))
+app.config['OCR_CACHE_DISK'] = os.environ.get('OCR_CACHE_DISK', 'true').lower() != 'false'
+app.config['OCR_CACHE_MAX_BYTES'] = int(os.environ.get('OCR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+ocr_result_cache = OCRResultCache(
+    max_entries=app.config['OCR_CACHE_ENTRIES'],
+    disk_dir=Path(app.config['CACHE_FOLDER']) / 'ocr' if app.config['OCR_CACHE_DISK'] else None,
+    max_disk_bytes=app.config['OCR_CACHE_MAX_BYTES'],
+)
+
+# Tiền xử lý ảnh chữ viết tay trước detection (bật/tắt theo request bằng tham số `preprocess`)
+app.config['OCR_PREPROCESS'] = preprocess.parse_steps(os.environ.get('OCR_PREPROCESS', 'none'))
+app.config['OCR_PREPROCESS_MAX_SIDE'] = int(os.environ.get('OCR_PREPROCESS_MAX_SIDE', preprocess.DEFAULT_MAX_SIDE))
+
+def preprocess_steps(value):
+    """Các bước tiền xử lý của request (None = mặc định OCR_PREPROCESS), raise ValueError nếu không hợp lệ"""
+    return preprocess.parse_steps(value, app.config['OCR_PREPROCESS'])
+
+def ocr_key(image, steps=()):
+    """
+    Key cache: ảnh đã giải mã (trước tiền xử lý) + cấu hình engine đã tạo thật sự + các bước tiền xử lý.
+    None khi chưa có engine nào được tạo (cache bỏ qua)
+    """
+    engine = ocr_engine.engine_config()
+    if engine is None:
         return None
-    
-    return ocr_instance
+    config = preprocess.cache_config(steps, app.config['OCR_PREPROCESS_MAX_SIDE'])
+    return image_key(image, {**engine, **config})
 
-# Load flashcards
-def load_flashcards():
-    flashcard_file = Path(app.config['FLASHCARD_FOLDER']) / 'flashcards.json'
-    if flashcard_file.exists():
+def prepare_image(image, steps=()):
+    return preprocess.preprocess(image, steps, app.config['OCR_PREPROCESS_MAX_SIDE'])
+
+def ocr_cached(image, steps=()):
+    """OCR một ảnh (numpy array) qua cache kết quả, trả về (lines, cached); cache hit bỏ qua cả tiền xử lý"""
+    key = ocr_key(image, steps)
+    lines = ocr_result_cache.get(key)
+    if lines is not None:
+        return lines, True
+    lines = ocr_pool.run(prepare_image(image, steps))
+    ocr_result_cache.set(key, lines)
+    return lines, False
+
+# Chỉ mục perceptual hash của uploads/: upload lại cùng một ảnh (kể cả bản nén lại/đổi kích thước) thì dùng lại file cũ
+app.config['UPLOAD_DEDUPE'] = os.environ.get('UPLOAD_DEDUPE', 'true').lower() != 'false'
+app.config['UPLOAD_DEDUPE_THRESHOLD'] = int(os.environ.get('UPLOAD_DEDUPE_THRESHOLD', DEFAULT_THRESHOLD))
+app.config['UPLOAD_DEDUPE_SIMILARITY'] = float(os.environ.get('UPLOAD_DEDUPE_SIMILARITY', DEFAULT_SIMILARITY))
+
+upload_index = UploadIndex(
+    Path(app.config['CACHE_FOLDER']) / 'upload_hashes.json',
+    app.config['UPLOAD_FOLDER'],
+    threshold=app.config['UPLOAD_DEDUPE_THRESHOLD'],
+    min_similarity=app.config['UPLOAD_DEDUPE_SIMILARITY'],
+    shared=app.config['SHARED_STATE'],
+)
+atexit.register(upload_index.close)
+
+def find_duplicate_upload(data):
+    """Fingerprint ảnh upload và tìm file đã lưu là cùng một ảnh, trả về (fingerprint, filename | None)"""
+    if not app.config['UPLOAD_DEDUPE']:
+        return None, None
+    fp = upload_index.fingerprint(data)
+    match = upload_index.find(fp)
+    metrics.CACHE_REQUESTS.inc(cache='upload_dedupe', result='hit' if match else 'miss')
+    if match:
+        upload_retention.touch(match)  # Được dùng lại -> tính lại thời hạn giữ file
+    return fp, match
+
+def upload_info(filename):
+    filepath = Path(app.config['UPLOAD_FOLDER']) / filename
+    return {'filename': filename, 'path': str(filepath), 'url': f'/uploads/{filename}'}
+
+# Thumbnail của ảnh upload (tạo khi cần, cache trên đĩa có giới hạn dung lượng)
+app.config['THUMBNAIL_CACHE_MAX_BYTES'] = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+thumbnail_cache = thumbnails.ThumbnailCache(
+    app.config['UPLOAD_FOLDER'],
+    Path(app.config['CACHE_FOLDER']) / 'thumbnails',
+    max_bytes=app.config['THUMBNAIL_CACHE_MAX_BYTES'],
+)
+
+@app.template_filter('thumbnail_url')
+def thumbnail_url(image_path, size='sm'):
+    """
+    URL thumbnail cho trường `image` của flashcard (đường dẫn Windows hoặc POSIX).
+    ?v= là hash nội dung ảnh gốc: ảnh bị ghi đè -> URL mới, nên URL có ?v= đúng được cache vĩnh viễn.
+    """
+    if not image_path:
+        return ''
+    name = upload_name(image_path)
+    version = thumbnail_cache.version(name)
+    return f'/uploads/{name}?size={size}' + (f'&v={version}' if version else '')
+
+def ocr_cached_wait(image, steps=()):
+    """Như ocr_cached nhưng chờ khi pool đầy thay vì báo lỗi (dùng cho job chạy nền)"""
+    while True:
+        try:
+            return ocr_cached(image, steps)
+        except PoolFullError:
+            time.sleep(0.2)
+
+def run_ocr_job(job, payload):
+    """Handler của job OCR: nhận dạng lần lượt từng ảnh, báo tiến độ i/N"""
+    images, steps = payload['images'], payload['preprocess']
+    results = []
+    job.update(stage='ocr', done=0, total=len(images))
+    for i, (name, data) in enumerate(images):
+        job.update(current=name)
         try:
-            with open(flashcard_file, 'r', encoding='utf-8') as f:
-                flashcards = json.load(f)
-                # Loại bỏ duplicate dựa trên ID
-                seen_ids = set()
-                unique_flashcards = []
-                for card in flashcards:
-                    if isinstance(card, dict) and 'id' in card:
-                        card_id = card['id']
-                        if card_id not in seen_ids:
-                            seen_ids.add(card_id)
-                            unique_flashcards.append(card)
-                # Nếu có duplicate, lưu lại file đã làm sạch
-                if len(unique_flashcards) < len(flashcards):
-                    print(f"⚠️  Phát hiện {len(flashcards) - len(unique_flashcards)} flashcard trùng lặp, đã loại bỏ")
-                    save_flashcards(unique_flashcards)
-                    return unique_flashcards
-                return flashcards
+            if isinstance(data, Path):
+                data = data.read_bytes()
+            image = image_io.decode_image(data, max_pixels=app.config['OCR_MAX_PIXELS']) if data else None
+            if image is None:
+                results.append({'name': name, 'error': 'Invalid or too large image'})
+            else:
+                lines, cached = ocr_cached_wait(image, steps)
+                results.append({'name': name, 'text_lines': lines, 'text': "\n".join(lines), 'cached': cached})
         except Exception as e:
-            print(f"❌ Error loading flashcards: {e}")
-            return []
-    return []
+            results.append({'name': name, 'error': str(e)})
+        job.update(done=i + 1)
+    job.update(stage='done', current=None)
+    return {'results': results}
+
+# Hàng đợi job OCR bất đồng bộ: POST /api/jobs trả về id ngay, GET /api/jobs/<id> xem tiến độ
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', app.config['OCR_WORKERS']))
+app.config['JOB_MAX_PENDING'] = int(os.environ.get('JOB_MAX_PENDING', 100))
+app.config['JOB_TTL'] = float(os.environ.get('JOB_TTL', 3600))  # Giữ kết quả (giây) sau khi xong
+# Ảnh upload của job được ghi ra đây, hàng đợi chỉ giữ đường dẫn (không giữ bytes trong RAM)
+app.config['JOB_SPOOL_FOLDER'] = os.environ.get('JOB_SPOOL_FOLDER', str(Path(app.config['CACHE_FOLDER']) / 'job_spool'))
+JOB_SPOOL_MAX_AGE = 86400  # File spool cũ hơn mức này là rác của process đã chết
+
+def spool_job_uploads(files):
+    """
+    Ghi lần lượt từng ảnh upload (kể cả ảnh trong zip) ra JOB_SPOOL_FOLDER, mỗi lúc chỉ một ảnh trong bộ nhớ.
+    Trả về [(tên, Path | None)], None là ảnh không hợp lệ.
+    """
+    spool_dir = Path(app.config['JOB_SPOOL_FOLDER'])
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    images = []
+    try:
+        for name, data in image_io.iter_uploaded_images(files):
+            path = None
+            if data is not None:
+                path = spool_dir / f"{uuid.uuid4().hex}{Path(name).suffix.lower()}"
+                path.write_bytes(data)
+            images.append((name, path))
+    except BaseException:
+        remove_spooled({'images': images, 'spooled': True})
+        raise
+    return images
+
+def remove_spooled(payload):
+    """Xóa file spool của job (không đụng tới ảnh do người dùng chỉ đường dẫn qua `image_paths`)"""
+    if not payload.get('spooled'):
+        return
+    for _, path in payload['images']:
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+def sweep_job_spool(max_age=JOB_SPOOL_MAX_AGE):
+    """Dọn file spool bị bỏ lại khi process chết giữa chừng"""
+    spool_dir = Path(app.config['JOB_SPOOL_FOLDER'])
+    if not spool_dir.is_dir():
+        return
+    cutoff = time.time() - max_age
+    for path in spool_dir.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+ocr_jobs = JobQueue(
+    run_ocr_job,
+    workers=app.config['JOB_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+    ttl=app.config['JOB_TTL'],
+    state_dir=Path(app.config['CACHE_FOLDER']) / 'jobs' if app.config['SHARED_STATE'] else None,
+    on_finish=remove_spooled,
+)
+
+def start_ocr_pool():
+    """
+    Khởi động pool và nạp model ngay khi start server (không chờ request đầu tiên), cùng các thread nền
+    (thu gom uploads/, dọn cache thumbnail).
+    Gọi trong process phục vụ request (gunicorn post_fork, process con của reloader), không gọi lúc import.
+    """
+    # Nhiều worker: chỉ worker giữ được khóa file mới chạy (worker khác thay thế nếu nó thoát)
+    shared = app.config['SHARED_STATE']
+    cache_dir = Path(app.config['CACHE_FOLDER'])
+    upload_retention.start_collector(app.config['UPLOAD_GC_INTERVAL'],
+                                     lock_path=cache_dir / 'upload-gc.lock' if shared else None)
+    atexit.register(upload_retention.stop)
+    thumbnail_cache.start_sweeper(lock_path=cache_dir / 'thumbnail-sweep.lock' if shared else None)
+    atexit.register(thumbnail_cache.stop)
+    if PADDLEOCR_AVAILABLE:
+        print(f"🔄 Warming up {ocr_pool.workers} OCR worker(s) ({ocr_pool.mode})...")
+        ocr_pool.start()
+        atexit.register(ocr_pool.shutdown, False)
+        sweep_job_spool()
+        ocr_jobs.start()
+        atexit.register(ocr_jobs.shutdown, False)
+
+def preload_ocr():
+    """
+    Nạp model OCR ngay trong process hiện tại, trước khi gunicorn fork worker (xem wsgi.py):
+    các worker process dùng chung bộ nhớ model (copy-on-write) thay vì mỗi process tự nạp.
+    """
+    if PADDLEOCR_AVAILABLE and ocr_pool.mode == 'thread':
+        print(f"🔄 Preloading {ocr_pool.workers} OCR model(s) before forking workers...")
+        ocr_pool.preload()
+
+def drain_ocr(timeout):
+    """Tắt êm: ngừng nhận job, chờ job nền và request OCR đang xếp hàng chạy xong, gộp WAL"""
+    drained = ocr_jobs.drain(timeout)
+    ocr_pool.shutdown(wait=True)
+    flashcard_store.close()
+    stats_index.close()
+    upload_index.close()
+    if not drained:
+        print("⚠️  Some OCR jobs were cancelled during shutdown")
+
+# Translation service: dịch theo lô + cache trên đĩa + token bucket dùng chung
+app.config['TRANSLATION_BACKEND'] = os.environ.get('TRANSLATION_BACKEND', 'google')  # 'google' | 'stub'
+
+translation_service = TranslationService(
+    create_backend(app.config['TRANSLATION_BACKEND']),
+    cache_path=Path(app.config['CACHE_FOLDER']) / 'translations.sqlite3',
+)
+TRANSLATE_AVAILABLE = True  # Sẽ kiểm tra khi thực sự dịch
+
+# Kho flashcard: chỉ mục trong bộ nhớ + WAL, giữ "nóng" giữa các request
+flashcard_store = FlashcardStore(app.config['FLASHCARD_FOLDER'], shared=app.config['SHARED_STATE'])
+atexit.register(flashcard_store.close)
+search_index = flashcard_store.attach(SearchIndex())  # Chỉ mục tìm kiếm, tự cập nhật theo store
+facet_index = flashcard_store.attach(FacetIndex())  # Chỉ mục lọc (danh mục/yêu thích/đã học) + phân trang
+due_queue = flashcard_store.attach(scheduler.DueQueue())  # Hàng đợi ôn tập theo thời điểm đến hạn
+stats_index = flashcard_store.attach(StatsIndex(Path(app.config['FLASHCARD_FOLDER']) / 'activity.json',
+                                                shared=app.config['SHARED_STATE']))
+atexit.register(stats_index.close)
+upload_refs = flashcard_store.attach(UploadRefIndex())  # Số flashcard dùng mỗi ảnh upload
+original_index = flashcard_store.attach(OriginalIndex())  # Mặt trước -> id, kiểm tra trùng khi tạo hàng loạt
+
+# Thu gom uploads/: xóa ảnh không flashcard nào dùng sau UPLOAD_TTL, giới hạn dung lượng thư mục
+app.config['UPLOAD_TTL'] = float(os.environ.get('UPLOAD_TTL', 24 * 3600))
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+app.config['UPLOAD_GC_INTERVAL'] = float(os.environ.get('UPLOAD_GC_INTERVAL', 3600))
+
+upload_retention = UploadRetention(
+    app.config['UPLOAD_FOLDER'],
+    upload_refs,
+    ttl=app.config['UPLOAD_TTL'],
+    max_bytes=app.config['UPLOAD_MAX_BYTES'],
+    sync=flashcard_store.sync,
+    on_delete=upload_index.remove,
+)
+
+# Metrics (GET /metrics, định dạng Prometheus): số request/độ trễ theo route + trạng thái hàng đợi/cache
+HTTP_REQUESTS = metrics.Counter('ocrapp_http_requests_total', 'HTTP requests', ['route', 'method', 'status'])
+HTTP_SECONDS = metrics.Histogram('ocrapp_http_request_seconds', 'HTTP request latency', ['route', 'method'])
+HTTP_IN_FLIGHT = metrics.Gauge('ocrapp_http_requests_in_flight', 'HTTP requests being served')
+metrics.Gauge('ocrapp_ocr_queue_depth', 'OCR requests waiting for a worker', callback=lambda: ocr_pool.status['queued'])
+metrics.Gauge('ocrapp_ocr_workers_ready', 'OCR workers with a loaded model', callback=lambda: ocr_pool.status['ready'])
+metrics.Gauge('ocrapp_job_queue_depth', 'Async OCR jobs waiting to run', callback=lambda: ocr_jobs.pending)
+metrics.Gauge('ocrapp_flashcards', 'Flashcards in the store', callback=lambda: len(flashcard_store))
+metrics.Gauge('ocrapp_upload_bytes', 'Disk space used by uploads/', callback=lambda: upload_retention.usage())
+
+def _cache_hit_ratios():
+    translation = translation_service.stats
+    lookups = translation['hits'] + translation['misses']
+    return {
+        'ocr': ocr_result_cache.info()['hit_ratio'],
+        'translation': round(translation['hits'] / lookups, 4) if lookups else 0,
+    }
+
+metrics.Gauge('ocrapp_cache_hit_ratio', 'Cache hit ratio since start', ['cache'], callback=_cache_hit_ratios)
+
+def _route_label():
+    # Dùng mẫu route (/api/flashcard/<int:card_id>) thay vì URL thật để số nhãn không phình
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def _start_request_timer():
+    request.metrics_start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def _record_status(response):
+    request.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request(error=None):
+    if not hasattr(request, 'metrics_start'):
+        return
+    HTTP_IN_FLIGHT.dec()
+    # Lỗi không được xử lý (debug/PROPAGATE_EXCEPTIONS) không đi qua after_request -> ghi là 500
+    route = _route_label()
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=getattr(request, 'metrics_status', 500))
+    HTTP_SECONDS.observe(time.perf_counter() - request.metrics_start, route=route, method=request.method)
+
+@app.before_request
+def _sync_flashcard_store():
+    flashcard_store.sync()  # Shared state: nhận các thay đổi do worker process khác ghi (no-op nếu không bật)
+
+def conditional_response(build):
+    """
+    Response có ETag = phiên bản store + query string.
+    Client gửi lại If-None-Match trùng -> 304 ngay, không dựng lại nội dung.
+    """
+    etag = f"{flashcard_store.etag}-{hashlib.md5(request.query_string).hexdigest()[:8]}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = app.make_response(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Luôn hỏi lại server, nhưng có thể nhận 304
+    return response
+print(f"📚 Loaded {len(flashcard_store)} flashcards")
+
+# Load flashcards
+def load_flashcards():
+    """Danh sách toàn bộ flashcard (lấy từ chỉ mục, không đọc lại file)"""
+    return flashcard_store.all()
 
 def save_flashcards(flashcards):
-    flashcard_file = Path(app.config['FLASHCARD_FOLDER']) / 'flashcards.json'
-    with open(flashcard_file, 'w', encoding='utf-8') as f:
-        json.dump(flashcards, f, ensure_ascii=False, indent=2)
+    """Thay toàn bộ flashcard - chỉ dùng cho thao tác hàng loạt"""
+    flashcard_store.replace_all(flashcards)
 
-def get_next_flashcard_id(flashcards):
+def get_next_flashcard_id(flashcards=None):
     """Lấy ID tiếp theo cho flashcard mới - đảm bảo không trùng"""
-    if not flashcards:
-        return 1
-    max_id = max(card.get('id', 0) for card in flashcards if isinstance(card, dict) and 'id' in card)
-    return max_id + 1
+    return flashcard_store.next_id()
+
+# Trường client được gửi khi tạo card (id, ngày tạo, thống kê ôn tập do server quản lý)
+FLASHCARD_INPUT_FIELDS = ('original', 'translated', 'pronunciation', 'part_of_speech', 'example',
+                          'example_translated', 'synonyms', 'antonyms', 'collocations', 'audio', 'image',
+                          'category', 'notes', 'difficulty', 'favorite', 'learned', 'not_learned')
+MAX_BULK_FLASHCARDS = int(os.environ.get('MAX_BULK_FLASHCARDS', 5000))
+
+def new_flashcard(original, translated='', image='', category='vocabulary', notes='', **fields):
+    """Flashcard mới với đầy đủ trường mặc định; store cấp ID khi lưu"""
+    flashcard = {
+        'id': None,
+        'original': original,
+        'translated': translated,
+        'pronunciation': '',
+        'part_of_speech': '',
+        'example': '',
+        'example_translated': '',
+        'synonyms': [],
+        'antonyms': [],
+        'collocations': [],
+        'audio': '',
+        'image': image,
+        'category': category,
+        'notes': notes,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'review_count': 0,
+        'last_reviewed': None,
+        'difficulty': 'medium',
+        'favorite': False,
+        'learned': False,
+        'not_learned': False,
+        'correct_count': 0,
+        'wrong_count': 0
+    }
+    flashcard.update(fields)
+    return flashcard
+
+def apply_word_info(flashcard, info):
+    """Bổ sung phát âm/từ loại/ví dụ... từ kết quả dictionary_api (không ghi đè trường đã có)"""
+    if not info:
+        return flashcard
+    for field, value in (('pronunciation', info.get('pronunciation', '')),
+                         ('part_of_speech', info.get('part_of_speech', '')),
+                         ('example', (info.get('examples') or [''])[0]),
+                         ('synonyms', info.get('synonyms', [])),
+                         ('antonyms', info.get('antonyms', [])),
+                         ('collocations', info.get('collocations', [])),
+                         ('audio', info.get('audio', ''))):
+        if not flashcard.get(field):
+            flashcard[field] = value
+    return flashcard
 
 # Routes
 @app.route('/')
 def index():
     """Màn hình chính"""
-    flashcards = load_flashcards()
-    recent = flashcards[-10:] if len(flashcards) > 10 else flashcards
-    recent.reverse()
+    recent = stats_index.recent(flashcard_store, 10)
     
-    # Daily word - random từ flashcard
-    daily_word = None
-    if flashcards:
-        import random
-        daily_word = random.choice(flashcards)
+    # Daily word - random từ flashcard (chọn O(1), không tải cả bộ thẻ)
+    daily_id = stats_index.random_id()
+    daily_word = flashcard_store.get(daily_id) if daily_id is not None else None
     
     return render_template('index.html', recent_flashcards=recent, daily_word=daily_word)
 
@@ -280,6 +573,9 @@ def scan():
 @app.route('/flashcards')
 def flashcards():
     """Màn hình Flashcard"""
+    return conditional_response(render_flashcards_page)
+
+def render_flashcards_page():
     try:
         flashcards = load_flashcards()
         card_id = request.args.get('id')
@@ -311,9 +607,8 @@ def flashcards():
 
 @app.route('/learn')
 def learn():
-    """Màn hình Học/Ôn tập"""
-    flashcards = load_flashcards()
-    return render_template('learn.html', flashcards=flashcards)
+    """Màn hình Học/Ôn tập (card được tải theo lượt qua /api/learn/next)"""
+    return render_template('learn.html')
 
 @app.route('/info')
 def info():
@@ -322,8 +617,34 @@ def info():
 
 @app.route('/uploads/<filename>')
 def serve_uploaded_file(filename):
-    """Serve uploaded files"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve uploaded files (?size=sm|md|lg -> thumbnail WebP/JPEG đã cache)"""
+    size = request.args.get('size')
+    if not size:
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+    try:
+        result = thumbnail_cache.get(filename, size, fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Thumbnail error for {filename}: {e}")
+        return jsonify({'error': 'Cannot create thumbnail'}), 415
+    if result is None:
+        return jsonify({'error': 'Image not found'}), 404
+    
+    path, name = result
+    response = send_file(path, mimetype=thumbnails.FORMATS[fmt][1], etag=name, conditional=True)
+    if request.args.get('v') == name[:thumbnails.VERSION_LENGTH]:
+        # URL chứa hash nội dung ảnh gốc -> nội dung ứng với URL không bao giờ đổi
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Tên file upload có thể bị ghi đè bằng ảnh khác -> luôn hỏi lại (304 nếu ETag không đổi)
+        response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    return response
 
 # API Routes
 @app.route('/api/upload', methods=['POST'])
@@ -346,13 +667,26 @@ def upload_image():
         if file_ext not in allowed_extensions:
             return jsonify({'error': f'File type not allowed. Allowed: {", ".join(allowed_extensions)}'}), 400
         
-        filename = secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
+        data = file.stream.read()
+        
+        # Cùng một ảnh với ảnh đã upload -> dùng lại file cũ, không lưu thêm
+        fp, duplicate = find_duplicate_upload(data)
+        if duplicate is not None:
+            print(f"♻️  Duplicate upload, reusing {duplicate}")
+            return jsonify({'success': True, 'duplicate': True, **upload_info(duplicate)})
+        
+        if not upload_retention.reserve(len(data)):
+            return jsonify({'error': 'Upload storage is full. Vui lòng thử lại sau.'}), 507
+        
+        filename = image_io.make_upload_filename(file.filename)
         filepath = Path(app.config['UPLOAD_FOLDER']) / filename
         
         # Đảm bảo thư mục tồn tại
         Path(app.config['UPLOAD_FOLDER']).mkdir(parents=True, exist_ok=True)
         
-        file.save(str(filepath))
+        with open(filepath, 'wb') as f:
+            f.write(data)
+        upload_index.add(filename, fp)
         
         # Kiểm tra file đã được lưu
         if not filepath.exists():
@@ -361,6 +695,7 @@ def upload_image():
         # Return both filename and relative path for frontend
         return jsonify({
             'success': True, 
+            'duplicate': False,
             'filename': filename, 
             'path': str(filepath),
             'url': f'/uploads/{filename}'
@@ -386,62 +721,28 @@ def ocr_image():
     if not Path(image_path).exists():
         return jsonify({'error': 'Image not found'}), 404
     
-    # Đảm bảo OneDNN bị tắt trước khi OCR
-    os.environ['FLAGS_use_mkldnn'] = 'False'
-    os.environ['FLAGS_ir_optim'] = 'False'
-    os.environ['MKLDNN_ENABLED'] = '0'
-    
-    ocr = get_ocr()
-    if not ocr:
+    if not PADDLEOCR_AVAILABLE:
         return jsonify({'error': 'OCR not available'}), 500
     
     try:
-        # OCR - Sử dụng inference model với API 2.x (ổn định hơn)
-        # API 2.x sử dụng inference model mặc định và ít gặp lỗi OneDNN hơn
+        steps = preprocess_steps(data.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        image = image_io.decode_image(Path(image_path).read_bytes(), max_pixels=app.config['OCR_MAX_PIXELS'])
+    except image_io.ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    if image is None:
+        return jsonify({'error': 'Invalid image'}), 400
+    
+    try:
         print(f"🔄 Running OCR on: {image_path}")
+        lines, cached = ocr_cached(image, steps)
         
-        # Thử API 2.x trước (ổn định hơn với inference model)
-        try:
-            result = ocr.ocr(str(image_path), cls=False)  # Tắt cls để tránh lỗi
-            print(f"OCR result type: {type(result)}")
-            
-            if not result or not result[0]:
-                return jsonify({'error': 'No text detected'}), 400
-            
-            # Giữ nguyên từng dòng, không gộp lại
-            lines = []
-            for line in result[0]:
-                if line and len(line) >= 2:
-                    text_info = line[1]
-                    if isinstance(text_info, (list, tuple)):
-                        text = text_info[0]
-                    else:
-                        text = text_info
-                    lines.append(text.strip())
-                    print(f"  Detected line: {text}")
-            
-            # Trả về cả text gộp và lines riêng lẻ
-            text = "\n".join(lines)  # Dùng \n để phân cách dòng
-            text_joined = " ".join(lines)  # Text gộp cho dịch
-            
-        except Exception as e1:
-            print(f"⚠️  OCR API 2.x failed: {e1}")
-            # Fallback: thử API 3.x
-            if hasattr(ocr, 'predict'):
-                try:
-                    result = ocr.predict(str(image_path), use_textline_orientation=False)
-                    lines = []
-                    for page in result:
-                        for block in page.blocks:
-                            for line in block.lines:
-                                lines.append(line.text.strip())
-                    text = "\n".join(lines)
-                    text_joined = " ".join(lines)
-                except Exception as e2:
-                    print(f"⚠️  OCR API 3.x also failed: {e2}")
-                    raise e1  # Raise original error
-            else:
-                raise e1
+        # Trả về cả text gộp và lines riêng lẻ
+        text = "\n".join(lines)  # Dùng \n để phân cách dòng
+        text_joined = " ".join(lines)  # Text gộp cho dịch
         
         if not text:
             return jsonify({'error': 'No text detected'}), 400
@@ -451,9 +752,16 @@ def ocr_image():
             'success': True, 
             'text': text,  # Text với \n phân cách dòng
             'text_lines': lines,  # List các dòng
-            'text_joined': text_joined  # Text gộp cho dịch
+            'text_joined': text_joined,  # Text gộp cho dịch
+            'cached': cached
         })
     
+    except PoolFullError:
+        return jsonify({'error': 'Server đang bận xử lý OCR. Vui lòng thử lại sau.'}), 429
+    except PoolTimeoutError:
+        return jsonify({'error': 'OCR quá thời gian chờ. Vui lòng thử lại.'}), 504
+    except PoolUnavailableError:
+        return jsonify({'error': 'OCR not available'}), 500
     except Exception as e:
         error_msg = str(e)
         # Kiểm tra nếu là lỗi OneDNN
@@ -464,6 +772,246 @@ def ocr_image():
             }), 500
         return jsonify({'error': error_msg}), 500
 
+@app.route('/api/ocr/cache', methods=['GET'])
+def ocr_cache_stats():
+    """Thống kê cache kết quả OCR (hit/miss)"""
+    return jsonify({'success': True, 'cache': ocr_result_cache.info()})
+
+@app.route('/api/ocr/upload', methods=['POST'])
+def upload_and_ocr():
+    """Upload + OCR trong một request: giải mã ảnh trong bộ nhớ, không đọc lại từ đĩa"""
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image file'}), 400
+    
+    file = request.files['image']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if not image_io.is_allowed_image(file.filename):
+        return jsonify({'error': f'File type not allowed. Allowed: {", ".join(image_io.ALLOWED_EXTENSIONS)}'}), 400
+    
+    if not PADDLEOCR_AVAILABLE:
+        return jsonify({'error': 'OCR not available'}), 500
+    
+    try:
+        steps = preprocess_steps(request.form.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    data = file.stream.read()
+    try:
+        image = image_io.decode_image(data, max_pixels=app.config['OCR_MAX_PIXELS'])
+    except image_io.ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    if image is None:
+        return jsonify({'error': 'Invalid image'}), 400
+    
+    # Cùng một ảnh với ảnh đã upload -> dùng lại file; OCR vẫn chạy trên ảnh vừa gửi (qua cache theo image_key)
+    fp, duplicate = find_duplicate_upload(data)
+    
+    # Lưu ảnh gốc (tùy chọn) trên thread nền, trả về đường dẫn ngay
+    saved = {}
+    if duplicate is not None:
+        print(f"♻️  Duplicate upload, reusing {duplicate}")
+        saved = upload_info(duplicate)
+    elif request.form.get('save', 'true').lower() != 'false':
+        if upload_retention.reserve(len(data)):
+            filename = image_io.make_upload_filename(file.filename)
+            save_upload_async(Path(app.config['UPLOAD_FOLDER']) / filename, data)
+            saved = upload_info(filename)
+        else:
+            print("⚠️  Upload storage is full, image not saved")
+    
+    try:
+        print(f"🔄 Running OCR on upload: {file.filename} ({image.shape[1]}x{image.shape[0]})")
+        lines, cached = ocr_cached(image, steps)
+        if saved and duplicate is None:
+            upload_index.add(saved['filename'], fp)
+    except PoolFullError:
+        return jsonify({'error': 'Server đang bận xử lý OCR. Vui lòng thử lại sau.'}), 429
+    except PoolTimeoutError:
+        return jsonify({'error': 'OCR quá thời gian chờ. Vui lòng thử lại.'}), 504
+    except PoolUnavailableError:
+        return jsonify({'error': 'OCR not available'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    if not lines:
+        return jsonify({'error': 'No text detected', **saved}), 400
+    
+    return jsonify({
+        'success': True,
+        'text': "\n".join(lines),
+        'text_lines': lines,
+        'text_joined': " ".join(lines),
+        'cached': cached,
+        'duplicate': duplicate is not None,
+        **saved
+    })
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_ocr_job():
+    """Gửi job OCR chạy nền (multipart `images`/zip hoặc JSON `image_path`/`image_paths`), trả về job id ngay"""
+    if not PADDLEOCR_AVAILABLE:
+        return jsonify({'error': 'OCR not available'}), 500
+    
+    files = request.files.getlist('images') + request.files.getlist('image')
+    data = {} if files else request.get_json(silent=True) or {}
+    try:
+        steps = preprocess_steps(request.form.get('preprocess') if files else data.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if files:
+        # Ghi ảnh ra file spool, job chỉ giữ đường dẫn: job chờ không chiếm RAM bằng cả ảnh
+        images = spool_job_uploads((f.filename or '', f.stream) for f in files)
+    else:
+        paths = data.get('image_paths') or ([data['image_path']] if data.get('image_path') else [])
+        missing = [p for p in paths if not Path(p).is_file()]
+        if missing:
+            return jsonify({'error': f'Image not found: {missing[0]}'}), 404
+        images = [(Path(p).name, Path(p)) for p in paths]
+    if not images:
+        return jsonify({'error': 'No images provided'}), 400
+    
+    payload = {'images': images, 'preprocess': steps, 'spooled': bool(files)}
+    try:
+        job = ocr_jobs.submit(payload)
+    except JobQueueFullError:
+        remove_spooled(payload)
+        return jsonify({'error': 'Server đang bận xử lý OCR. Vui lòng thử lại sau.'}), 429
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.id}'
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    """Trạng thái/tiến độ/kết quả của job OCR"""
+    job = ocr_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/ocr/batch', methods=['POST'])
+def ocr_batch():
+    """OCR nhiều ảnh (multipart `images` hoặc file zip), trả kết quả từng ảnh ngay khi xong"""
+    # Flask >= 3.1 cho phép nâng giới hạn riêng cho route này
+    try:
+        request.max_content_length = app.config['BATCH_MAX_CONTENT_LENGTH']
+    except AttributeError:
+        pass
+    
+    if not PADDLEOCR_AVAILABLE:
+        return jsonify({'error': 'OCR not available'}), 500
+    
+    files = request.files.getlist('images') + request.files.getlist('archive')
+    if not files:
+        return jsonify({'error': 'No image file'}), 400
+    try:
+        steps = preprocess_steps(request.form.get('preprocess') or request.args.get('preprocess'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Flask đóng request.files khi view trả về -> chép sang file tạm trước khi stream
+    files = image_io.detach_uploads(files)
+    
+    use_sse = request.args.get('format') == 'sse' or request.accept_mimetypes.best == 'text/event-stream'
+    batch_size = max(1, app.config['OCR_BATCH_SIZE'])
+    max_in_flight = ocr_pool.workers  # Số lô gửi vào pool cùng lúc -> bộ nhớ luôn có giới hạn
+    
+    def emit(event, payload):
+        data = json.dumps(payload, ensure_ascii=False)
+        if use_sse:
+            return f"event: {event}\ndata: {data}\n\n"
+        return data + "\n"
+    
+    def finish(item, result):
+        index, name = item[:2]
+        if 'error' in result:
+            return emit('result', {'index': index, 'filename': name, 'success': False, 'error': result['error']})
+        lines = result['text_lines']
+        return emit('result', {
+            'index': index,
+            'filename': name,
+            'success': True,
+            'text': "\n".join(lines),
+            'text_lines': lines,
+            'text_joined': " ".join(lines),
+            'cached': result.get('cached', False)
+        })
+    
+    def generate():
+        in_flight = deque()  # (danh sách (index, filename), future)
+        stats = {'count': 0, 'failed': 0}
+        
+        def drain_oldest():
+            items, future = in_flight.popleft()
+            try:
+                results = future.result(timeout=app.config['OCR_TIMEOUT'])
+            except FutureTimeoutError:
+                future.cancel()
+                results = [{'error': 'OCR quá thời gian chờ'}] * len(items)
+            except Exception as e:
+                results = [{'error': str(e)}] * len(items)
+            for item, result in zip(items, results):
+                stats['failed'] += 'error' in result
+                if 'error' not in result:
+                    ocr_result_cache.set(item[2], result['text_lines'])
+                yield finish(item, result)
+        
+        def submit(items, images):
+            while True:
+                try:
+                    in_flight.append((items, ocr_pool.submit(images, task=ocr_engine.run_ocr_batch)))
+                    return
+                except PoolFullError:
+                    # Pool đang bận: trả kết quả lô cũ nhất trước rồi thử lại
+                    if in_flight:
+                        yield from drain_oldest()
+                    else:
+                        time.sleep(0.2)
+                except PoolUnavailableError:
+                    for item in items:
+                        stats['failed'] += 1
+                        yield finish(item, {'error': 'OCR not available'})
+                    return
+        
+        items, images = [], []
+        for index, (name, data) in enumerate(image_io.iter_uploaded_images(files)):
+            stats['count'] += 1
+            try:
+                image = image_io.decode_image(data, max_pixels=app.config['OCR_MAX_PIXELS']) if data else None
+            except image_io.ImageTooLargeError:
+                image = None
+            if image is None:
+                stats['failed'] += 1
+                yield finish((index, name), {'error': 'Invalid or unsupported image'})
+                continue
+            key = ocr_key(image, steps)
+            lines = ocr_result_cache.get(key)
+            if lines is not None:
+                yield finish((index, name), {'text_lines': lines, 'cached': True})
+                continue
+            items.append((index, name, key))
+            images.append(prepare_image(image, steps))
+            if len(images) >= batch_size:
+                if len(in_flight) >= max_in_flight:
+                    yield from drain_oldest()
+                yield from submit(items, images)
+                items, images = [], []
+        if images:
+            yield from submit(items, images)
+        while in_flight:
+            yield from drain_oldest()
+        
+        print(f"✅ Batch OCR done: {stats['count']} images, {stats['failed']} failed")
+        yield emit('done', {'done': True, 'count': stats['count'], 'failed': stats['failed']})
+    
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/translate', methods=['POST'])
 def translate():
     """Dịch văn bản - dịch từng dòng riêng biệt"""
@@ -478,189 +1026,34 @@ def translate():
         return jsonify({'error': 'No text provided'}), 400
     
     try:
-        # Khởi tạo lại translator mỗi lần để tránh TKK token issue
-        current_translator = get_translator()
-        if not current_translator:
-            return jsonify({'error': 'Translation not available. Google Translate không thể kết nối. Vui lòng thử lại sau.'}), 500
-        
-        # Nếu có danh sách dòng, dịch từng dòng riêng biệt
+        # Nếu có danh sách dòng: loại trùng, lấy từ cache, phần còn lại dịch theo lô
         if lines and len(lines) > 0:
-            print(f"🔄 Translating {len(lines)} lines individually...")
-            translated_lines = []
-            import time
-            
-            # Khởi tạo translator một lần trước vòng lặp
-            current_translator = get_translator()
-            if not current_translator:
-                print("❌ Cannot initialize translator at start")
-                return jsonify({'error': 'Translation not available. Google Translate không thể kết nối. Vui lòng thử lại sau.'}), 500
-            
-            for i, line in enumerate(lines):
-                if not line.strip():
-                    translated_lines.append('')
-                    continue
-                
-                line_text = line.strip()
-                translated_text = None
-                max_retries = 3
-                retry_count = 0
-                
-                # Thêm delay nhỏ giữa các request để tránh rate limit
-                if i > 0:
-                    time.sleep(0.3)  # Tăng delay lên 300ms
-                
-                while retry_count < max_retries and not translated_text:
-                    try:
-                        # Khởi tạo lại translator cho mỗi lần thử để tránh TKK token issue
-                        current_translator = get_translator()
-                        if not current_translator:
-                            raise Exception("Cannot get translator instance")
-                        
-                        print(f"  🔄 [{i+1}/{len(lines)}] Translating: {line_text[:40]}...")
-                        
-                        # Kiểm tra xem là deep-translator hay googletrans
-                        # deep-translator: translate() trả về string trực tiếp
-                        # googletrans: translate() trả về object có .text
-                        try:
-                            # Thử gọi như deep-translator (không có src/dest trong translate method)
-                            translated_text = current_translator.translate(line_text)
-                            if not isinstance(translated_text, str):
-                                # Nếu không phải string, có thể là googletrans
-                                raise AttributeError("Not deep-translator")
-                        except (TypeError, AttributeError):
-                            # Nếu lỗi, thử googletrans
-                            result = current_translator.translate(line_text, src='en', dest='vi', timeout=15)
-                            translated_text = result.text if result and hasattr(result, 'text') else None
-                        
-                        if translated_text:
-                            translated_text = translated_text.strip()
-                            print(f"  ✅ [{i+1}/{len(lines)}] Success: {line_text[:30]}... → {translated_text[:30]}...")
-                            break
-                        else:
-                            raise Exception("Empty translation result")
-                            
-                    except Exception as retry_error:
-                        error_msg = str(retry_error)
-                        retry_count += 1
-                        
-                        # Kiểm tra các lỗi cụ thể
-                        if '429' in error_msg or 'Too Many Requests' in error_msg:
-                            print(f"  ⚠️  Rate limit for line {i+1}, waiting 3 seconds...")
-                            time.sleep(3)
-                        elif 'TKK' in error_msg or 'token' in error_msg.lower():
-                            print(f"  ⚠️  TKK token issue for line {i+1}, resetting translator...")
-                            translator = None  # Reset global translator
-                            time.sleep(1)
-                        elif 'timeout' in error_msg.lower():
-                            print(f"  ⚠️  Timeout for line {i+1}, retrying...")
-                            time.sleep(1)
-                        else:
-                            print(f"  ⚠️  Error for line {i+1} (attempt {retry_count}/{max_retries}): {error_msg[:100]}")
-                            time.sleep(0.5 * retry_count)  # Exponential backoff
-                        
-                        if retry_count >= max_retries:
-                            print(f"  ❌ Failed after {max_retries} attempts for line {i+1}: {line_text}")
-                            break
-                
-                # Thêm kết quả vào danh sách
-                if translated_text:
-                    translated_lines.append(translated_text)
-                else:
-                    # Nếu vẫn lỗi, thử một lần cuối với translator mới hoàn toàn
-                    try:
-                        translator = None  # Reset hoàn toàn
-                        time.sleep(1)
-                        final_translator = get_translator()
-                        if final_translator:
-                            # Kiểm tra xem là deep-translator hay googletrans
-                            try:
-                                # Thử deep-translator trước
-                                final_result = final_translator.translate(line_text)
-                                if not isinstance(final_result, str):
-                                    raise AttributeError("Not deep-translator")
-                            except (TypeError, AttributeError):
-                                # Nếu lỗi, thử googletrans
-                                result = final_translator.translate(line_text, src='en', dest='vi', timeout=20)
-                                final_result = result.text if result and hasattr(result, 'text') else None
-                            
-                            if final_result:
-                                translated_lines.append(final_result.strip())
-                                print(f"  ✅ [{i+1}/{len(lines)}] Final retry successful!")
-                            else:
-                                translated_lines.append(f"[Lỗi dịch: {line_text}]")
-                        else:
-                            translated_lines.append(f"[Lỗi dịch: {line_text}]")
-                    except Exception as final_error:
-                        print(f"  ❌ Final retry also failed: {final_error}")
-                        translated_lines.append(f"[Lỗi dịch: {line_text}]")
-            
+            print(f"🔄 Translating {len(lines)} lines...")
+            translated_lines = translation_service.translate_lines(lines, source='en', target='vi')
             return jsonify({
                 'success': True, 
                 'translated': '\n'.join(translated_lines),  # Text gộp
                 'translated_lines': translated_lines  # List các dòng đã dịch
             })
-        else:
-            # Fallback: dịch toàn bộ text
-            print(f"🔄 Translating text: {text[:100]}...")
-            try:
-                # Retry mechanism
-                max_retries = 3
-                retry_count = 0
-                translated = None
-                import time
-                
-                while retry_count < max_retries and not translated:
-                    try:
-                        # Khởi tạo lại translator cho mỗi request
-                        current_translator = get_translator()
-                        if not current_translator:
-                            raise Exception("Cannot get translator instance")
-                        
-                        # Kiểm tra xem là deep-translator hay googletrans
-                        try:
-                            # Thử deep-translator trước
-                            translated = current_translator.translate(text)
-                            if not isinstance(translated, str):
-                                raise AttributeError("Not deep-translator")
-                        except (TypeError, AttributeError):
-                            # Nếu lỗi, thử googletrans
-                            result = current_translator.translate(text, src='en', dest='vi', timeout=10)
-                            translated = result.text if result and hasattr(result, 'text') else None
-                        
-                        if translated:
-                            break
-                    except Exception as retry_error:
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            print(f"  ⚠️  Retry {retry_count}/{max_retries}: {retry_error}")
-                            # Khởi tạo lại translator khi retry
-                            translator = None
-                            time.sleep(0.5 * retry_count)
-                        else:
-                            raise retry_error
-                
-                if translated:
-                    print(f"✅ Translated: {translated[:100]}...")
-                    return jsonify({'success': True, 'translated': translated, 'translated_lines': [translated]})
-                else:
-                    return jsonify({'error': 'Invalid translation result'}), 500
-            except Exception as e:
-                error_msg = str(e)
-                print(f"❌ Translation error: {error_msg}")
-                # Kiểm tra nếu là lỗi bị chặn
-                if '429' in error_msg or 'Too Many Requests' in error_msg or 'blocked' in error_msg.lower():
-                    return jsonify({'error': 'Google Translate bị giới hạn. Vui lòng đợi vài phút rồi thử lại.'}), 429
-                return jsonify({'error': f'Translation failed: {error_msg}'}), 500
+        
+        # Fallback: dịch toàn bộ text
+        print(f"🔄 Translating text: {text[:100]}...")
+        translated = translation_service.translate_text(text, source='en', target='vi')
+        print(f"✅ Translated: {translated[:100]}...")
+        return jsonify({'success': True, 'translated': translated, 'translated_lines': [translated]})
+    except TranslationUnavailableError:
+        return jsonify({'error': 'Translation not available. Google Translate không thể kết nối. Vui lòng thử lại sau.'}), 500
+    except RateLimitedError:
+        return jsonify({'error': 'Google Translate bị giới hạn. Vui lòng đợi vài phút rồi thử lại.'}), 429
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Translation error: {error_msg}")
-        import traceback
-        traceback.print_exc()
+        if not isinstance(e, TranslationError):
+            import traceback
+            traceback.print_exc()
         
         # Kiểm tra các lỗi phổ biến
-        if '429' in error_msg or 'Too Many Requests' in error_msg:
-            return jsonify({'error': 'Google Translate bị giới hạn. Vui lòng đợi vài phút rồi thử lại.'}), 429
-        elif 'blocked' in error_msg.lower() or 'captcha' in error_msg.lower():
+        if 'blocked' in error_msg.lower() or 'captcha' in error_msg.lower():
             return jsonify({'error': 'Google Translate bị chặn tạm thời. Vui lòng thử lại sau.'}), 503
         elif 'timeout' in error_msg.lower():
             return jsonify({'error': 'Kết nối quá lâu. Vui lòng kiểm tra internet và thử lại.'}), 504
@@ -683,65 +1076,37 @@ def create_flashcard():
     # Nhận danh sách các dòng để tạo nhiều flashcard
     original_lines = data.get('original_lines', [])
     translated_lines = data.get('translated_lines', [])
+    # Tùy chọn: bổ sung thông tin từ điển (tra song song, có cache)
+    with_dictionary = bool(data.get('with_dictionary', False)) and DICTIONARY_AVAILABLE
     
     if not original and not original_lines:
         return jsonify({'error': 'Original text required'}), 400
     
-    flashcards = load_flashcards()
     created_flashcards = []
     
     # Nếu có danh sách dòng, tạo 1 flashcard cho mỗi dòng (chỉ dùng Google Translate - cách ban đầu)
     # KHÔNG dịch ví dụ để tránh rate limit và timeout
     if original_lines and len(original_lines) > 0:
         print(f"🔄 Creating {len(original_lines)} flashcards (using Google Translate only, no example translation)...")
-        import time
+        word_infos = get_word_info_many(original_lines) if with_dictionary else {}
         for i, orig_line in enumerate(original_lines):
             if not orig_line.strip():
                 continue
             
             word = orig_line.strip()
-            print(f"  🔄 Processing word {i+1}/{len(original_lines)}: {word}")
             
             # Lấy nghĩa tương ứng (từ Google Translate - cách ban đầu)
             trans_line = translated_lines[i] if i < len(translated_lines) else translated
             
             # Khôi phục cách tra nghĩa ban đầu: Chỉ dùng Google Translate, KHÔNG dịch ví dụ
             # Tạo flashcard đơn giản với nghĩa từ Google Translate (đã dịch ở bước trước)
-            flashcard = {
-                'id': get_next_flashcard_id(flashcards) + len(created_flashcards),
-                'original': word,
-                'translated': trans_line.strip() if trans_line else '',
-                'pronunciation': '',
-                'part_of_speech': '',
-                'example': '',  # Không có ví dụ
-                'example_translated': '',  # KHÔNG dịch ví dụ để tránh rate limit
-                'synonyms': [],
-                'antonyms': [],
-                'collocations': [],
-                'audio': '',
-                'image': image_path,
-                'category': category,
-                'notes': notes,
-                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'review_count': 0,
-                'last_reviewed': None,
-                'difficulty': 'medium',
-                'favorite': False,
-                'learned': False,
-                'not_learned': False,
-                'correct_count': 0,
-                'wrong_count': 0
-            }
-            
-            flashcards.append(flashcard)
+            flashcard = new_flashcard(word, trans_line.strip() if trans_line else '',
+                                      image=image_path, category=category, notes=notes)
+            apply_word_info(flashcard, word_infos.get(word.lower()))
             created_flashcards.append(flashcard)
-            print(f"    ✅ Created flashcard: {word} → {trans_line.strip() if trans_line else 'N/A'}")
-            
-            # Delay nhỏ giữa các card để tránh quá tải
-            if i < len(original_lines) - 1:
-                time.sleep(0.05)  # 50ms delay giữa các card
         
-        save_flashcards(flashcards)
+        flashcard_store.add_many(created_flashcards)
+        print(f"✅ Created {len(created_flashcards)} flashcards")
         return jsonify({
             'success': True, 
             'count': len(created_flashcards),
@@ -751,42 +1116,71 @@ def create_flashcard():
     # Fallback: tạo 1 flashcard cho toàn bộ text
     else:
         # Khôi phục cách tra nghĩa ban đầu: Chỉ dùng Google Translate
-        flashcard = {
-            'id': get_next_flashcard_id(flashcards),
-            'original': original,
-            'translated': translated,
-            'pronunciation': '',
-            'part_of_speech': '',
-            'example': '',
-            'example_translated': '',
-            'synonyms': [],
-            'antonyms': [],
-            'collocations': [],
-            'audio': '',
-            'image': image_path,
-            'category': category,
-            'notes': notes,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'review_count': 0,
-            'last_reviewed': None,
-            'difficulty': 'medium',
-            'favorite': False,
-            'learned': False,
-            'not_learned': False,
-            'correct_count': 0,
-            'wrong_count': 0
-        }
-        
-        flashcards.append(flashcard)
-        save_flashcards(flashcards)
+        flashcard = new_flashcard(original, translated, image=image_path, category=category, notes=notes)
+        flashcard_store.add(flashcard)
         
         return jsonify({'success': True, 'count': 1, 'flashcards': [flashcard]})
 
+def create_flashcards_bulk():
+    """
+    Tạo nhiều flashcard trong một lần ghi (một dòng WAL, một fsync).
+    Body: {"cards": [{"original": ..., "translated": ..., ...}], "category": "vocabulary", "image_path": "",
+           "skip_duplicates": true, "with_dictionary": false}
+    Card trùng mặt trước (không phân biệt hoa/thường, khoảng trắng) với card đã có hoặc card trước đó
+    trong cùng lô được bỏ qua và trả về trong `skipped`.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('cards')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'cards must be a non-empty list'}), 400
+    if len(items) > MAX_BULK_FLASHCARDS:
+        return jsonify({'error': f'Too many cards (max {MAX_BULK_FLASHCARDS})'}), 413
+    skip_duplicates = data.get('skip_duplicates', True) is not False
+    defaults = {'image': data.get('image_path', ''), 'category': data.get('category', 'vocabulary')}
+
+    cards, invalid = [], []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'original': item}
+        original = str(item.get('original') or '').strip() if isinstance(item, dict) else ''
+        if not original:
+            invalid.append(i)
+            continue
+        fields = {**defaults, **{key: item[key] for key in FLASHCARD_INPUT_FIELDS if key in item}}
+        fields['original'] = original
+        cards.append(new_flashcard(**fields))
+    if invalid:
+        return jsonify({'error': 'Original text required', 'invalid': invalid[:100]}), 400
+
+    if bool(data.get('with_dictionary', False)) and DICTIONARY_AVAILABLE:
+        word_infos = get_word_info_many([card['original'] for card in cards])
+        for card in cards:
+            apply_word_info(card, word_infos.get(card['original'].lower()))
+
+    skipped, seen = [], set()
+
+    def is_duplicate(card):
+        # Chạy trong lock của store: kiểm tra trùng + thêm là nguyên tử với request song song
+        key = normalize_original(card['original'])
+        existing = original_index.find(key)
+        if key in seen or existing is not None:
+            skipped.append({'original': card['original'], 'id': existing})
+            return True
+        seen.add(key)
+        return False
+
+    created = flashcard_store.add_many(cards, skip=is_duplicate if skip_duplicates else None)
+    for item in skipped:
+        if item['id'] is None:  # Trùng với card khác trong cùng lô, giờ đã có id
+            item['id'] = original_index.find(item['original'])
+    print(f"✅ Bulk created {len(created)} flashcards ({len(skipped)} duplicates skipped)")
+    return jsonify({'success': True, 'count': len(created), 'flashcards': created,
+                    'skipped': skipped}), 201
+
 @app.route('/api/flashcard/<int:card_id>', methods=['GET', 'PUT', 'DELETE'])
 def flashcard_detail(card_id):
     """Lấy/Sửa/Xóa flashcard"""
-    flashcards = load_flashcards()
-    card = next((c for c in flashcards if c['id'] == card_id), None)
+    card = flashcard_store.get(card_id)
     
     if not card:
         return jsonify({'error': 'Flashcard not found'}), 404
@@ -804,57 +1198,68 @@ def flashcard_detail(card_id):
             del data['id']
         
         # Cập nhật các trường được gửi lên (chỉ cập nhật, không tạo mới)
-        for key, value in data.items():
-            if key != 'id':  # Không cho phép thay đổi ID
-                card[key] = value
-        
-        save_flashcards(flashcards)
+        card = flashcard_store.update(card_id, data)
         return jsonify({'success': True, 'flashcard': card})
     
     elif request.method == 'DELETE':
-        flashcards.remove(card)
-        save_flashcards(flashcards)
+        flashcard_store.delete(card_id)
         return jsonify({'success': True})
 
-@app.route('/api/flashcards', methods=['GET', 'DELETE'])
+@app.route('/api/flashcards', methods=['GET', 'POST', 'DELETE'])
 def get_flashcards():
-    """Lấy danh sách flashcard hoặc xóa tất cả"""
+    """Lấy danh sách flashcard, tạo hàng loạt (POST) hoặc xóa tất cả"""
+    if request.method == 'POST':
+        return create_flashcards_bulk()
     if request.method == 'DELETE':
         # Xóa toàn bộ flashcard
         try:
-            save_flashcards([])
+            flashcard_store.clear()
             print("🗑️  Đã xóa toàn bộ flashcard")
             return jsonify({'success': True, 'message': 'Đã xóa toàn bộ flashcard', 'count': 0})
         except Exception as e:
             print(f"❌ Error deleting all flashcards: {e}")
             return jsonify({'error': f'Lỗi khi xóa: {str(e)}'}), 500
     
-    # GET: Lấy danh sách flashcard
-    flashcards = load_flashcards()
-    category = request.args.get('category')
-    favorite = request.args.get('favorite')
+    # GET: Lấy danh sách flashcard (lọc qua chỉ mục, phân trang bằng cursor, chọn trường)
+    filters = []
+    if request.args.get('category'):
+        filters.append(('category', request.args['category']))
+    for field in FLAG_FIELDS:
+        if request.args.get(field) == 'true':
+            filters.append((field, True))
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    cursor = request.args.get('cursor', type=int)
+    # Không truyền limit/cursor -> trả về toàn bộ như trước
+    if 'limit' in request.args or cursor is not None:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    else:
+        limit = len(flashcard_store) or 1
     
-    if category:
-        flashcards = [c for c in flashcards if c.get('category') == category]
-    if favorite == 'true':
-        flashcards = [c for c in flashcards if c.get('favorite')]
+    def build():
+        cards, next_cursor, total = facet_index.page(flashcard_store, filters, cursor=cursor, limit=limit)
+        return jsonify({
+            'success': True,
+            'flashcards': [project(card, fields) for card in cards],
+            'count': total,
+            'next_cursor': next_cursor
+        })
     
-    return jsonify({'success': True, 'flashcards': flashcards, 'count': len(flashcards)})
+    return conditional_response(build)
 
 @app.route('/api/search', methods=['GET'])
 def search():
-    """Tìm kiếm flashcard"""
-    query = request.args.get('q', '').strip().lower()
+    """Tìm kiếm flashcard (theo tiền tố từng từ, không phân biệt dấu, xếp theo độ liên quan)"""
+    query = request.args.get('q', '').strip()
     if not query:
-        return jsonify({'success': True, 'flashcards': []})
+        return jsonify({'success': True, 'flashcards': [], 'count': 0})
     
-    flashcards = load_flashcards()
-    results = []
-    for card in flashcards:
-        if query in card.get('original', '').lower() or query in card.get('translated', '').lower():
-            results.append(card)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    total, ids = search_index.search(query, limit=limit, offset=offset)
+    results = [card for card in map(flashcard_store.get, ids) if card is not None]
     
-    return jsonify({'success': True, 'flashcards': results, 'count': len(results)})
+    return jsonify({'success': True, 'flashcards': results, 'count': total,
+                    'limit': limit, 'offset': offset})
 
 @app.route('/api/review', methods=['POST'])
 def review_flashcard():
@@ -864,49 +1269,104 @@ def review_flashcard():
     data = request.json
     card_id = data.get('card_id')
     is_correct = data.get('is_correct', False)
+    grade = data.get('grade')  # 0-5 (SM-2), mặc định suy ra từ is_correct
     
-    flashcards = load_flashcards()
-    card = next((c for c in flashcards if c['id'] == card_id), None)
+    if grade is None:
+        grade = scheduler.grade_from_answer(is_correct)
+    else:
+        try:
+            grade = int(grade)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'grade must be an integer 0-5'}), 400
+        if not 0 <= grade <= 5:
+            return jsonify({'error': 'grade must be an integer 0-5'}), 400
+        is_correct = grade >= 3
+    
+    card = flashcard_store.get(card_id)
     
     if not card:
         return jsonify({'error': 'Flashcard not found'}), 404
     
-    card['review_count'] = card.get('review_count', 0) + 1
-    card['last_reviewed'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
+    now = datetime.now()
+    changes = {
+        'review_count': card.get('review_count', 0) + 1,
+        'last_reviewed': now.strftime('%Y-%m-%d %H:%M:%S'),
+        **scheduler.review(card, grade, now)
+    }
     if is_correct:
-        card['correct_count'] = card.get('correct_count', 0) + 1
+        changes['correct_count'] = card.get('correct_count', 0) + 1
     else:
-        card['wrong_count'] = card.get('wrong_count', 0) + 1
+        changes['wrong_count'] = card.get('wrong_count', 0) + 1
     
-    save_flashcards(flashcards)
+    card = flashcard_store.update(card_id, changes)
     return jsonify({'success': True, 'flashcard': card})
 
+@app.route('/api/learn/next', methods=['GET'])
+def learn_next():
+    """Các card đến hạn ôn sớm nhất cho buổi học (kèm vài card ngẫu nhiên làm đáp án nhiễu cho quiz)"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    ahead = request.args.get('ahead', 'false').lower() == 'true'
+    ids, next_due = due_queue.next(limit=limit, ahead=ahead)
+    cards = [card for card in map(flashcard_store.get, ids) if card is not None]
+    distractors = [flashcard_store.get(i) for i in facet_index.sample(3, exclude=set(ids))]
+    return jsonify({
+        'success': True,
+        'flashcards': cards,
+        'distractors': [project(c, ['translated']) for c in distractors if c is not None],
+        'next_due': datetime.fromtimestamp(next_due).strftime('%Y-%m-%d %H:%M:%S') if next_due else None
+    })
+
 @app.route('/api/stats', methods=['GET'])
 def stats():
-    """Thống kê"""
-    flashcards = load_flashcards()
-    
-    total = len(flashcards)
-    reviewed = len([c for c in flashcards if c.get('review_count', 0) > 0])
-    favorites = len([c for c in flashcards if c.get('favorite')])
-    
-    total_correct = sum(c.get('correct_count', 0) for c in flashcards)
-    total_wrong = sum(c.get('wrong_count', 0) for c in flashcards)
-    accuracy = (total_correct / (total_correct + total_wrong) * 100) if (total_correct + total_wrong) > 0 else 0
-    
+    """Thống kê (tổng hợp được cập nhật dần theo từng thay đổi, không quét bộ thẻ)"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
     return jsonify({
         'success': True,
-        'stats': {
-            'total': total,
-            'reviewed': reviewed,
-            'favorites': favorites,
-            'accuracy': round(accuracy, 2),
-            'total_correct': total_correct,
-            'total_wrong': total_wrong
-        }
+        'stats': stats_index.totals(),
+        'activity': stats_index.activity.series(days)
     })
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Trạng thái sẵn sàng: 200 khi OCR đã nạp model, 503 khi đang nạp/không dùng được (trang web vẫn chạy)"""
+    state = ocr_pool.state if PADDLEOCR_AVAILABLE else 'unavailable'
+    return jsonify({
+        'status': 'ok' if state == 'ready' else state,
+        'ocr': ocr_pool.status,
+        'uptime': round(time.time() - STARTED_AT, 1),
+    }), 200 if state == 'ready' else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics cho Prometheus scrape"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.cli.command('dedupe-uploads')
+@click.option('--dry-run', is_flag=True, help='Chỉ liệt kê, không xóa file')
+def dedupe_uploads_command(dry_run):
+    """Gom các ảnh trùng nội dung trong uploads/, giữ bản cũ nhất và cập nhật flashcard trỏ tới bản bị xóa"""
+    replaced = dedupe_directory(upload_index, dry_run=dry_run)
+    for removed, kept in replaced.items():
+        print(f"{'🔍' if dry_run else '🗑️ '} {removed} -> {kept}")
+    
+    updated = 0
+    if not dry_run:
+        for card in flashcard_store.all():
+            name = Path(card.get('image') or '').name
+            if name in replaced:
+                flashcard_store.update(card['id'], {'image': upload_info(replaced[name])['path']})
+                updated += 1
+    print(f"✅ {len(replaced)} duplicate upload(s), {updated} flashcard(s) updated")
+
+@app.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Chỉ liệt kê, không xóa file')
+def gc_uploads_command(dry_run):
+    """Xóa ảnh trong uploads/ không còn flashcard nào dùng và cũ hơn UPLOAD_TTL"""
+    removed = upload_retention.collect(dry_run=dry_run)
+    for name in sorted(removed):
+        print(f"{'🔍' if dry_run else '🗑️ '} {name}")
+    print(f"✅ {len(removed)} unused upload(s), {sum(removed.values()) // 1024} KB")
+
 if __name__ == '__main__':
     print("="*80)
     print("🚀 Starting Flask App...")
@@ -919,5 +1379,9 @@ if __name__ == '__main__':
     print("🌐 Open: http://127.0.0.1:5000")
     print("="*80)
     
+    # Với debug reloader, chỉ nạp model và chạy thu gom trong process con thực sự phục vụ request
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_ocr_pool()
+    
     app.run(debug=True, host='127.0.0.1', port=5000)
 
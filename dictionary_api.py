@@ -1,15 +1,72 @@
 """
 Dictionary API - Lấy thông tin từ điển cho flashcard
 Sử dụng Free Dictionary API: https://dictionaryapi.dev/
+Kết quả được cache: LRU trong bộ nhớ + SQLite trên đĩa (có TTL, cache cả kết quả 404 với TTL ngắn hơn)
 """
 
+import os
 import requests
 import json
-from typing import Dict, Optional, List
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, List, Iterable
+
+import metrics
+from kv_cache import LRUCache, SQLiteCache
+
+API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/{}"
+MAX_WORKERS = 8  # Số request song song tối đa cho get_word_info_many
+CACHE_TTL = 30 * 24 * 3600  # Từ tìm thấy: giữ 30 ngày
+NEGATIVE_CACHE_TTL = 24 * 3600  # Từ không có (404): giữ 1 ngày
+NEGATIVE_MEMORY_TTL = 10 * 60  # Kết quả rỗng trong LRU bộ nhớ: hết hạn sớm để hỏi lại đĩa/API
+DEFAULT_CACHE_PATH = Path(__file__).parent.absolute() / '.cache' / 'dictionary.sqlite3'
+
+_memory_cache = LRUCache(max_entries=4096)
+_disk_cache = None
+_session = None
+_lock = threading.Lock()
+
+
+def configure_cache(path=None, enabled: bool = True):
+    """Đổi file cache trên đĩa (hoặc tắt cache đĩa với enabled=False)"""
+    global _disk_cache
+    with _lock:
+        if _disk_cache is not None:
+            _disk_cache.close()
+        _disk_cache = None
+        if enabled:
+            _disk_cache = SQLiteCache(path or os.environ.get('DICTIONARY_CACHE', DEFAULT_CACHE_PATH),
+                                      table='word_info', ttl=CACHE_TTL)
+        _memory_cache.clear()
+
+
+def _get_disk_cache() -> Optional[SQLiteCache]:
+    if _disk_cache is None:
+        try:
+            configure_cache()
+        except Exception as e:
+            print(f"⚠️  Dictionary disk cache disabled: {e}")
+    return _disk_cache
+
+
+def _get_session() -> requests.Session:
+    """requests.Session dùng chung để giữ kết nối keep-alive tới API"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
 
 def get_word_info(word: str) -> Dict:
     """
-    Lấy thông tin từ điển cho một từ tiếng Anh
+    Lấy thông tin từ điển cho một từ tiếng Anh (có cache)
     
     Returns:
         {
@@ -25,10 +82,74 @@ def get_word_info(word: str) -> Dict:
     word = word.strip().lower()
     if not word:
         return {}
-    
+    return get_word_info_many([word]).get(word, {})
+
+
+def get_word_info_many(words: Iterable[str], max_workers: int = MAX_WORKERS) -> Dict[str, Dict]:
+    """
+    Lấy thông tin từ điển cho nhiều từ: từ đã cache trả về ngay,
+    các từ còn lại được gọi API song song (tối đa max_workers request cùng lúc)
+
+    Returns:
+        {word (lowercase): info} - info rỗng nếu không tìm thấy
+    """
+    words = [w.strip().lower() for w in words if w and w.strip()]
+    words = list(dict.fromkeys(words))
+    results = {}
+
+    missing = []
+    for word in words:
+        info = _memory_cache.get(word)
+        if info is not None:
+            results[word] = info
+        else:
+            missing.append(word)
+    metrics.CACHE_REQUESTS.inc(len(results), cache='dictionary', result='memory_hit')
+
+    disk = _get_disk_cache() if missing else None
+    if disk is not None:
+        for word, info in disk.get_many(missing).items():
+            _memory_cache.set(word, info, ttl=None if info else NEGATIVE_MEMORY_TTL)
+            results[word] = info
+        metrics.CACHE_REQUESTS.inc(len(results) - (len(words) - len(missing)), cache='dictionary',
+                                   result='disk_hit')
+        missing = [w for w in missing if w not in results]
+
+    if missing:
+        metrics.CACHE_REQUESTS.inc(len(missing), cache='dictionary', result='miss')
+        workers = max(1, min(max_workers, len(missing)))
+        if workers == 1:
+            fetched = [_fetch_word_info(w) for w in missing]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fetched = list(executor.map(_fetch_word_info, missing))
+
+        positive, negative = {}, {}
+        for word, (info, cacheable) in zip(missing, fetched):
+            results[word] = info
+            if cacheable:
+                _memory_cache.set(word, info, ttl=None if info else NEGATIVE_MEMORY_TTL)
+                (positive if info else negative)[word] = info
+        if disk is not None:
+            disk.set_many(positive)
+            disk.set_many(negative, ttl=NEGATIVE_CACHE_TTL)
+
+    return results
+
+
+def _fetch_word_info(word: str):
+    """
+    Gọi API cho một từ.
+
+    Returns:
+        (info, cacheable) - cacheable=False khi lỗi mạng/server (không cache để thử lại sau)
+    """
     try:
-        url = f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}"
-        response = requests.get(url, timeout=5)
+        with metrics.stage('dictionary_fetch'):
+            response = _get_session().get(API_URL.format(word), timeout=5)
+        
+        if response.status_code == 404:
+            return {}, True
         
         if response.status_code == 200:
             data = response.json()
@@ -109,12 +230,15 @@ def get_word_info(word: str) -> Dict:
                     'antonyms': list(set(antonyms))[:5],  # Lấy 5 từ trái nghĩa
                     'collocations': collocations[:5],  # Lấy 5 collocations
                     'audio': audio_url
-                }
+                }, True
+            return {}, True
         
-        return {}
+        metrics.STAGE_ERRORS.inc(stage='dictionary_fetch', reason=f'http_{response.status_code}')
+        return {}, False
     except Exception as e:
+        metrics.STAGE_ERRORS.inc(stage='dictionary_fetch', reason='error')
         print(f"⚠️  Error fetching dictionary info for '{word}': {e}")
-        return {}
+        return {}, False
 
 def get_collocations(word: str) -> List[str]:
     """Lấy collocations cho một từ"""
@@ -0,0 +1,163 @@
+"""
+Flashcard Index - Chỉ mục lọc + phân trang cho danh sách flashcard
+Mỗi bộ lọc (danh mục, yêu thích, đã học...) giữ danh sách id đã sắp xếp,
+phân trang bằng cursor (id cuối của trang trước) với bisect thay vì quét cả bộ thẻ.
+"""
+
+import bisect
+import random
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flashcard_store import StoreIndex
+
+# Các trường boolean có chỉ mục riêng: ?favorite=true, ?learned=true, ?not_learned=true
+FLAG_FIELDS = ('favorite', 'learned', 'not_learned')
+ALL = ('all',)
+
+
+def _facets(card: Dict) -> List[Tuple]:
+    keys = [ALL]
+    if card.get('category'):
+        keys.append(('category', card['category']))
+    for field in FLAG_FIELDS:
+        if card.get(field):
+            keys.append((field, True))
+    return keys
+
+
+def _matches(card: Optional[Dict], key: Tuple) -> bool:
+    if card is None:
+        return False
+    if key == ALL:
+        return True
+    if key[0] == 'category':
+        return card.get('category') == key[1]
+    return bool(card.get(key[0]))
+
+
+def project(card: Dict, fields: Optional[Iterable[str]]) -> Dict:
+    """Chỉ giữ các trường được yêu cầu (luôn có id)"""
+    if not fields:
+        return card
+    return {key: card[key] for key in ('id', *fields) if key in card}
+
+
+class FacetIndex(StoreIndex):
+    """Danh sách id (tăng dần) theo từng giá trị lọc: ('all',), ('category', x), ('favorite', True)..."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._lists: Dict[Tuple, List[int]] = {}
+
+    def rebuild(self, cards):
+        with self._lock:
+            self._lists = {}
+            for card in cards:
+                for key in _facets(card):
+                    self._lists.setdefault(key, []).append(card['id'])
+            for ids in self._lists.values():
+                ids.sort()
+
+    def on_change(self, old, new):
+        old_keys = set(_facets(old)) if old is not None else set()
+        new_keys = set(_facets(new)) if new is not None else set()
+        with self._lock:
+            for key in old_keys - new_keys:
+                ids = self._lists.get(key, [])
+                i = bisect.bisect_left(ids, old['id'])
+                if i < len(ids) and ids[i] == old['id']:
+                    del ids[i]
+                if not ids:
+                    self._lists.pop(key, None)
+            for key in new_keys - old_keys:
+                ids = self._lists.setdefault(key, [])
+                # Card mới luôn có id lớn nhất -> thường là append O(1)
+                if not ids or ids[-1] < new['id']:
+                    ids.append(new['id'])
+                else:
+                    bisect.insort(ids, new['id'])
+
+    def count(self, key: Tuple = ALL) -> int:
+        return len(self._lists.get(key, ()))
+
+    def categories(self) -> Dict[str, int]:
+        with self._lock:
+            return {key[1]: len(ids) for key, ids in self._lists.items() if key[0] == 'category'}
+
+    def sample(self, k: int, exclude=()) -> List[int]:
+        """Chọn ngẫu nhiên tối đa k id khác nhau (không quét cả bộ thẻ)"""
+        with self._lock:
+            ids = self._lists.get(ALL, [])
+            if len(ids) <= k + len(exclude):
+                return [card_id for card_id in ids if card_id not in exclude][:k]
+            picked = set()
+            while len(picked) < k:
+                card_id = ids[random.randrange(len(ids))]
+                if card_id not in exclude:
+                    picked.add(card_id)
+            return list(picked)
+
+    def page(self, store, filters: List[Tuple], cursor: Optional[int] = None,
+             limit: int = 100) -> Tuple[List[Dict], Optional[int], int]:
+        """
+        Một trang card thỏa mọi bộ lọc, theo id tăng dần, bắt đầu sau `cursor`.
+
+        Returns:
+            (cards, next_cursor hoặc None nếu hết, tổng số card thỏa bộ lọc)
+        """
+        filters = filters or [ALL]
+        with self._lock:
+            # Duyệt danh sách ngắn nhất, các bộ lọc còn lại kiểm tra trực tiếp trên card
+            filters = sorted(filters, key=lambda key: len(self._lists.get(key, ())))
+            matching = self._lists.get(filters[0], [])
+            if len(filters) > 1:
+                matching = [card_id for card_id in matching
+                            if all(_matches(store.get(card_id), key) for key in filters[1:])]
+            total = len(matching)
+            start = bisect.bisect_right(matching, cursor) if cursor is not None else 0
+            ids = matching[start:start + limit]
+            has_more = start + limit < total
+        cards = [card for card in map(store.get, ids) if card is not None]
+        return cards, (ids[-1] if has_more and ids else None), total
+
+
+def normalize_original(text) -> str:
+    """Khóa so trùng của mặt trước: bỏ khoảng trắng thừa, không phân biệt hoa/thường"""
+    return ' '.join(str(text or '').split()).casefold()
+
+
+class OriginalIndex(StoreIndex):
+    """Id các card theo mặt trước đã chuẩn hóa - kiểm tra trùng khi tạo card hàng loạt"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, List[int]] = {}
+
+    def rebuild(self, cards):
+        ids: Dict[str, List[int]] = {}
+        for card in cards:
+            ids.setdefault(normalize_original(card.get('original')), []).append(card['id'])
+        with self._lock:
+            self._ids = ids
+
+    def on_change(self, old, new):
+        before = normalize_original(old.get('original')) if old else None
+        after = normalize_original(new.get('original')) if new else None
+        if before == after:
+            return
+        with self._lock:
+            if before is not None:
+                ids = self._ids.get(before, [])
+                if old['id'] in ids:
+                    ids.remove(old['id'])
+                if not ids:
+                    self._ids.pop(before, None)
+            if after is not None:
+                self._ids.setdefault(after, []).append(new['id'])
+
+    def find(self, original) -> Optional[int]:
+        """Id card cũ nhất có cùng mặt trước, None nếu chưa có"""
+        with self._lock:
+            ids = self._ids.get(normalize_original(original))
+            return min(ids) if ids else None
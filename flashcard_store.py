@@ -0,0 +1,504 @@
+"""
+Flashcard Store - Lưu trữ flashcard có chỉ mục trong bộ nhớ
+Snapshot JSON (flashcards.json) + write-ahead log (flashcards.wal) ghi nối tiếp
+Shared mode: nhiều process (worker gunicorn) dùng chung thư mục, đồng bộ qua WAL + khóa file
+"""
+
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Iterable
+
+import metrics
+
+SNAPSHOT_NAME = 'flashcards.json'
+WAL_NAME = 'flashcards.wal'
+LOCK_NAME = 'flashcards.lock'
+META_NAME = 'flashcards.meta.json'  # ID lớn nhất đã cấp (không dùng lại ID của card đã xóa)
+
+
+def _fsync_dir(path: Path):
+    """fsync thư mục để việc rename được ghi xuống đĩa (bỏ qua trên Windows)"""
+    if os.name == 'nt':
+        return
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _stamp(path: Path):
+    """Định danh phiên bản của file (đổi khi file bị ghi đè bằng rename), None nếu không có"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def atomic_write_json(path: Path, data, indent: Optional[int] = 2):
+    """Ghi JSON ra file tạm, fsync rồi rename đè lên file đích"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path.parent)
+
+
+@contextmanager
+def file_lock(path, exclusive: bool = True):
+    """Khóa file giữa các process (fcntl.flock, chỉ POSIX) cho các file trạng thái dùng chung khác"""
+    import fcntl
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def try_file_lock(path):
+    """
+    Khóa độc quyền không chờ (fcntl.flock LOCK_NB, chỉ POSIX): trả về file đang mở (đóng file hoặc process
+    thoát thì nhả khóa), None nếu process khác đang giữ. Dùng để chọn một process chạy thread nền.
+    """
+    import fcntl
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class StoreIndex:
+    """
+    Chỉ mục phụ (tìm kiếm, lọc, thống kê...) được store cập nhật sau mỗi thay đổi.
+    Các hàm được gọi bên trong lock của store (theo đúng thứ tự thay đổi);
+    chỉ mục tự khóa nếu có thread khác đọc song song.
+    """
+
+    def rebuild(self, cards: List[Dict]):
+        """Dựng lại từ đầu (khi gắn vào store, sau clear/replace_all)"""
+        raise NotImplementedError
+
+    def on_change(self, old: Optional[Dict], new: Optional[Dict]):
+        """Một card thay đổi: old=None là thêm mới, new=None là xóa (old là bản sao trước khi sửa)"""
+        raise NotImplementedError
+
+    def on_remote_change(self, old: Optional[Dict], new: Optional[Dict]):
+        """Thay đổi do process khác ghi, đọc từ WAL (shared mode); mặc định xử lý như on_change"""
+        self.on_change(old, new)
+
+
+class FlashcardStore:
+    """
+    Kho flashcard giữ chỉ mục id → card trong bộ nhớ giữa các request.
+
+    - Mỗi thay đổi được ghi nối tiếp một dòng vào WAL (O(1)), không ghi lại cả file
+    - Sau `compact_every` thao tác, WAL được gộp vào snapshot JSON (ghi atomic + fsync)
+    - Snapshot vẫn là list JSON như flashcards.json cũ nên dữ liệu cũ dùng được ngay
+    - ID tăng dần, không cấp lại ID của card đã xóa (ID lớn nhất được lưu trong flashcards.meta.json)
+
+    Các dict trả về là object bên trong store, không sửa trực tiếp mà dùng update().
+
+    shared=True (nhiều process cùng thư mục, chỉ POSIX): ghi giữ khóa file độc quyền và áp dụng
+    trước các dòng WAL do process khác ghi; sync() đọc thêm các dòng đó (gọi đầu mỗi request).
+    """
+
+    def __init__(self, folder, compact_every: int = 500, shared: bool = False):
+        self.folder = Path(folder)
+        self.snapshot_file = self.folder / SNAPSHOT_NAME
+        self.wal_file = self.folder / WAL_NAME
+        self.meta_file = self.folder / META_NAME
+        self.compact_every = compact_every
+        self.shared = shared
+
+        self._lock = threading.RLock()
+        self._cards: Dict[int, Dict] = {}
+        self._max_id = 0
+        self._saved_max_id = 0
+        self._wal = None
+        self._wal_ops = 0
+        self._wal_offset = 0  # Số byte WAL đã áp dụng vào chỉ mục
+        self._snapshot_stamp = None
+        self._flock = None
+        self._flock_depth = 0
+        self._indexes: List[StoreIndex] = []
+        # Phiên bản dữ liệu: tăng sau mỗi thay đổi (dùng cho ETag); instance_id phân biệt các lần khởi động
+        self.version = 0
+        self.instance_id = uuid.uuid4().hex[:8]
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------ #
+    # Load / replay
+    # ------------------------------------------------------------------ #
+    def _load(self, compact: bool = True):
+        with self._lock, self._file_lock(exclusive=True):
+            self._cards = {}
+            duplicates = 0
+            self._saved_max_id = self._load_meta().get('last_id', 0)
+
+            if self.snapshot_file.exists():
+                try:
+                    with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    for card in data if isinstance(data, list) else []:
+                        if isinstance(card, dict) and 'id' in card:
+                            # Loại bỏ duplicate dựa trên ID (giữ card đầu tiên)
+                            if card['id'] in self._cards:
+                                duplicates += 1
+                                continue
+                            self._cards[card['id']] = card
+                except Exception as e:
+                    print(f"❌ Error loading flashcards: {e}")
+            self._snapshot_stamp = _stamp(self.snapshot_file)
+
+            self._max_id = max(self._saved_max_id, max(self._cards, default=0))
+            self._wal_offset = 0
+            replayed = self._replay_wal()
+            self._wal_ops = replayed
+
+            if duplicates:
+                print(f"⚠️  Phát hiện {duplicates} flashcard trùng lặp, đã loại bỏ")
+            # Gộp WAL còn sót lại (hoặc dữ liệu vừa làm sạch) vào snapshot
+            if compact and (replayed or duplicates):
+                self.compact()
+
+    def _replay_wal(self, notify: bool = False) -> int:
+        """
+        Áp dụng các thao tác trong WAL từ vị trí đã đọc tới cuối file, trả về số dòng đã áp dụng.
+        notify=True: cập nhật cả chỉ mục phụ (khi đọc thay đổi của process khác)
+        """
+        try:
+            f = open(self.wal_file, 'rb')
+        except FileNotFoundError:
+            return 0
+        count = 0
+        rebuild = False
+        with f:
+            f.seek(self._wal_offset)
+            for line in f:
+                if not line.endswith(b'\n') and self.shared:
+                    break  # Process khác đang ghi dở dòng này -> đọc lại lần sau
+                self._wal_offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Dòng cuối bị ghi dở (mất điện/crash) -> bỏ qua
+                    print("⚠️  Bỏ qua dòng WAL hỏng")
+                    continue
+                changes = self._apply(entry)
+                count += 1
+                if notify and not rebuild:
+                    if changes is None:
+                        rebuild = True
+                    else:
+                        for change in changes:
+                            self._notify(*change, remote=True)
+        if rebuild:
+            self._rebuild_indexes()
+        return count
+
+    def _apply(self, entry: Dict):
+        """Áp dụng một dòng WAL, trả về list (old, new) như StoreIndex.on_change, None nếu là clear"""
+        op = entry.get('op')
+        if op in ('put', 'put_many'):
+            changes = []
+            for card in entry['cards'] if op == 'put_many' else [entry['card']]:
+                changes.append((self._cards.get(card['id']), card))
+                self._cards[card['id']] = card
+                self._max_id = max(self._max_id, card['id'])
+            return changes
+        if op == 'delete':
+            old = self._cards.pop(entry['id'], None)
+            return [(old, None)] if old is not None else []
+        if op == 'clear':
+            self._cards.clear()
+            return None
+        return []
+
+    def _load_meta(self) -> Dict:
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # ------------------------------------------------------------------ #
+    # Shared mode (nhiều process)
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Khóa file giữa các process (lồng nhau được trong cùng process; no-op khi không shared)"""
+        if not self.shared or self._flock_depth:
+            self._flock_depth += 1
+            try:
+                yield
+            finally:
+                self._flock_depth -= 1
+            return
+        import fcntl
+        self._flock = open(self.folder / LOCK_NAME, 'a')
+        fcntl.flock(self._flock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._flock_depth = 1
+        try:
+            yield
+        finally:
+            self._flock_depth = 0
+            fcntl.flock(self._flock, fcntl.LOCK_UN)
+            self._flock.close()
+            self._flock = None
+
+    @contextmanager
+    def _writing(self):
+        """Giữ khóa ghi; shared mode: áp dụng thay đổi của process khác trước khi ghi"""
+        with self._lock, self._file_lock(exclusive=True):
+            if self.shared:
+                self._catch_up()
+            yield
+
+    def _catch_up(self):
+        if _stamp(self.snapshot_file) != self._snapshot_stamp:
+            # Process khác đã gộp WAL vào snapshot (hoặc thay toàn bộ dữ liệu) -> nạp lại từ đầu
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            self._load(compact=False)
+            self._rebuild_indexes()
+        else:
+            self._wal_ops += self._replay_wal(notify=True)
+
+    def sync(self):
+        """Shared mode: áp dụng các thay đổi do process khác ghi (rẻ khi không có gì mới)"""
+        if not self.shared:
+            return
+        with self._lock, self._file_lock(exclusive=False):
+            self._catch_up()
+
+    # ------------------------------------------------------------------ #
+    # Persist
+    # ------------------------------------------------------------------ #
+    def _append(self, entries: Iterable[Dict], ops: Optional[int] = None):
+        """
+        Ghi nối tiếp các thao tác vào WAL và fsync một lần (`ops`: số thao tác, mặc định số dòng).
+        Gọi trước khi áp dụng thay đổi vào bộ nhớ: ghi lỗi thì WAL được cắt về như cũ và không có gì thay đổi.
+        """
+        if self._wal is None:
+            self._wal = open(self.wal_file, 'a', encoding='utf-8')
+        start = os.fstat(self._wal.fileno()).st_size
+        n = 0
+        try:
+            with metrics.stage('store_append'):
+                for entry in entries:
+                    self._wal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                    n += 1
+                self._wal.flush()
+                os.fsync(self._wal.fileno())
+        except BaseException:
+            # Bỏ phần dòng ghi dở để lần ghi sau không nối vào dòng hỏng
+            try:
+                self._wal.close()
+            except OSError:
+                pass
+            self._wal = None
+            try:
+                os.truncate(self.wal_file, start)
+            except OSError:
+                pass
+            raise
+        self._wal_offset = os.fstat(self._wal.fileno()).st_size
+        self._wal_ops += n if ops is None else ops
+
+    def _maybe_compact(self):
+        """Gộp WAL vào snapshot sau `compact_every` thao tác (gọi sau khi đã áp dụng thay đổi)"""
+        if self._wal_ops >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Ghi toàn bộ chỉ mục ra snapshot (atomic) rồi xóa WAL"""
+        with self._writing(), metrics.stage('store_compact'):
+            self._compact(self._cards, self._max_id)
+
+    def _compact(self, cards: Dict[int, Dict], max_id: int):
+        # Lưu ID lớn nhất trước khi xóa WAL (card có ID lớn nhất có thể đã bị xóa)
+        if max_id > self._saved_max_id:
+            atomic_write_json(self.meta_file, {'last_id': max_id}, indent=None)
+            self._saved_max_id = max_id
+        atomic_write_json(self.snapshot_file, list(cards.values()))
+        self._snapshot_stamp = _stamp(self.snapshot_file)
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        if self.wal_file.exists():
+            os.remove(self.wal_file)
+            _fsync_dir(self.folder)
+        self._wal_ops = 0
+        self._wal_offset = 0
+
+    def close(self):
+        """Gộp WAL vào snapshot và đóng file (gọi khi tắt server)"""
+        with self._writing():
+            if self._wal_ops:
+                self.compact()
+            elif self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+    # ------------------------------------------------------------------ #
+    # Secondary indexes
+    # ------------------------------------------------------------------ #
+    def attach(self, index: StoreIndex) -> StoreIndex:
+        """Gắn một chỉ mục phụ: dựng từ dữ liệu hiện có, sau đó cập nhật theo từng thay đổi"""
+        with self._lock:
+            index.rebuild(list(self._cards.values()))
+            self._indexes.append(index)
+            return index
+
+    def refresh(self, index: StoreIndex):
+        """Dựng lại một chỉ mục đã gắn từ dữ liệu hiện tại (dưới lock của store)"""
+        with self._lock:
+            index.rebuild(list(self._cards.values()))
+
+    def _notify(self, old: Optional[Dict], new: Optional[Dict], remote: bool = False):
+        self.version += 1
+        for index in self._indexes:
+            if remote:
+                index.on_remote_change(old, new)
+            else:
+                index.on_change(old, new)
+
+    def _rebuild_indexes(self):
+        self.version += 1
+        cards = list(self._cards.values())
+        for index in self._indexes:
+            index.rebuild(cards)
+
+    # ------------------------------------------------------------------ #
+    # Read
+    # ------------------------------------------------------------------ #
+    def __len__(self):
+        return len(self._cards)
+
+    def __contains__(self, card_id):
+        return card_id in self._cards
+
+    def get(self, card_id) -> Optional[Dict]:
+        return self._cards.get(card_id)
+
+    def all(self) -> List[Dict]:
+        """Danh sách card theo thứ tự tạo (list mới, có thể sắp xếp lại tùy ý)"""
+        with self._lock:
+            return list(self._cards.values())
+
+    @property
+    def etag(self) -> str:
+        """Định danh trạng thái hiện tại của dữ liệu (đổi sau mỗi thay đổi hoặc khởi động lại)"""
+        if self.shared:
+            # Giống nhau giữa các process đã đồng bộ: theo phiên bản snapshot + vị trí WAL
+            ino, mtime_ns, _ = self._snapshot_stamp or (0, 0, 0)
+            return f"{ino:x}{mtime_ns:x}-{self._wal_offset:x}"
+        return f"{self.instance_id}-{self.version}"
+
+    def next_id(self) -> int:
+        """ID sẽ cấp cho card mới tiếp theo (chỉ để hiển thị; add/add_many tự cấp ID)"""
+        return self._max_id + 1
+
+    # ------------------------------------------------------------------ #
+    # Write
+    # ------------------------------------------------------------------ #
+    def add(self, card: Dict) -> Dict:
+        return self.add_many([card])[0]
+
+    def add_many(self, cards: List[Dict], skip: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """
+        Thêm nhiều card trong một dòng WAL (cả lô được ghi hoặc không card nào), một lần fsync.
+        Card chưa có id được cấp id mới. `skip(card)` -> True thì bỏ qua card đó; được gọi trong lock
+        nên kiểm tra trùng + thêm là nguyên tử với các request khác. Trả về các card đã thêm.
+        """
+        with self._writing():
+            added = []
+            next_id = self.next_id()
+            for card in cards:
+                if skip is not None and skip(card):
+                    continue
+                if card.get('id') is None:
+                    card['id'] = next_id
+                next_id = max(next_id, card['id'] + 1)
+                added.append(card)
+            if not added:
+                return added
+            # Ghi WAL trước, chỉ đổi bộ nhớ/chỉ mục khi đã ghi xong
+            if len(added) == 1:
+                self._append([{'op': 'put', 'card': added[0]}])
+            else:
+                self._append([{'op': 'put_many', 'cards': added}], ops=len(added))
+            for card in added:
+                old = self._cards.get(card['id'])
+                self._cards[card['id']] = card
+                self._max_id = max(self._max_id, card['id'])
+                self._notify(old, card)
+            self._maybe_compact()
+            return added
+
+    def update(self, card_id, fields: Dict) -> Optional[Dict]:
+        """Cập nhật các trường của card (không cho đổi id), trả về card hoặc None"""
+        with self._writing():
+            card = self._cards.get(card_id)
+            if card is None:
+                return None
+            fields = {key: value for key, value in fields.items() if key != 'id'}
+            self._append([{'op': 'put', 'card': {**card, **fields}}])
+            old = dict(card) if self._indexes else None
+            card.update(fields)
+            self._notify(old, card)
+            self._maybe_compact()
+            return card
+
+    def delete(self, card_id) -> Optional[Dict]:
+        with self._writing():
+            if card_id not in self._cards:
+                return None
+            self._append([{'op': 'delete', 'id': card_id}])
+            card = self._cards.pop(card_id)
+            self._notify(card, None)
+            self._maybe_compact()
+            return card
+
+    def clear(self):
+        with self._writing():
+            self._append([{'op': 'clear'}])
+            self._cards.clear()
+            self._rebuild_indexes()
+            self._maybe_compact()
+
+    def replace_all(self, cards: List[Dict]):
+        """Thay toàn bộ dữ liệu (tương thích save_flashcards cũ) - ghi snapshot ngay"""
+        with self._writing(), metrics.stage('store_compact'):
+            new_cards = {}
+            for card in cards:
+                if isinstance(card, dict) and 'id' in card:
+                    new_cards.setdefault(card['id'], card)
+            max_id = max(self._max_id, max(new_cards, default=0))
+            self._compact(new_cards, max_id)
+            self._cards = new_cards
+            self._max_id = max_id
+            self._rebuild_indexes()
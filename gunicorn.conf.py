@@ -0,0 +1,33 @@
+"""
+Cấu hình gunicorn (Linux/macOS): gunicorn -c gunicorn.conf.py wsgi:app
+Mỗi worker process chạy `WEB_THREADS` thread phục vụ request + `OCR_WORKERS` thread OCR riêng.
+"""
+
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_WORKERS', 2))
+threads = int(os.environ.get('WEB_THREADS', 8))
+worker_class = 'gthread'
+
+# Import app (và nạp model, xem wsgi.py) một lần trong master rồi mới fork worker
+preload_app = True
+
+# Request OCR có thể chờ tới OCR_TIMEOUT -> timeout của worker phải dài hơn
+timeout = int(os.environ.get('WEB_TIMEOUT', float(os.environ.get('OCR_TIMEOUT', 120)) + 60))
+# Thời gian chờ request/job OCR đang chạy khi tắt hoặc reload (SIGTERM/SIGHUP)
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 120))
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    """Thread không sống sót qua fork -> khởi động worker OCR, hàng đợi job và các thread nền (thu gom uploads/, dọn thumbnail) trong từng worker"""
+    import app
+    app.start_ocr_pool()
+
+
+def worker_exit(server, worker):
+    """Worker đã ngừng nhận request: chờ job OCR nền chạy xong rồi gộp WAL"""
+    import app
+    app.drain_ocr(max(1, graceful_timeout - 10))  # Xong trước khi master kill worker
@@ -0,0 +1,431 @@
+"""
+Image Hash - Perceptual hash (pHash/dHash) và chỉ mục BK-tree để tìm ảnh upload trùng
+pHash chỉ dùng để chọn ứng viên: ảnh chữ viết tay khác nhau (một từ mực tối trên giấy sáng) rất hay
+có hash gần nhau. Ứng viên được xác nhận bằng nội dung file giống hệt (digest) hoặc bằng độ tương quan
+của chữ ký điểm ảnh (ảnh xám 64x64 đã trừ nền): nhận bản lưu lại, nén lại, đổi kích thước của cùng một ảnh.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from kv_cache import LRUCache
+
+DEFAULT_THRESHOLD = 10  # Khoảng cách Hamming tối đa (trên 64 bit) để lấy làm ứng viên
+# Độ tương quan chữ ký tối thiểu để coi là cùng một ảnh: bản nén lại/đổi kích thước >= 0.98,
+# hai từ viết tay khác nhau trên cùng nền giấy thường <= 0.85
+DEFAULT_SIMILARITY = 0.95
+SIGNATURE_SIZE = 64
+MAX_CANDIDATES = 8  # Số ứng viên gần nhất (theo pHash) được so chữ ký
+
+
+def _gray_small(data):
+    """Giải mã nhanh ảnh xám ở 1/4 kích thước (đủ cho hash)"""
+    import cv2
+    import numpy as np
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None:
+        from image_io import decode_image
+        color = decode_image(data)
+        if color is None:
+            return None
+        img = cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(gray) -> int:
+    """Difference hash 64 bit: so sánh các pixel kề nhau trên ảnh 9x8"""
+    import cv2
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray) -> int:
+    """Perceptual hash 64 bit: DCT ảnh 32x32, so 8x8 hệ số tần số thấp với median"""
+    import cv2
+    import numpy as np
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # Bỏ hệ số DC (độ sáng trung bình) khi tính median
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+HASHES = {'phash': phash, 'dhash': dhash}
+
+
+def signature(gray):
+    """
+    Chữ ký điểm ảnh: ảnh xám 64x64 trừ nền (Gaussian blur lớn) để chỉ còn nét chữ,
+    chuẩn hóa trung bình 0 và độ dài 1 -> tích vô hướng của hai chữ ký là hệ số tương quan
+    """
+    import cv2
+    import numpy as np
+    small = cv2.resize(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    small -= cv2.GaussianBlur(small, (0, 0), 6)
+    small -= small.mean()
+    norm = np.linalg.norm(small)
+    return (small / norm if norm else small).astype(np.float16)
+
+
+def similarity(a, b) -> float:
+    """Hệ số tương quan của hai chữ ký (1.0 = giống hệt)"""
+    import numpy as np
+    return float(np.dot(a.ravel().astype(np.float32), b.ravel().astype(np.float32)))
+
+
+def hash_image_bytes(data, method: str = 'phash') -> Optional[int]:
+    """Hash perceptual của bytes ảnh, None nếu không giải mã được"""
+    gray = _gray_small(data)
+    if gray is None:
+        return None
+    return HASHES[method](gray)
+
+
+def fingerprint(data, method: str = 'phash') -> Optional[Dict]:
+    """{'hash', 'digest', 'signature'} của bytes ảnh (giải mã một lần), None nếu không giải mã được"""
+    gray = _gray_small(data)
+    if gray is None:
+        return None
+    return {'hash': HASHES[method](gray), 'digest': content_digest(data), 'signature': signature(gray)}
+
+
+def is_duplicate(a: Dict, b: Dict, threshold: int = DEFAULT_THRESHOLD,
+                 min_similarity: float = DEFAULT_SIMILARITY) -> bool:
+    """Hai fingerprint là cùng một ảnh: file giống hệt, hoặc pHash gần nhau và chữ ký tương quan cao"""
+    if a['digest'] == b['digest']:
+        return True
+    return (hamming(a['hash'], b['hash']) <= threshold
+            and similarity(a['signature'], b['signature']) >= min_similarity)
+
+
+def _stamp(path: Path):
+    """Định danh phiên bản file (đổi khi bị ghi đè bằng rename), None nếu không có"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def content_digest(data) -> str:
+    """Hash nội dung file (bytes) để xác nhận hai upload giống hệt nhau"""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """BK-tree theo khoảng cách Hamming: tìm mọi hash trong bán kính r mà không duyệt hết"""
+
+    def __init__(self):
+        self._root = None  # [hash, [items], {distance: node}]
+        self._size = 0
+
+    def add(self, value: int, item):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def remove(self, value: int, item) -> bool:
+        """Xóa item (node giữ lại làm điểm định tuyến)"""
+        node = self._root
+        while node is not None:
+            d = hamming(value, node[0])
+            if d == 0:
+                if item in node[1]:
+                    node[1].remove(item)
+                    self._size -= 1
+                    return True
+                return False
+            node = node[2].get(d)
+        return False
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        """Trả về [(distance, item)] sắp xếp theo khoảng cách tăng dần"""
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                results.extend((d, item) for item in node[1])
+            # Bất đẳng thức tam giác: chỉ nhánh có |k - d| <= radius mới có thể chứa kết quả
+            for k, child in node[2].items():
+                if d - radius <= k <= d + radius:
+                    stack.append(child)
+        results.sort(key=lambda r: r[0])
+        return results
+
+    def __len__(self):
+        return self._size
+
+
+class UploadIndex:
+    """
+    Chỉ mục perceptual hash của các file trong uploads/.
+    Mỗi entry: filename -> {'hash': int, 'digest': str}; chữ ký điểm ảnh không lưu trong chỉ mục
+    mà giữ trong LRU (`max_signatures`), file ứng viên chưa có chữ ký thì được giải mã lại khi so.
+
+    Lưu như kho flashcard: snapshot JSON (`index_file`) + log ghi nối tiếp (`.log` cạnh snapshot),
+    mỗi add/remove chỉ ghi một dòng; sau `compact_every` dòng log được gộp vào snapshot.
+    Chỉ mục là cache dựng lại được (lệnh dedupe-uploads) nên log không fsync.
+
+    shared=True (nhiều process, chỉ POSIX): ghi giữ khóa file và áp dụng trước các dòng log của
+    process khác; sync() đọc thêm các dòng đó (find() tự gọi).
+    """
+
+    def __init__(self, index_file, upload_dir, threshold: int = DEFAULT_THRESHOLD, method: str = 'phash',
+                 compact_every: int = 500, shared: bool = False, min_similarity: float = DEFAULT_SIMILARITY,
+                 max_signatures: int = 1024):
+        self.index_file = Path(index_file)
+        self.log_file = self.index_file.with_suffix('.log')
+        self.lock_file = self.index_file.with_suffix('.lock')
+        self.upload_dir = Path(upload_dir)
+        self.threshold = threshold
+        self.method = method
+        self.min_similarity = min_similarity
+        self.compact_every = compact_every
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict] = {}
+        self._tree = BKTree()
+        self._signatures = LRUCache(max_entries=max_signatures)  # filename -> chữ ký
+        self._log = None
+        self._log_ops = 0
+        self._log_offset = 0  # Số byte log đã áp dụng
+        self._snapshot_stamp = None
+        with self._lock, self._locked(exclusive=False):
+            self._load()
+
+    def _locked(self, exclusive: bool = True):
+        if not self.shared:
+            return nullcontext()
+        from flashcard_store import file_lock
+        return file_lock(self.lock_file, exclusive)
+
+    def _load(self):
+        """Nạp snapshot + log (gọi khi giữ self._lock và khóa file)"""
+        self._entries, self._tree = {}, BKTree()
+        self._snapshot_stamp = _stamp(self.index_file)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('method') == self.method:
+                for filename, entry in data.get('entries', {}).items():
+                    # Bỏ các file đã bị xóa khỏi uploads/ và entry cũ chưa có digest
+                    if entry.get('digest') and (self.upload_dir / filename).exists():
+                        self._apply({'op': 'add', 'name': filename, **entry})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Cannot load upload index: {e}")
+        self._log_offset = 0
+        self._log_ops = self._replay()
+
+    def _apply(self, op: Dict):
+        name = op['name']
+        old = self._entries.pop(name, None)
+        if old is not None:
+            self._tree.remove(old['hash'], name)
+        if op.get('op') == 'add':
+            self._entries[name] = {'hash': op['hash'], 'digest': op['digest']}
+            self._tree.add(op['hash'], name)
+
+    def _replay(self) -> int:
+        """Áp dụng log từ vị trí đã đọc tới cuối file, trả về số dòng đã áp dụng"""
+        try:
+            f = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            return 0
+        count = 0
+        with f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Đang được ghi dở -> đọc lại lần sau
+                self._log_offset += len(line)
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+                count += 1
+        return count
+
+    def _catch_up(self):
+        if _stamp(self.index_file) != self._snapshot_stamp:
+            self._load()  # Process khác đã gộp log vào snapshot
+        else:
+            self._log_ops += self._replay()
+
+    def sync(self):
+        """Shared mode: áp dụng các dòng log do process khác ghi"""
+        if not self.shared:
+            return
+        with self._lock, self._locked(exclusive=False):
+            self._catch_up()
+
+    def _write(self, op: Dict):
+        """Áp dụng + ghi một thao tác (shared: sau khi đã đọc thay đổi của process khác)"""
+        with self._lock, self._locked():
+            if self.shared:
+                self._catch_up()
+            if op['op'] == 'remove' and op['name'] not in self._entries:
+                return
+            self._apply(op)
+            if self._log is None:
+                self._log = open(self.log_file, 'ab')
+            self._log.write(json.dumps(op).encode('utf-8') + b'\n')
+            self._log.flush()
+            self._log_offset = self._log.tell()
+            self._log_ops += 1
+            if self._log_ops >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        """Ghi toàn bộ chỉ mục ra snapshot (atomic) rồi xóa log"""
+        with self._lock, self._locked():
+            if self.shared:
+                self._catch_up()
+            self._compact()
+
+    def _compact(self):
+        # Gọi khi đã giữ self._lock và khóa file (flock không lồng được trong cùng process)
+        from flashcard_store import atomic_write_json
+        atomic_write_json(self.index_file, {'method': self.method, 'entries': self._entries}, indent=None)
+        self._snapshot_stamp = _stamp(self.index_file)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        try:
+            os.remove(self.log_file)
+        except FileNotFoundError:
+            pass
+        self._log_ops = 0
+        self._log_offset = 0
+
+    def close(self):
+        """Gộp log vào snapshot (gọi khi tắt server)"""
+        with self._lock:
+            if self._log_ops:
+                self.compact()
+
+    def fingerprint(self, data) -> Optional[Dict]:
+        return fingerprint(data, self.method)
+
+    def _signature(self, filename: str):
+        """Chữ ký của file đã upload (giải mã lại nếu không còn trong LRU), None nếu không đọc được"""
+        sig = self._signatures.get(filename)
+        if sig is None:
+            try:
+                gray = _gray_small((self.upload_dir / filename).read_bytes())
+            except OSError:
+                return None
+            if gray is None:
+                return None
+            sig = signature(gray)
+            self._signatures.set(filename, sig)
+        return sig
+
+    def find(self, fp: Optional[Dict]) -> Optional[str]:
+        """
+        File (còn tồn tại) là cùng một ảnh: ứng viên lấy từ BK-tree theo pHash, nhận ứng viên
+        có cùng digest, không thì ứng viên gần nhất có chữ ký tương quan >= min_similarity
+        """
+        if fp is None:
+            return None
+        self.sync()
+        with self._lock:
+            candidates = [(name, self._entries[name]['digest'])
+                          for _, name in self._tree.search(fp['hash'], self.threshold)]
+        for name, digest in candidates:
+            if digest == fp['digest'] and (self.upload_dir / name).exists():
+                return name
+        for name, _ in candidates[:MAX_CANDIDATES]:
+            sig = self._signature(name)
+            if sig is not None and similarity(fp['signature'], sig) >= self.min_similarity:
+                return name
+        return None
+
+    def add(self, filename: str, fp: Optional[Dict]):
+        if fp is not None:
+            self._signatures.set(filename, fp['signature'])
+            self._write({'op': 'add', 'name': filename, 'hash': fp['hash'], 'digest': fp['digest']})
+
+    def remove(self, filename: str):
+        self._signatures.pop(filename)
+        self._write({'op': 'remove', 'name': filename})
+
+    def __contains__(self, filename):
+        return filename in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def dedupe_directory(index: UploadIndex, dry_run: bool = False) -> Dict[str, str]:
+    """
+    Hash toàn bộ ảnh trong thư mục upload, gom các ảnh trùng (cùng một ảnh, kể cả bản nén lại/đổi kích thước)
+    và xóa bản mới hơn.
+    dry_run: chỉ liệt kê, không xóa file và không sửa chỉ mục
+
+    Returns:
+        {file đã xóa: file được giữ lại}
+    """
+    from image_io import is_allowed_image
+
+    files = sorted(
+        (f for f in index.upload_dir.iterdir() if f.is_file() and is_allowed_image(f.name)),
+        key=lambda f: (f.stat().st_mtime, f.name)
+    )
+    replaced = {}
+    seen: List[Tuple[str, Dict]] = []  # Dry run: các file được giữ chưa có trong chỉ mục
+    for f in files:
+        if f.name in index:
+            continue
+        fp = index.fingerprint(f.read_bytes())
+        if fp is None:
+            continue
+        match = index.find(fp)
+        if match is None:
+            match = next((name for name, other in seen
+                          if is_duplicate(fp, other, index.threshold, index.min_similarity)), None)
+        if match is not None and match != f.name:
+            replaced[f.name] = match
+            if not dry_run:
+                os.remove(f)
+            continue
+        if dry_run:
+            seen.append((f.name, fp))
+        else:
+            index.add(f.name, fp)
+    if not dry_run:
+        index.compact()
+    return replaced
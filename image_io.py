@@ -0,0 +1,188 @@
+"""
+Image IO - Đọc/giải mã ảnh upload cho OCR
+"""
+
+import shutil
+import zipfile
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import metrics
+from preprocess import alpha_to_color
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp'}
+MAX_IMAGE_BYTES = 16 * 1024 * 1024  # Giới hạn mỗi ảnh (kể cả ảnh trong file zip)
+MAX_DECODED_PIXELS = 40 * 1000 * 1000  # Ảnh lớn hơn bị từ chối (chống decompression bomb)
+
+
+class ImageTooLargeError(ValueError):
+    """Ảnh vượt quá số pixel cho phép sau khi giải mã"""
+
+
+def is_allowed_image(filename: str) -> bool:
+    return Path(filename or '').suffix.lower() in ALLOWED_EXTENSIONS
+
+
+def read_image_header(data):
+    """Đọc ((width, height), EXIF orientation) từ header ảnh mà không giải mã pixel, (None, 1) nếu lỗi"""
+    from io import BytesIO
+    from PIL import Image
+    try:
+        with Image.open(BytesIO(data)) as img:
+            try:
+                orientation = int(img.getexif().get(0x0112, 1))
+            except Exception:
+                orientation = 1
+            return img.size, orientation
+    except Exception:
+        return None, 1
+
+
+def read_image_size(data):
+    """Đọc (width, height) từ header ảnh mà không giải mã pixel, None nếu không đọc được"""
+    return read_image_header(data)[0]
+
+
+def apply_orientation(img, orientation: int):
+    """Xoay/lật ảnh theo EXIF orientation (2-8) như PIL.ImageOps.exif_transpose"""
+    import cv2
+
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def decode_image(data, max_pixels=None, limit_pixels=MAX_DECODED_PIXELS):
+    """
+    Giải mã bytes ảnh thành numpy array BGR (định dạng PaddleOCR dùng), None nếu lỗi.
+
+    Args:
+        data: bytes/bytearray/memoryview (không copy, numpy đọc trực tiếp trên buffer)
+        max_pixels: thu nhỏ ảnh xuống tối đa số pixel này (None = giữ nguyên)
+        limit_pixels: raise ImageTooLargeError nếu ảnh gốc lớn hơn
+    """
+    import cv2
+    import numpy as np
+
+    # Một chính sách xoay ảnh cho mọi đường giải mã: OpenCV bỏ qua EXIF (IMREAD_UNCHANGED không xoay,
+    # IMREAD_REDUCED_* thì có) rồi xoay theo orientation đọc từ header -> ảnh điện thoại luôn đứng thẳng,
+    # không phụ thuộc ảnh có bị thu nhỏ hay không (ảnh đầu vào OCR và key cache giống nhau)
+    flags = cv2.IMREAD_UNCHANGED
+    size, orientation = read_image_header(data)
+    if size:
+        pixels = size[0] * size[1]
+        if limit_pixels and pixels > limit_pixels:
+            raise ImageTooLargeError(f"Image too large: {size[0]}x{size[1]}")
+        # JPEG có thể giải mã trực tiếp ở 1/2, 1/4, 1/8 kích thước -> nhanh và ít bộ nhớ hơn
+        if max_pixels and pixels > max_pixels:
+            ratio = (pixels / max_pixels) ** 0.5
+            for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                 (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                if ratio >= factor:
+                    flags = flag | cv2.IMREAD_IGNORE_ORIENTATION
+                    break
+
+    with metrics.stage('decode'):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        img = cv2.imdecode(buf, flags)
+        if img is None:
+            # OpenCV không đọc được GIF -> thử PIL (khung hình đầu tiên)
+            img = _decode_with_pil(data)
+            if img is None:
+                metrics.STAGE_ERRORS.inc(stage='decode', reason='invalid')
+                return None
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        elif img.shape[2] == 4:
+            img = alpha_to_color(img)  # Nền trong suốt -> trắng (BGRA2BGR cho nền đen, chữ đen biến mất)
+        img = apply_orientation(img, orientation)
+        return downscale(img, max_pixels) if max_pixels else img
+
+
+def _decode_with_pil(data):
+    from io import BytesIO
+    import numpy as np
+    from PIL import Image
+    try:
+        with Image.open(BytesIO(data)) as pil_img:
+            rgb = np.asarray(pil_img.convert('RGB'))
+    except Exception:
+        return None
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+def downscale(img, max_pixels):
+    """Thu nhỏ ảnh (giữ tỉ lệ) để số pixel <= max_pixels"""
+    import cv2
+
+    h, w = img.shape[:2]
+    if h * w <= max_pixels:
+        return img
+    scale = (max_pixels / float(h * w)) ** 0.5
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+
+def make_upload_filename(original_name: str) -> str:
+    """Tên file lưu trong uploads/: timestamp + tên gốc (đã làm sạch)"""
+    from datetime import datetime
+    from werkzeug.utils import secure_filename
+    return secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{original_name}")
+
+
+def detach_uploads(files) -> List[Tuple[str, object]]:
+    """
+    Chép các FileStorage sang file tạm của riêng mình (file lớn nằm trên đĩa).
+    Cần cho response streaming: Flask đóng request.files ngay khi view trả về.
+    """
+    detached = []
+    for file in files:
+        spool = tempfile.SpooledTemporaryFile(max_size=512 * 1024)
+        shutil.copyfileobj(file.stream, spool)
+        spool.seek(0)
+        detached.append((file.filename or '', spool))
+    return detached
+
+
+def iter_uploaded_images(files) -> Iterator[Tuple[str, bytes]]:
+    """
+    Duyệt lần lượt các ảnh trong danh sách (tên file, stream) - ảnh hoặc file .zip.
+    Chỉ đọc một ảnh vào bộ nhớ tại một thời điểm; stream được đóng sau khi đọc xong.
+
+    Yields:
+        (tên file, bytes) - bytes là None nếu file không hợp lệ/quá lớn
+    """
+    for name, stream in files:
+        with stream:
+            if name.lower().endswith('.zip'):
+                try:
+                    archive = zipfile.ZipFile(stream)
+                except zipfile.BadZipFile:
+                    yield name, None
+                    continue
+                with archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not is_allowed_image(info.filename):
+                            continue
+                        if info.file_size > MAX_IMAGE_BYTES:
+                            yield info.filename, None
+                            continue
+                        yield info.filename, archive.read(info)
+            elif is_allowed_image(name):
+                data = stream.read(MAX_IMAGE_BYTES + 1)
+                yield name, data if len(data) <= MAX_IMAGE_BYTES else None
+            else:
+                yield name, None
@@ -0,0 +1,254 @@
+"""
+Job Queue - Hàng đợi công việc chạy nền trong process (OCR bất đồng bộ)
+Gửi việc trả về job id ngay; worker thread xử lý lần lượt; client hỏi trạng thái/tiến độ theo id.
+Kết quả được giữ trong `ttl` giây sau khi xong rồi tự xóa.
+Có `state_dir`: trạng thái job được ghi ra file để process khác (worker gunicorn khác) đọc được.
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+class JobQueueFullError(Exception):
+    """Quá nhiều job đang chờ"""
+
+
+class Job:
+    """Một công việc: trạng thái queued -> running -> done | error"""
+
+    def __init__(self, payload, on_update: Optional[Callable] = None):
+        self.id = uuid.uuid4().hex
+        self.on_update = on_update
+        self.payload = payload
+        self.status = 'queued'
+        self.progress: Dict = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, **progress):
+        """Cập nhật tiến độ (gọi từ handler)"""
+        self.progress = {**self.progress, **progress}
+        if self.on_update is not None:
+            self.on_update(self)
+
+    def to_dict(self) -> Dict:
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.status == 'error':
+            data['error'] = self.error
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Job':
+        """Dựng lại job (chỉ để đọc trạng thái) từ to_dict() đã lưu"""
+        job = cls(None)
+        job.id = data['id']
+        job.status = data['status']
+        job.progress = data.get('progress') or {}
+        job.result = data.get('result')
+        job.error = data.get('error')
+        job.created_at = data.get('created_at')
+        job.started_at = data.get('started_at')
+        job.finished_at = data.get('finished_at')
+        return job
+
+
+class JobQueue:
+    """
+    Hàng đợi job với `workers` thread xử lý.
+
+    Args:
+        handler: hàm handler(job, payload) -> result; có thể gọi job.update(...) để báo tiến độ
+        workers: số thread xử lý song song
+        max_pending: số job chờ tối đa, vượt quá thì submit() raise JobQueueFullError
+        ttl: số giây giữ kết quả sau khi job xong
+        state_dir: thư mục lưu trạng thái job (None = chỉ trong bộ nhớ của process này)
+        on_finish: hàm on_finish(payload) gọi khi job kết thúc (xong, lỗi hoặc bị hủy lúc tắt),
+            để dọn tài nguyên của payload (vd. file tạm)
+    """
+
+    def __init__(self, handler: Callable, workers: int = 2, max_pending: int = 100, ttl: float = 3600,
+                 state_dir=None, on_finish: Optional[Callable] = None):
+        self.handler = handler
+        self.on_finish = on_finish
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.state_dir = Path(state_dir) if state_dir else None
+        self._jobs: Dict[str, Job] = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+        self._closed = False
+        if self.state_dir is not None:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self):
+        """Khởi động worker (submit() tự gọi nếu chưa start, như OCRPool)"""
+        with self._lock:
+            if self._threads:
+                return self
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def shutdown(self, wait: bool = True):
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def drain(self, timeout: float = 60) -> bool:
+        """
+        Ngừng nhận job mới, chờ các job đã nhận chạy xong (tối đa `timeout` giây) rồi dừng worker.
+        Job chưa kịp chạy được đánh dấu lỗi. Trả về True nếu mọi job đều xong.
+        """
+        self._closed = True
+        deadline = time.time() + timeout
+        while (self.pending or self._running) and time.time() < deadline:
+            time.sleep(0.1)
+        drained = not (self.pending or self._running)
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self._finish(job, error='Server is shutting down')
+        self.shutdown(wait=drained)
+        return drained
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self._running += 1
+            job.status = 'running'
+            job.started_at = time.time()
+            self._save(job)
+            try:
+                job.result = self.handler(job, job.payload)
+                self._finish(job)
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+                self._finish(job, error=str(e))
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def _finish(self, job: Job, error: Optional[str] = None):
+        if self.on_finish is not None and job.payload is not None:
+            try:
+                self.on_finish(job.payload)
+            except Exception as e:
+                print(f"⚠️  Job {job.id} cleanup failed: {e}")
+        job.payload = None  # Giải phóng dữ liệu ảnh
+        job.error = error
+        job.status = 'error' if error else 'done'
+        job.finished_at = time.time()
+        self._save(job)
+
+    # ------------------------------------------------------------------ #
+    # Trạng thái trên đĩa (dùng chung giữa các process)
+    # ------------------------------------------------------------------ #
+    def _path(self, job_id: str) -> Path:
+        return self.state_dir / f"{job_id}.json"
+
+    def _save(self, job: Job):
+        if self.state_dir is None:
+            return
+        tmp = self._path(job.id).with_suffix(f'.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, self._path(job.id))
+        except OSError as e:
+            print(f"⚠️  Cannot save job state {job.id}: {e}")
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        if self.state_dir is None or not job_id.isalnum():
+            return None
+        path = self._path(job_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                job = Job.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if job.finished_at is not None and time.time() - job.finished_at > self.ttl:
+            self._remove(job_id)
+            return None
+        return job
+
+    def _remove(self, job_id: str):
+        if self.state_dir is not None:
+            try:
+                os.remove(self._path(job_id))
+            except OSError:
+                pass
+
+    def _expire(self):
+        """Xóa job đã xong quá ttl (gọi khi có submit/get, không cần thread riêng)"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and now - job.finished_at > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._remove(job_id)
+
+    def submit(self, payload) -> Job:
+        with self._lock:
+            self._expire()
+            if self._closed:
+                raise JobQueueFullError("Job queue is shutting down")
+            if self.pending >= self.max_pending:
+                raise JobQueueFullError(f"Too many pending jobs ({self.pending})")
+            job = Job(payload, on_update=self._save if self.state_dir is not None else None)
+            self._jobs[job.id] = job
+        if not self._threads:
+            # Không phụ thuộc vào start_ocr_pool() (flask run không reloader, WSGI server khác...)
+            self.start()
+        self._save(job)
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Job theo id; không có trong process này thì đọc trạng thái đã lưu (nếu có state_dir)"""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def status(self) -> Dict:
+        counts = {}
+        for job in list(self._jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': len(self._threads), 'pending': self.pending, 'jobs': counts}
@@ -0,0 +1,206 @@
+"""
+KV Cache - Cache key/value dùng chung cho các service (dịch, từ điển, ...)
+LRUCache: trong bộ nhớ, thread-safe, TTL tùy chọn cho từng entry
+SQLiteCache: lưu trên đĩa, hỗ trợ TTL và giới hạn số entry (xóa entry ít dùng nhất)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache LRU trong bộ nhớ với số entry tối đa; set(..., ttl=) cho entry hết hạn sau ttl giây"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._expires: Dict[Any, float] = {}  # Chỉ các key có ttl
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            expires_at = self._expires.get(key)
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                del self._expires[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if ttl is not None:
+                self._expires[key] = time.monotonic() + ttl
+            else:
+                self._expires.pop(key, None)
+            while len(self._data) > self.max_entries:
+                evicted, _ = self._data.popitem(last=False)
+                self._expires.pop(evicted, None)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._expires.pop(key, None)
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Cache lưu trong SQLite, value được lưu dạng JSON.
+
+    Args:
+        path: file .sqlite3
+        table: tên bảng (nhiều cache có thể dùng chung một file)
+        ttl: thời gian sống (giây) mặc định, None = không hết hạn
+        max_entries: số entry tối đa, vượt quá thì xóa entry lâu không dùng nhất
+    """
+
+    def __init__(self, path, table: str = 'cache', ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.path = Path(path)
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._conn = None
+        self._pid = None
+        self._forked = []  # Kết nối mở trước fork: không dùng cũng không đóng trong process con
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Kết nối của process hiện tại, mở khi dùng lần đầu (gọi trong self._lock).
+        SQLite không cho dùng kết nối qua fork(): gunicorn preload_app tạo cache trong master,
+        mỗi worker tự mở kết nối riêng.
+        """
+        if self._pid != os.getpid():
+            if self._conn is not None:
+                self._forked.append(self._conn)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                ' key TEXT PRIMARY KEY, value TEXT NOT NULL,'
+                ' expires_at REAL, last_used REAL NOT NULL)'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table}(last_used)')
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Lấy nhiều key một lần, bỏ qua key hết hạn; cập nhật last_used cho LRU"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # SQLite giới hạn số tham số mỗi câu lệnh -> chia nhỏ
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = conn.execute(
+                    f'SELECT key, value, expires_at FROM {self.table}'
+                    f' WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if expires_at is not None and expires_at < now:
+                        continue
+                    found[key] = json.loads(value)
+            if found and self.max_entries:
+                conn.executemany(
+                    f'UPDATE {self.table} SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+                conn.commit()
+        return found
+
+    def set(self, key: str, value, ttl: Optional[float] = _MISSING):
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = _MISSING):
+        """Ghi nhiều key trong một transaction"""
+        if not items:
+            return
+        ttl = self.ttl if ttl is _MISSING else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_used)'
+                ' VALUES (?, ?, ?, ?)',
+                [(key, json.dumps(value, ensure_ascii=False), expires_at, now)
+                 for key, value in items.items()]
+            )
+            self._writes += len(items)
+            # Dọn dẹp định kỳ thay vì mỗi lần ghi
+            if self._writes >= 100:
+                self._writes = 0
+                self._evict()
+            conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            conn.commit()
+
+    def _evict(self):
+        conn = self._connect()
+        conn.execute(f'DELETE FROM {self.table} WHERE expires_at < ?', (time.time(),))
+        if self.max_entries:
+            conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN ('
+                f' SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def evict(self):
+        """Xóa entry hết hạn và entry vượt quá max_entries"""
+        with self._lock:
+            self._evict()
+            self._connect().commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                if self._pid == os.getpid():
+                    self._conn.close()
+                else:
+                    self._forked.append(self._conn)
+            self._conn, self._pid = None, None
@@ -0,0 +1,182 @@
+"""
+Metrics - Counter/Gauge/Histogram nhẹ, xuất theo định dạng text của Prometheus (GET /metrics)
+Không phụ thuộc thư viện ngoài; mỗi lần ghi chỉ tốn một lock + vài phép cộng nên bật được khi chạy thật.
+Registry nằm trong bộ nhớ của từng process: chạy gunicorn nhiều worker thì mỗi lần scrape /metrics
+chỉ thấy số liệu của worker nhận request đó (không cộng dồn giữa các worker).
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bucket (giây) cho độ trễ: từ 1ms (cache/ghi WAL) tới 60s (OCR ảnh lớn trên CPU)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: List['_Metric'] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge: set/inc/dec, hoặc đọc giá trị từ hàm `callback` tại thời điểm xuất metrics"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.callback is not None:
+            # callback trả về một số, hoặc dict {giá trị label (hoặc tuple): số}
+            try:
+                value = self.callback()
+            except Exception:
+                return []
+            if not isinstance(value, dict):
+                return [f"{self.name} {float(value)}"]
+            items = [(key if isinstance(key, tuple) else (key,), v) for key, v in value.items()]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}  # key -> [số đếm theo bucket..., +Inf, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+        lines = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="%s"' % ('+Inf' if bound == float('inf') else repr(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """Toàn bộ metrics theo định dạng text exposition 0.0.4"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ---------------------------------------------------------------------- #
+# Metrics dùng chung giữa các module
+# ---------------------------------------------------------------------- #
+STAGE_SECONDS = Histogram('ocrapp_stage_seconds', 'Latency of pipeline stages', ['stage'])
+STAGE_ERRORS = Counter('ocrapp_stage_errors_total', 'Failed or retried pipeline stage calls', ['stage', 'reason'])
+CACHE_REQUESTS = Counter('ocrapp_cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
+
+
+def stage(name: str):
+    """Đo thời gian một khối code: `with metrics.stage('decode'): ...`"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def observe_time_dict(time_dict: Dict[str, float]):
+    """Ghi thời gian det/cls/rec/all từ time_dict của tools.infer.predict_system.TextSystem"""
+    for name, seconds in time_dict.items():
+        if seconds:
+            STAGE_SECONDS.observe(seconds, stage=name)
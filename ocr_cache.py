@@ -0,0 +1,128 @@
+"""
+OCR Cache - Cache kết quả OCR theo nội dung ảnh
+Key = hash(pixel ảnh đã giải mã + cấu hình OCR); tầng LRU trong bộ nhớ + tầng file trên đĩa (giới hạn dung lượng)
+"""
+
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+from kv_cache import LRUCache
+
+
+def image_key(image, config: Optional[Dict] = None) -> str:
+    """Hash nội dung ảnh (numpy array) kèm shape/dtype và cấu hình OCR"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{image.shape}|{image.dtype}|".encode('utf-8'))
+    h.update(json.dumps(config or {}, sort_keys=True).encode('utf-8'))
+    # ascontiguousarray không copy nếu ảnh đã liền bộ nhớ
+    import numpy as np
+    h.update(memoryview(np.ascontiguousarray(image)).cast('B'))
+    return h.hexdigest()
+
+
+class OCRResultCache:
+    """
+    Cache 2 tầng cho kết quả OCR (danh sách dòng).
+
+    Args:
+        max_entries: số kết quả giữ trong bộ nhớ
+        disk_dir: thư mục lưu kết quả trên đĩa (None = chỉ dùng bộ nhớ)
+        max_disk_bytes: dung lượng tối đa trên đĩa, vượt quá thì xóa file ít dùng nhất
+    """
+
+    def __init__(self, max_entries: int = 512, disk_dir=None, max_disk_bytes: int = 64 * 1024 * 1024):
+        self.memory = LRUCache(max_entries=max_entries)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(f.stat().st_size for f in self.disk_dir.glob('*/*.json'))
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: Optional[str]) -> Optional[List[str]]:
+        """key None (chưa biết cấu hình engine) luôn là miss"""
+        lines = self.memory.get(key) if key is not None else None
+        if lines is not None:
+            self.stats['memory_hits'] += 1
+            metrics.CACHE_REQUESTS.inc(cache='ocr', result='memory_hit')
+            return lines
+        if self.disk_dir is not None and key is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines = json.load(f)
+                os.utime(path)  # Đánh dấu vừa dùng (cho eviction theo mtime)
+                self.memory.set(key, lines)
+                self.stats['disk_hits'] += 1
+                metrics.CACHE_REQUESTS.inc(cache='ocr', result='disk_hit')
+                return lines
+            except (OSError, ValueError):
+                pass
+        self.stats['misses'] += 1
+        metrics.CACHE_REQUESTS.inc(cache='ocr', result='miss')
+        return None
+
+    def set(self, key: Optional[str], lines: List[str]):
+        if key is None:
+            return
+        self.memory.set(key, lines)
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            data = json.dumps(lines, ensure_ascii=False).encode('utf-8')
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️  Cannot write OCR cache: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Xóa file cũ nhất (theo mtime) tới khi còn ~80% dung lượng cho phép"""
+        files = []
+        for f in self.disk_dir.glob('*/*.json'):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * 0.8)
+        for _, size, f in files:
+            if total <= target:
+                break
+            try:
+                f.unlink()
+                total -= size
+                self.stats['evictions'] += 1
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def info(self) -> Dict:
+        lookups = self.stats['memory_hits'] + self.stats['disk_hits'] + self.stats['misses']
+        hits = lookups - self.stats['misses']
+        return {
+            **self.stats,
+            'memory_entries': len(self.memory),
+            'disk_bytes': self._disk_bytes,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0,
+        }
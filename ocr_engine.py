@@ -0,0 +1,289 @@
+"""
+OCR Engine - Khởi tạo PaddleOCR và chạy OCR cho một ảnh
+Tách khỏi app.py để worker (thread/process) của OCRPool có thể import riêng
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import metrics
+
+# Cấu hình OCR mong muốn; key cache kết quả OCR dùng engine_config() (cấu hình thật sự đã tạo được)
+OCR_CONFIG = {
+    'lang': os.environ.get('OCR_LANG', 'en'),
+    'ocr_version': os.environ.get('OCR_VERSION', 'PP-OCRv4'),
+}
+
+
+def disable_onednn():
+    """Tắt OneDNN TRƯỚC KHI tạo/chạy predictor"""
+    os.environ['FLAGS_use_mkldnn'] = 'False'
+    os.environ['FLAGS_ir_optim'] = 'False'
+    os.environ['MKLDNN_ENABLED'] = '0'
+    os.environ['FLAGS_use_mkldnn'] = '0'
+    os.environ['FLAGS_ir_optim'] = '0'
+
+
+# Các cấu hình thử lần lượt khi tạo PaddleOCR (mỗi bản cài hỗ trợ tham số khác nhau)
+VARIANTS = ('versioned', 'lang_only', 'minimal')
+
+# Cấu hình đã tạo được lần trước -> lần khởi động sau thử nó trước, bỏ qua các cấu hình lỗi
+VARIANT_CACHE = Path(os.environ.get('OCR_VARIANT_CACHE', Path(__file__).parent / '.cache' / 'ocr_variant.json'))
+
+
+def variant_kwargs(name: str) -> dict:
+    """Tham số PaddleOCR(...) của một cấu hình trong VARIANTS"""
+    kwargs = {'lang': OCR_CONFIG['lang'], 'enable_mkldnn': False, 'use_gpu': False}
+    if name in ('versioned', 'lang_only'):
+        kwargs['use_textline_orientation'] = False  # Tắt để tránh lỗi
+    if name == 'versioned':
+        kwargs['ocr_version'] = OCR_CONFIG['ocr_version']
+    return kwargs
+
+
+def _variant_signature(paddleocr_module) -> str:
+    # Đổi bản paddleocr hoặc ngôn ngữ/phiên bản model -> dò lại từ đầu
+    version = getattr(paddleocr_module, '__version__', '')
+    return f"{version}|{OCR_CONFIG['lang']}|{OCR_CONFIG['ocr_version']}"
+
+
+# (signature, variant) của engine đã tạo trong process này (thread mode, hoặc kế thừa từ master khi fork)
+_active_variant: Optional[Tuple[str, str]] = None
+_variant_file = (None, None)  # (mtime_ns, (signature, variant)) lần đọc VARIANT_CACHE gần nhất
+
+
+def _read_variant_cache() -> Optional[Tuple[str, str]]:
+    """(signature, variant) trong VARIANT_CACHE, chỉ đọc lại khi file đổi"""
+    global _variant_file
+    try:
+        mtime = os.stat(VARIANT_CACHE).st_mtime_ns
+    except OSError:
+        return None
+    if _variant_file[0] != mtime:
+        try:
+            with open(VARIANT_CACHE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            value = (data['signature'], data['variant']) if data.get('variant') in VARIANTS else None
+        except (OSError, ValueError, KeyError, TypeError):
+            value = None
+        _variant_file = (mtime, value)
+    return _variant_file[1]
+
+
+def load_cached_variant(signature: str) -> Optional[str]:
+    cached = _read_variant_cache()
+    return cached[1] if cached is not None and cached[0] == signature else None
+
+
+def engine_config() -> Optional[dict]:
+    """
+    Cấu hình thật sự dùng để tạo engine (bản paddleocr, cấu hình fallback, tham số PaddleOCR(...)),
+    là một phần của key cache kết quả OCR. Process không tự tạo engine (process mode) đọc
+    VARIANT_CACHE do worker ghi. None nếu chưa có engine nào được tạo (không dùng cache).
+    """
+    active = _active_variant or _read_variant_cache()
+    if active is None:
+        return None
+    signature, variant = active
+    return {'signature': signature, 'variant': variant, **variant_kwargs(variant)}
+
+
+def save_cached_variant(signature: str, variant: str):
+    try:
+        VARIANT_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = VARIANT_CACHE.with_name(VARIANT_CACHE.name + f'.{os.getpid()}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'signature': signature, 'variant': variant}, f)
+        os.replace(tmp, VARIANT_CACHE)
+    except OSError as e:
+        print(f"⚠️  Cannot save OCR config cache: {e}")
+
+
+def build_ocr():
+    """Tạo PaddleOCR với inference model, thử lần lượt các cấu hình fallback"""
+    global _active_variant
+    disable_onednn()
+    import paddleocr
+    from paddleocr import PaddleOCR
+
+    print("🔄 Initializing PaddleOCR với inference model...")
+    print(f"   Model folder: {os.environ.get('PADDLEOCR_HOME', '')}")
+
+    signature = _variant_signature(paddleocr)
+    cached = load_cached_variant(signature)
+    order = [cached] + [v for v in VARIANTS if v != cached] if cached else list(VARIANTS)
+
+    last_error = None
+    for variant in order:
+        try:
+            ocr = PaddleOCR(**variant_kwargs(variant))
+        except Exception as e:
+            print(f"⚠️  Error with config '{variant}': {e}")
+            last_error = e
+            continue
+        print(f"✅ PaddleOCR ready ({variant}{', cached' if variant == cached else ''})!")
+        if variant != cached:
+            save_cached_variant(signature, variant)
+        _active_variant = (signature, variant)
+        instrument_stages(ocr)
+        return ocr
+    raise last_error
+
+
+# Model con của từng bước -> nhãn stage trong ocrapp_stage_seconds
+STAGE_MODELS = {
+    'text_det_model': 'det', 'textline_orientation_model': 'cls', 'text_rec_model': 'rec',  # PaddleOCR 3.x (PaddleX)
+    'text_detector': 'det', 'text_classifier': 'cls', 'text_recognizer': 'rec',  # PaddleOCR 2.x (TextSystem)
+}
+
+
+class _TimedModel:
+    """Bọc model con của pipeline: ghi thời gian mỗi lần gọi (kể cả khi model trả về generator)"""
+
+    def __init__(self, model, stage: str):
+        self._model = model
+        self._stage = stage
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._model(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        if hasattr(result, '__next__'):
+            return self._timed_iter(result, elapsed)
+        metrics.STAGE_SECONDS.observe(elapsed, stage=self._stage)
+        return result
+
+    def _timed_iter(self, iterator, elapsed: float):
+        # Chỉ tính thời gian trong next() của model, không tính thời gian pipeline xử lý kết quả
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            metrics.STAGE_SECONDS.observe(elapsed, stage=self._stage)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def instrument_stages(ocr) -> List[str]:
+    """
+    Ghi thời gian det/cls/rec của engine vào ocrapp_stage_seconds (predict() của 3.x không trả về time_dict).
+    Trả về các stage đã gắn được; bản PaddleOCR có cấu trúc khác thì chỉ có stage `ocr` tổng.
+    """
+    pipeline = getattr(ocr, 'paddlex_pipeline', None)
+    stages = []
+    for holder in (ocr, pipeline, getattr(pipeline, '_pipeline', None)):
+        if holder is None:
+            continue
+        for attr, stage in STAGE_MODELS.items():
+            model = getattr(holder, attr, None)
+            if model is None:
+                continue
+            if not isinstance(model, _TimedModel):
+                setattr(holder, attr, _TimedModel(model, stage))
+            stages.append(stage)
+    if not stages:
+        print("⚠️  Per-stage OCR timings (det/cls/rec) unavailable for this PaddleOCR version")
+    return stages
+
+
+def warmup_image():
+    """Ảnh mẫu có chữ: ảnh trắng không có box nào nên bước nhận dạng sẽ không chạy"""
+    import cv2
+    import numpy as np
+    image = np.full((64, 256, 3), 255, dtype=np.uint8)
+    cv2.putText(image, 'warm up', (12, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    return image
+
+
+def warmup_ocr(ocr):
+    """Chạy thử một ảnh để nạp model/kernel trước request đầu tiên (API 3.x nếu có, như run_ocr)"""
+    disable_onednn()
+    image = warmup_image()
+    try:
+        if hasattr(ocr, 'predict'):
+            # PaddleOCR 3.x: ocr() chuyển **kwargs sang predict(), predict() không nhận `cls`
+            list(ocr.predict(image, use_textline_orientation=False))
+        else:
+            ocr.ocr(image, cls=False)
+    except Exception as e:
+        print(f"⚠️  OCR warm-up failed: {e}")
+
+
+def run_ocr(ocr, image) -> List[str]:
+    """OCR một ảnh (đường dẫn hoặc numpy array), trả về danh sách các dòng (API 3.x nếu có, như warmup_ocr)"""
+    disable_onednn()
+    if isinstance(image, (str, os.PathLike)):
+        image = str(image)
+
+    if hasattr(ocr, 'predict'):
+        # PaddleOCR 3.x: ocr.ocr(image, cls=False) ném lỗi (predict() không nhận `cls`)
+        lines = []
+        for page in ocr.predict(image, use_textline_orientation=False):
+            lines.extend(lines_from_result(page))
+        return lines
+
+    # PaddleOCR 2.x
+    result = ocr.ocr(image, cls=False)  # Tắt cls để tránh lỗi
+    if not result or not result[0]:
+        return []
+
+    # Giữ nguyên từng dòng, không gộp lại
+    lines = []
+    for line in result[0]:
+        if line and len(line) >= 2:
+            text_info = line[1]
+            if isinstance(text_info, (list, tuple)):
+                text = text_info[0]
+            else:
+                text = text_info
+            lines.append(text.strip())
+    return lines
+
+
+def lines_from_result(page) -> List[str]:
+    """Lấy các dòng text từ một kết quả predict (API 3.x)"""
+    try:
+        # OCRResult của PaddleOCR 3.x là dict-like với key 'rec_texts'
+        texts = page['rec_texts']
+        return [text.strip() for text in texts]
+    except (KeyError, TypeError):
+        pass
+    lines = []
+    for block in page.blocks:
+        for line in block.lines:
+            lines.append(line.text.strip())
+    return lines
+
+
+def run_ocr_batch(ocr, images) -> List[dict]:
+    """
+    OCR nhiều ảnh (numpy array) bằng predict_iter (một lần gọi cho cả lô).
+
+    Returns:
+        list cùng thứ tự với images: {'text_lines': [...]} hoặc {'error': '...'}
+    """
+    disable_onednn()
+    if hasattr(ocr, 'predict_iter'):
+        try:
+            return [{'text_lines': lines_from_result(page)}
+                    for page in ocr.predict_iter(list(images), use_textline_orientation=False)]
+        except Exception as e:
+            print(f"⚠️  Batch OCR failed: {e}, falling back to one image at a time")
+    results = []
+    for image in images:
+        try:
+            results.append({'text_lines': run_ocr(ocr, image)})
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
@@ -0,0 +1,313 @@
+"""
+OCR Pool - Nhóm N worker OCR được khởi tạo sẵn, dùng chung cho các request Flask
+Mỗi worker (thread hoặc process) giữ một engine riêng, request xếp hàng trong queue có giới hạn
+"""
+
+import os
+import time
+import queue
+import threading
+import itertools
+import traceback
+import multiprocessing
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Optional
+
+import metrics
+
+
+class PoolFullError(Exception):
+    """Hàng đợi đã đầy - request nên trả về 429"""
+
+
+class PoolUnavailableError(Exception):
+    """Không worker nào khởi tạo được engine"""
+
+
+class PoolTimeoutError(Exception):
+    """Request chờ quá lâu - request nên trả về 504"""
+
+
+def _process_worker(factory, task, warmup, in_q, out_q, worker_id):
+    """Vòng lặp của worker process: tạo engine một lần rồi xử lý task từ in_q"""
+    try:
+        engine = factory()
+        if warmup is not None:
+            warmup(engine)
+        out_q.put(('ready', worker_id, True, None))
+    except Exception as e:
+        out_q.put(('ready', worker_id, False, f"{e}"))
+        return
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+        task_id, fn, payload = item
+        try:
+            out_q.put(('result', task_id, True, (fn or task)(engine, payload)))
+        except Exception as e:
+            out_q.put(('result', task_id, False, f"{e}"))
+
+
+class OCRPool:
+    """
+    Pool worker OCR có giới hạn.
+
+    Args:
+        factory: hàm tạo engine (ví dụ PaddleOCR), gọi một lần cho mỗi worker
+        task: hàm task(engine, payload) -> kết quả, chạy trong worker
+        warmup: hàm warmup(engine) chạy ngay sau khi tạo engine (tùy chọn)
+        workers: số worker
+        mode: 'thread' hoặc 'process' (process cần factory/task picklable)
+        queue_size: số request tối đa được xếp hàng ngoài các request đang chạy
+        timeout: thời gian chờ mặc định (giây) cho mỗi request
+    """
+
+    def __init__(self, factory: Callable[[], Any], task: Callable[[Any, Any], Any],
+                 warmup: Optional[Callable[[Any], Any]] = None, workers: int = 2,
+                 mode: str = 'thread', queue_size: int = 8, timeout: float = 60.0):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown pool mode: {mode}")
+        self.factory = factory
+        self.task = task
+        self.warmup = warmup
+        self.workers = max(1, int(workers))
+        self.mode = mode
+        self.queue_size = max(0, int(queue_size))
+        self.timeout = timeout
+
+        # Số chỗ = worker đang chạy + hàng đợi; hết chỗ thì từ chối ngay (backpressure)
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._ready = 0
+        self._failed = 0
+        self._ready_event = threading.Event()
+        self._started = False
+        self._threads = []
+        self._processes = []
+        self._pending = {}
+        self._ids = itertools.count()
+        self._preloaded = []
+
+    # ------------------------------------------------------------------ #
+    # Lifecycle
+    # ------------------------------------------------------------------ #
+    def start(self):
+        """Khởi động worker và bắt đầu tạo engine (không chờ)"""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+            self._started_at = time.perf_counter()
+
+        if self.mode == 'thread':
+            self._queue = queue.Queue()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._thread_worker, args=(i,),
+                                     name=f"ocr-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        else:
+            ctx = multiprocessing.get_context('spawn')
+            self._queue = ctx.Queue()
+            self._results = ctx.Queue()
+            for i in range(self.workers):
+                p = ctx.Process(target=_process_worker,
+                                args=(self.factory, self.task, self.warmup,
+                                      self._queue, self._results, i),
+                                name=f"ocr-worker-{i}", daemon=True)
+                p.start()
+                self._processes.append(p)
+            t = threading.Thread(target=self._collect_results, name="ocr-collector", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def preload(self):
+        """
+        Tạo sẵn engine cho mọi worker ngay trong process hiện tại (thread mode), start() dùng lại chúng.
+        Gọi trước khi fork (gunicorn preload_app) để các process con dùng chung bộ nhớ model (copy-on-write).
+        Không warm-up ở đây: thread pool của OpenMP không an toàn qua fork, worker tự warm-up sau khi start.
+        """
+        if self.mode != 'thread':
+            raise ValueError("preload() only supports thread mode")
+        while len(self._preloaded) < self.workers:
+            engine = self.factory()
+            if engine is None or engine is False:
+                raise RuntimeError("OCR engine factory returned nothing")
+            self._preloaded.append(engine)
+        return self
+
+    def shutdown(self, wait: bool = True):
+        """Dừng worker sau khi xử lý xong các request đã nhận"""
+        if not self._started:
+            return
+        for _ in range(self.workers):
+            self._queue.put(None)
+        if wait:
+            for p in self._processes:
+                p.join(timeout=self.timeout)
+            for t in self._threads:
+                if t.name.startswith('ocr-worker'):
+                    t.join(timeout=self.timeout)
+        if self._processes:
+            self._results.put(None)
+            if wait:
+                for t in self._threads:
+                    if t.name == 'ocr-collector':
+                        t.join(timeout=self.timeout)
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi có ít nhất một worker sẵn sàng (hoặc tất cả đã thất bại)"""
+        self._ready_event.wait(timeout)
+        return self._ready > 0
+
+    def _mark_ready(self, ok: bool, error: Optional[str] = None):
+        with self._lock:
+            if ok:
+                self._ready += 1
+                # Thời gian từ lúc start tới khi worker nạp xong model + warm-up
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - self._started_at, stage='model_load')
+            else:
+                self._failed += 1
+                print(f"❌ OCR worker init failed: {error}")
+            if self._ready or self._failed == self.workers:
+                self._ready_event.set()
+
+    @property
+    def state(self) -> str:
+        """'stopped' | 'loading' | 'ready' (ít nhất một worker sẵn sàng) | 'failed'"""
+        if not self._started:
+            return 'stopped'
+        if self._ready:
+            return 'ready'
+        if self._failed == self.workers:
+            return 'failed'
+        return 'loading'
+
+    @property
+    def status(self):
+        return {
+            'state': self.state,
+            'mode': self.mode,
+            'workers': self.workers,
+            'ready': self._ready,
+            'failed': self._failed,
+            'queued': self._queued(),
+        }
+
+    def _queued(self) -> int:
+        if not self._started:
+            return 0
+        if self.mode == 'process':
+            return len(self._pending)
+        return self._queue.qsize()
+
+    # ------------------------------------------------------------------ #
+    # Workers
+    # ------------------------------------------------------------------ #
+    def _thread_worker(self, worker_id):
+        try:
+            try:
+                engine = self._preloaded.pop()
+            except IndexError:
+                engine = self.factory()
+            if engine is None or engine is False:
+                raise RuntimeError("OCR engine factory returned nothing")
+            if self.warmup is not None:
+                self.warmup(engine)
+        except Exception as e:
+            traceback.print_exc()
+            self._mark_ready(False, f"{e}")
+            return
+        self._mark_ready(True)
+        print(f"✅ OCR worker {worker_id} ready")
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, fn, payload = item
+            # Request đã bị hủy do timeout khi còn trong hàng đợi
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            metrics.STAGE_SECONDS.observe(started - future.submitted_at, stage='ocr_queue')
+            try:
+                future.set_result((fn or self.task)(engine, payload))
+            except Exception as e:
+                metrics.STAGE_ERRORS.inc(stage='ocr', reason='error')
+                future.set_exception(e)
+            finally:
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage='ocr')
+
+    def _collect_results(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            kind, key, ok, value = item
+            if kind == 'ready':
+                self._mark_ready(ok, value)
+                continue
+            future = self._pending.pop(key, None)
+            if future is None or future.cancelled():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    # ------------------------------------------------------------------ #
+    # Submit
+    # ------------------------------------------------------------------ #
+    def submit(self, payload, task: Optional[Callable[[Any, Any], Any]] = None) -> Future:
+        """
+        Đưa request vào hàng đợi; raise PoolFullError nếu không còn chỗ.
+        `task` thay cho task mặc định của pool (process mode: phải là hàm cấp module)
+        """
+        if not self._started:
+            self.start()
+        if self._failed == self.workers:
+            raise PoolUnavailableError("OCR not available")
+        if not self._slots.acquire(blocking=False):
+            metrics.STAGE_ERRORS.inc(stage='ocr', reason='queue_full')
+            raise PoolFullError("OCR queue is full")
+
+        future = Future()
+        future.submitted_at = time.perf_counter()
+        future.add_done_callback(self._on_done)
+        if self.mode == 'thread':
+            self._queue.put((future, task, payload))
+        else:
+            task_id = next(self._ids)
+            future.task_id = task_id
+            future.set_running_or_notify_cancel()
+            self._pending[task_id] = future
+            self._queue.put((task_id, task, payload))
+        return future
+
+    def _on_done(self, future: Future):
+        self._slots.release()
+        # Tổng thời gian từ lúc nhận tới lúc xong (gồm chờ hàng đợi; process mode chỉ đo được số này)
+        if not future.cancelled():
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - future.submitted_at, stage='ocr_total')
+
+    def run(self, payload, timeout: Optional[float] = None, task=None):
+        """Chạy một request và chờ kết quả; raise PoolTimeoutError nếu quá thời gian"""
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(payload, task=task)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            metrics.STAGE_ERRORS.inc(stage='ocr', reason='timeout')
+            # Hủy nếu chưa chạy để worker bỏ qua; nếu đang chạy thì để nó chạy xong
+            if not future.cancel() and self.mode == 'process':
+                if self._pending.pop(future.task_id, None) is not None:
+                    future.set_exception(PoolTimeoutError())
+            raise PoolTimeoutError(f"OCR timed out after {timeout}s")
+
+
+def default_workers() -> int:
+    """Số worker mặc định: tối đa 2, không vượt quá số CPU"""
+    return max(1, min(2, os.cpu_count() or 1))
@@ -22,6 +22,7 @@ from __future__ import print_function
 import numpy as np
 import cv2
 import paddle
+from concurrent.futures import ThreadPoolExecutor
 from shapely.geometry import Polygon
 import pyclipper
 
@@ -40,6 +41,8 @@ class DBPostProcess(object):
         use_dilation=False,
         score_mode="fast",
         box_type="quad",
+        fast_boxes=False,
+        score_workers=0,
         **kwargs,
     ):
         self.thresh = thresh
@@ -55,6 +58,10 @@ class DBPostProcess(object):
         ], "Score mode must be in [slow, fast] but got: {}".format(score_mode)
 
         self.dilation_kernel = None if not use_dilation else np.array([[1, 1], [1, 1]])
+        # fast_boxes: vectorized boxes_from_bitmap_fast for quad boxes with score_mode "fast"
+        self.fast_boxes = fast_boxes
+        self.score_workers = score_workers
+        self._score_pool = None
 
     def polygons_from_bitmap(self, pred, _bitmap, dest_width, dest_height):
         """
@@ -157,6 +164,145 @@ class DBPostProcess(object):
             scores.append(score)
         return np.array(boxes, dtype="int32"), scores
 
+    def boxes_from_bitmap_fast(self, pred, _bitmap, dest_width, dest_height):
+        """
+        Vectorized boxes_from_bitmap (quad boxes, score_mode "fast").
+        Same contours and filters as boxes_from_bitmap, but:
+        - minAreaRect corners are computed and ordered for all contours at once
+          and candidates below min_size are dropped before scoring
+        - axis-aligned boxes are scored in bulk from an integral image; rotated
+          ones use box_score_fast (in `score_workers` threads if > 1)
+        - unclip is analytic: offsetting a rectangle by d and taking its
+          minAreaRect gives the same rectangle grown by 2 * d, so shapely and
+          pyclipper are skipped
+        Scores match boxes_from_bitmap up to float rounding; box corners match
+        or differ by one pixel (of the probability map) for rotated boxes,
+        where pyclipper's rounded arcs are not exactly the grown rectangle.
+        """
+        bitmap = _bitmap
+        height, width = bitmap.shape
+
+        outs = cv2.findContours(
+            (bitmap * 255).astype(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE
+        )
+        contours = outs[-2][: self.max_candidates]
+        empty = np.zeros((0, 4, 2), dtype="int32"), []
+        if len(contours) == 0:
+            return empty
+
+        # (cx, cy, w, h, angle) per contour
+        rects = np.array(
+            [(c[0], c[1], s[0], s[1], a) for c, s, a in map(cv2.minAreaRect, contours)],
+            dtype=np.float32,
+        )
+        index = np.nonzero(np.minimum(rects[:, 2], rects[:, 3]) >= self.min_size)[0]
+        if len(index) == 0:
+            return empty
+        rects = rects[index]
+        boxes = self.mini_boxes(rects)
+        scores = self.box_scores_fast(pred, boxes)
+        keep = scores >= self.box_thresh
+        rects, boxes, scores = rects[keep], boxes[keep], scores[keep]
+
+        w = rects[:, 2].astype(np.float64)
+        h = rects[:, 3].astype(np.float64)
+        distance = w * h * self.unclip_ratio / (2 * (w + h))
+        # unclip hands integer (truncated) corners to pyclipper: start from the same rectangle
+        rects = np.array(
+            [
+                (c[0], c[1], s[0], s[1], a)
+                for c, s, a in (cv2.minAreaRect(box.astype(np.int32)) for box in boxes)
+            ],
+            dtype=np.float32,
+        ).reshape(-1, 5)
+        rects[:, 2] += 2 * distance
+        rects[:, 3] += 2 * distance
+        keep = np.minimum(rects[:, 2], rects[:, 3]) >= self.min_size + 2
+        rects, scores = rects[keep], scores[keep]
+        if len(rects) == 0:
+            return empty
+
+        boxes = self.mini_boxes(rects)
+        boxes[:, :, 0] = np.clip(
+            np.round(boxes[:, :, 0] / width * dest_width), 0, dest_width
+        )
+        boxes[:, :, 1] = np.clip(
+            np.round(boxes[:, :, 1] / height * dest_height), 0, dest_height
+        )
+        return boxes.astype("int32"), scores.tolist()
+
+    @staticmethod
+    def mini_boxes(rects):
+        """
+        get_mini_boxes for many minAreaRect results, corners ordered at once.
+        rects: (N, 5) array of (cx, cy, w, h, angle in degrees)
+        return: (N, 4, 2) float32 corners in the same order as get_mini_boxes
+        """
+        # cv2.boxPoints per rect: its float32 rounding differs between OpenCV
+        # versions and box_score_fast floors the corners, so it is not re-derived
+        pts = np.array(
+            [cv2.boxPoints(((r[0], r[1]), (r[2], r[3]), r[4])) for r in rects.tolist()],
+            dtype=np.float32,
+        ).reshape(-1, 4, 2)
+
+        # Sort by x (stable, like sorted()), then pick top/bottom of each side
+        order = np.argsort(pts[:, :, 0], axis=1, kind="stable")
+        pts = np.take_along_axis(pts, order[:, :, None], axis=1)
+        left = (pts[:, 1, 1] <= pts[:, 0, 1]).astype(np.int64)
+        right = np.where(pts[:, 3, 1] > pts[:, 2, 1], 2, 3)
+        order = np.stack([left, right, 5 - right, 1 - left], axis=1)
+        return np.take_along_axis(pts, order[:, :, None], axis=1)
+
+    def box_scores_fast(self, bitmap, boxes):
+        """
+        box_score_fast for many boxes (N, 4, 2). Axis-aligned boxes are averaged
+        over the same pixels from an integral image; the others are scored
+        one by one.
+        """
+        h, w = bitmap.shape[:2]
+        scores = np.zeros(len(boxes), dtype=np.float64)
+        xs, ys = boxes[:, :, 0], boxes[:, :, 1]
+        x_lo, x_hi = xs.min(axis=1), xs.max(axis=1)
+        y_lo, y_hi = ys.min(axis=1), ys.max(axis=1)
+        aligned = (
+            (np.sum(xs == x_lo[:, None], axis=1) == 2)
+            & (np.sum(ys == y_lo[:, None], axis=1) == 2)
+            & (np.sum(xs == x_hi[:, None], axis=1) == 2)
+        )
+        if aligned.any():
+            # box_score_fast fills the polygon shifted by (xmin, ymin) with int32 corners
+            xmin = np.clip(np.floor(x_lo), 0, w - 1)
+            xmax = np.clip(np.ceil(x_hi), 0, w - 1)
+            ymin = np.clip(np.floor(y_lo), 0, h - 1)
+            ymax = np.clip(np.ceil(y_hi), 0, h - 1)
+            x0 = xmin + np.maximum(np.trunc(x_lo - xmin), 0)
+            x1 = xmin + np.minimum(np.trunc(x_hi - xmin), xmax - xmin)
+            y0 = ymin + np.maximum(np.trunc(y_lo - ymin), 0)
+            y1 = ymin + np.minimum(np.trunc(y_hi - ymin), ymax - ymin)
+            aligned &= (x1 >= x0) & (y1 >= y0)
+            x0, x1, y0, y1 = (
+                v[aligned].astype(np.int64) for v in (x0, x1, y0, y1)
+            )
+            integral = cv2.integral(np.ascontiguousarray(bitmap, dtype=np.float64))
+            total = (
+                integral[y1 + 1, x1 + 1]
+                - integral[y0, x1 + 1]
+                - integral[y1 + 1, x0]
+                + integral[y0, x0]
+            )
+            scores[aligned] = total / ((x1 - x0 + 1) * (y1 - y0 + 1))
+
+        rotated = np.nonzero(~aligned)[0]
+        if len(rotated):
+            score = lambda i: self.box_score_fast(bitmap, boxes[i])
+            if self.score_workers > 1 and len(rotated) > 1:
+                if self._score_pool is None:
+                    self._score_pool = ThreadPoolExecutor(self.score_workers)
+                scores[rotated] = list(self._score_pool.map(score, rotated))
+            else:
+                scores[rotated] = [score(i) for i in rotated]
+        return scores
+
     def unclip(self, box, unclip_ratio):
         poly = Polygon(box)
         distance = poly.area * unclip_ratio / poly.length
@@ -246,9 +392,14 @@ class DBPostProcess(object):
                     pred[batch_index], mask, src_w, src_h
                 )
             elif self.box_type == "quad":
-                boxes, scores = self.boxes_from_bitmap(
-                    pred[batch_index], mask, src_w, src_h
-                )
+                if self.fast_boxes and self.score_mode == "fast":
+                    boxes, scores = self.boxes_from_bitmap_fast(
+                        pred[batch_index], mask, src_w, src_h
+                    )
+                else:
+                    boxes, scores = self.boxes_from_bitmap(
+                        pred[batch_index], mask, src_w, src_h
+                    )
             else:
                 raise ValueError("box_type can only be one of ['quad', 'poly']")
 
@@ -268,6 +419,8 @@ class DistillationDBPostProcess(object):
         use_dilation=False,
         score_mode="fast",
         box_type="quad",
+        fast_boxes=False,
+        score_workers=0,
         **kwargs,
     ):
         self.model_name = model_name
@@ -280,6 +433,8 @@ class DistillationDBPostProcess(object):
             use_dilation=use_dilation,
             score_mode=score_mode,
             box_type=box_type,
+            fast_boxes=fast_boxes,
+            score_workers=score_workers,
         )
 
     def __call__(self, predicts, shape_list):
@@ -18,6 +18,9 @@ import paddle
 from paddle.nn import functional as F
 import re
 import json
+import math
+import heapq
+from collections import defaultdict
 
 
 class BaseRecLabelDecode(object):
@@ -143,6 +146,10 @@ class BaseRecLabelDecode(object):
         return_word_box=False,
     ):
         """convert text-index into text-label."""
+        if isinstance(text_index, np.ndarray) and text_index.ndim == 2:
+            return self.decode_batch(
+                text_index, text_prob, is_remove_duplicate, return_word_box
+            )
         result_list = []
         ignored_tokens = self.get_ignored_tokens()
         batch_size = len(text_index)
@@ -188,23 +195,265 @@ class BaseRecLabelDecode(object):
                 result_list.append((text, np.mean(conf_list).tolist()))
         return result_list
 
+    def _lookup_tables(self):
+        """
+        Code point per index (-1 if the entry is not a single character, e.g.
+        "blank"/"sos") and the strings as an object array, for decode_batch
+        """
+        tables = getattr(self, "_tables", None)
+        if tables is None or tables[0] is not self.character:
+            codes = np.array(
+                [ord(c) if len(c) == 1 else -1 for c in self.character], dtype=np.int64
+            )
+            array = np.empty(len(self.character), dtype=object)
+            array[:] = self.character
+            tables = self._tables = (self.character, codes, array)
+        return tables[1], tables[2]
+
+    def decode_batch(
+        self,
+        text_index,
+        text_prob=None,
+        is_remove_duplicate=False,
+        return_word_box=False,
+    ):
+        """
+        decode() for a (batch, T) index array in one pass: duplicate and
+        ignored-token masking for the whole batch, one table lookup for all
+        characters, and per-row confidence means from masked sums.
+        """
+        batch_size, seq_len = text_index.shape
+        selection = np.ones(text_index.shape, dtype=bool)
+        if is_remove_duplicate:
+            selection[:, 1:] = text_index[:, 1:] != text_index[:, :-1]
+        selection &= ~np.isin(text_index, self.get_ignored_tokens())
+
+        selected = text_index[selection]
+        lengths = selection.sum(axis=1)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        character_codes, character_array = self._lookup_tables()
+        codes = character_codes[selected]
+        if (codes >= 0).all():
+            flat = codes.astype("<u4").tobytes().decode("utf-32-le")
+            texts = [flat[b:e] for b, e in zip(starts.tolist(), ends.tolist())]
+        else:
+            chars = character_array[selected]
+            texts = [
+                "".join(chars[b:e]) for b, e in zip(starts.tolist(), ends.tolist())
+            ]
+
+        if text_prob is not None:
+            sums = np.where(selection, text_prob, 0).sum(axis=1, dtype=np.float64)
+            confs = np.where(lengths > 0, sums / np.maximum(lengths, 1), 0)
+            confs = confs.astype(np.asarray(text_prob).dtype).tolist()
+        else:
+            confs = [1.0 if seq_len else 0.0] * batch_size
+
+        result_list = []
+        for batch_idx, (text, conf) in enumerate(zip(texts, confs)):
+            if self.reverse:  # for arabic rec
+                text = self.pred_reverse(text)
+            if return_word_box:
+                word_list, word_col_list, state_list = self.get_word_info(
+                    text, selection[batch_idx]
+                )
+                result_list.append(
+                    (text, conf, [seq_len, word_list, word_col_list, state_list])
+                )
+            else:
+                result_list.append((text, conf))
+        return result_list
+
     def get_ignored_tokens(self):
         return [0]  # for ctc blank
 
 
+def _log_add(a, b, c=-math.inf):
+    top = max(a, b, c)
+    if top == -math.inf:
+        return top
+    return top + math.log(math.exp(a - top) + math.exp(b - top) + math.exp(c - top))
+
+
+class LexiconScorer(object):
+    """
+    Scorer for CTC prefix beam search built from a word list.
+    Appending a character that makes the current word (the run of letters and
+    digits since the last separator) leave every lexicon word costs
+    `oov_penalty` once; ending on an incomplete word costs it at the end.
+    Any object with `score(prefix, char) -> float` (log-domain bonus for
+    appending `char` to the text `prefix`) and optionally `final(text) -> float`
+    can be used instead, e.g. a character n-gram or KenLM wrapper.
+    """
+
+    def __init__(self, words, oov_penalty=-5.0, ignore_case=True):
+        self.oov_penalty = oov_penalty
+        self.ignore_case = ignore_case
+        self.words = set()
+        self.prefixes = set()
+        for word in words:
+            word = word.strip()
+            if not word:
+                continue
+            if ignore_case:
+                word = word.lower()
+            self.words.add(word)
+            for i in range(1, len(word) + 1):
+                self.prefixes.add(word[:i])
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.read().split(), **kwargs)
+
+    def _current_word(self, text):
+        i = len(text)
+        while i > 0 and text[i - 1].isalnum():
+            i -= 1
+        word = text[i:]
+        return word.lower() if self.ignore_case else word
+
+    def _check_end(self, word):
+        if word and word in self.prefixes and word not in self.words:
+            return self.oov_penalty
+        return 0.0
+
+    def score(self, prefix, char):
+        word = self._current_word(prefix)
+        if not char.isalnum():
+            return self._check_end(word)
+        if word and word not in self.prefixes:
+            return 0.0  # already penalized
+        extended = word + (char.lower() if self.ignore_case else char)
+        return 0.0 if extended in self.prefixes else self.oov_penalty
+
+    def final(self, text):
+        return self._check_end(self._current_word(text))
+
+
+def ctc_prefix_beam_search(
+    probs, character, beam_width=10, blank=0, scorer=None, alpha=1.0, beta=0.0,
+    prune=1e-3,
+):
+    """
+    CTC prefix beam search over one sequence.
+    args:
+        probs: (T, C) per-frame character probabilities (softmax output)
+        character: index -> string table (BaseRecLabelDecode.character)
+        beam_width: number of prefixes kept per frame
+        scorer: optional LexiconScorer-like object; its score is weighted by
+            `alpha`, and each emitted character adds `beta`
+        prune: characters below this probability in a frame are not expanded
+            (the best character of each frame always is); at most `beam_width`
+            characters are expanded per frame
+    return:
+        (text, confidence): confidence is the per-frame geometric mean of the
+        CTC probability of the text (language model bonus excluded)
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    log_probs = np.log(np.maximum(probs, 1e-30))
+    # prefix (tuple of indices) -> [log p ending in blank, log p ending in non-blank, text]
+    beams = {(): [0.0, -math.inf, ""]}
+    lm_cache = {}
+
+    def lm(prefix, text, c):
+        if scorer is None:
+            return beta
+        key = (prefix, c)
+        if key not in lm_cache:
+            lm_cache[key] = alpha * scorer.score(text, character[c]) + beta
+        return lm_cache[key]
+
+    for t in range(len(probs)):
+        frame = log_probs[t]
+        if beam_width < len(frame):
+            candidates = np.argpartition(-probs[t], beam_width - 1)[:beam_width]
+        else:
+            candidates = np.arange(len(frame))
+        best = candidates[np.argmax(probs[t][candidates])]
+        candidates = [c for c in candidates if probs[t][c] >= prune] or [best]
+        next_beams = defaultdict(lambda: [-math.inf, -math.inf, ""])
+        for prefix, (p_b, p_nb, text) in beams.items():
+            for c in candidates:
+                c = int(c)
+                p = frame[c]
+                if c == blank:
+                    entry = next_beams[prefix]
+                    entry[0] = _log_add(entry[0], p_b + p, p_nb + p)
+                    entry[2] = text
+                    continue
+                new_prefix = prefix + (c,)
+                entry = next_beams[new_prefix]
+                entry[2] = text + character[c]
+                bonus = lm(prefix, text, c)
+                if prefix and prefix[-1] == c:
+                    # repeated character: only a blank in between starts a new one
+                    entry[1] = _log_add(entry[1], p_b + p + bonus)
+                    same = next_beams[prefix]
+                    same[1] = _log_add(same[1], p_nb + p)
+                    same[2] = text
+                else:
+                    entry[1] = _log_add(entry[1], p_b + p + bonus, p_nb + p + bonus)
+        beams = dict(
+            heapq.nlargest(
+                beam_width,
+                next_beams.items(),
+                key=lambda item: _log_add(item[1][0], item[1][1]),
+            )
+        )
+
+    def total(item):
+        p_b, p_nb, text = item[1]
+        final = alpha * scorer.final(text) if hasattr(scorer, "final") else 0.0
+        return _log_add(p_b, p_nb) + final
+
+    prefix, (p_b, p_nb, text) = max(beams.items(), key=total)
+    # CTC probability of the text without the language model bonuses
+    ctc_log_prob = _log_add(p_b, p_nb)
+    partial = ""
+    for i, c in enumerate(prefix):
+        ctc_log_prob -= lm(prefix[:i], partial, c)
+        partial += character[c]
+    confidence = math.exp(ctc_log_prob / max(len(probs), 1))
+    return text, confidence
+
+
 class CTCLabelDecode(BaseRecLabelDecode):
     """Convert between text-label and text-index"""
 
-    def __init__(self, character_dict_path=None, use_space_char=False, **kwargs):
+    def __init__(
+        self,
+        character_dict_path=None,
+        use_space_char=False,
+        beam_width=0,
+        scorer=None,
+        lexicon_path=None,
+        lm_alpha=1.0,
+        lm_beta=0.0,
+        **kwargs,
+    ):
         super(CTCLabelDecode, self).__init__(character_dict_path, use_space_char)
+        # beam_width > 1: prefix beam search (optionally with a lexicon/LM scorer) instead of greedy
+        self.beam_width = beam_width
+        if scorer is None and lexicon_path:
+            scorer = LexiconScorer.from_file(lexicon_path)
+        self.scorer = scorer
+        self.lm_alpha = lm_alpha
+        self.lm_beta = lm_beta
 
     def __call__(self, preds, label=None, return_word_box=False, *args, **kwargs):
         if isinstance(preds, tuple) or isinstance(preds, list):
             preds = preds[-1]
         if isinstance(preds, paddle.Tensor):
             preds = preds.numpy()
+        if self.beam_width > 1 and not return_word_box:
+            text = self.beam_search(preds)
+            if label is None:
+                return text
+            return text, self.decode(label)
         preds_idx = preds.argmax(axis=2)
-        preds_prob = preds.max(axis=2)
+        preds_prob = np.take_along_axis(preds, preds_idx[:, :, None], axis=2)[:, :, 0]
         text = self.decode(
             preds_idx,
             preds_prob,
@@ -221,6 +470,23 @@ class CTCLabelDecode(BaseRecLabelDecode):
         label = self.decode(label)
         return text, label
 
+    def beam_search(self, preds):
+        """Prefix beam search per sample, (text, confidence) like decode()"""
+        result_list = []
+        for probs in preds:
+            text, conf = ctc_prefix_beam_search(
+                probs,
+                self.character,
+                beam_width=self.beam_width,
+                scorer=self.scorer,
+                alpha=self.lm_alpha,
+                beta=self.lm_beta,
+            )
+            if self.reverse:  # for arabic rec
+                text = self.pred_reverse(text)
+            result_list.append((text, conf))
+        return result_list
+
     def add_special_char(self, dict_character):
         dict_character = ["blank"] + dict_character
         return dict_character
@@ -0,0 +1,210 @@
+"""
+Preprocess - Tiền xử lý ảnh chữ viết tay trước bước detection
+Các bước (chạy theo thứ tự, bật/tắt từng bước theo request):
+- resize: thu nhỏ cạnh dài nhất về `max_side` (ảnh điện thoại 4000px -> detection nhanh hơn nhiều)
+- crop: cắt theo tờ giấy (vùng sáng lớn nhất), bỏ nền bàn/tay gây box nhiễu
+- flatten: làm phẳng độ sáng (chia cho nền ước lượng) để xóa bóng/đổ sáng không đều
+- deskew: xoay thẳng dòng chữ (góc làm cực đại phương sai profile theo hàng)
+- binarize: nhị phân hóa (Otsu như ppocr.utils.utility.binarize_img sau flatten, adaptive nếu không)
+
+Không import ppocr.utils.utility (module đó import paddle); binarize_img/alpha_to_color được viết lại
+tương đương, chỉ dùng OpenCV + numpy.
+"""
+
+from typing import Iterable, Optional, Tuple, Union
+
+import metrics
+
+STEPS = ('resize', 'crop', 'flatten', 'deskew', 'binarize')  # Thứ tự chạy
+PRESETS = {
+    'none': (),
+    'light': ('resize', 'crop'),
+    'handwriting': STEPS,
+}
+DEFAULT_MAX_SIDE = 2048
+MAX_SKEW = 10.0  # Độ; nghiêng hơn thế coi như ảnh cố ý xoay, không sửa
+
+
+def parse_steps(value: Union[None, bool, str, Iterable[str]], default: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+    """
+    Chuẩn hóa tùy chọn tiền xử lý của request thành tuple các bước theo thứ tự STEPS.
+
+    value: None (dùng default), true/false, tên preset ('none', 'light', 'handwriting'),
+    chuỗi các bước cách nhau bởi dấu phẩy ('resize,deskew') hoặc list các bước.
+    Raise ValueError nếu có bước không hợp lệ.
+    """
+    if value is None or value == '':
+        return tuple(default)
+    if isinstance(value, bool):
+        return PRESETS['handwriting'] if value else ()
+    if isinstance(value, str):
+        name = value.strip().lower()
+        if name in ('true', '1', 'on', 'yes'):
+            return PRESETS['handwriting']
+        if name in ('false', '0', 'off', 'no'):
+            return ()
+        if name in PRESETS:
+            return PRESETS[name]
+        value = name.split(',')
+    steps = {str(step).strip().lower() for step in value} - {''}
+    unknown = steps - set(STEPS)
+    if unknown:
+        raise ValueError(f"Unknown preprocess step(s): {', '.join(sorted(unknown))}")
+    return tuple(step for step in STEPS if step in steps)
+
+
+def cache_config(steps: Tuple[str, ...], max_side: int = DEFAULT_MAX_SIDE) -> dict:
+    """Phần cấu hình đưa vào key cache OCR (cùng ảnh, khác tiền xử lý -> khác kết quả)"""
+    if not steps:
+        return {}
+    return {'preprocess': list(steps), 'max_side': max_side if 'resize' in steps else None}
+
+
+# ---------------------------------------------------------------------- #
+# Các bước
+# ---------------------------------------------------------------------- #
+def alpha_to_color(img, alpha_color=(255, 255, 255)):
+    """Ảnh BGRA -> BGR trên nền `alpha_color` (RGB) như ppocr.utils.utility.alpha_to_color"""
+    import numpy as np
+
+    if img.ndim != 3 or img.shape[2] != 4:
+        return img
+    alpha = img[:, :, 3:4].astype(np.float32) / 255
+    background = np.array(alpha_color[::-1], dtype=np.float32)
+    return (img[:, :, :3] * alpha + background * (1 - alpha)).astype(np.uint8)
+
+
+def resize_max_side(img, max_side: int = DEFAULT_MAX_SIDE):
+    import cv2
+
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def _gray(img):
+    import cv2
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def crop_page(img, min_ratio: float = 0.2, max_ratio: float = 0.95):
+    """Cắt theo vùng sáng lớn nhất (tờ giấy); giữ nguyên nếu không tìm thấy hoặc giấy đã chiếm gần hết ảnh"""
+    import cv2
+
+    gray = _gray(img)
+    small = resize_max_side(gray, 512)
+    scale = gray.shape[1] / small.shape[1]
+    small = cv2.GaussianBlur(small, (5, 5), 0)
+    _, mask = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15)))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return img
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    ratio = (w * h) / (small.shape[0] * small.shape[1])
+    if not min_ratio <= ratio <= max_ratio:
+        return img
+    x0, y0 = int(x * scale), int(y * scale)
+    x1, y1 = int((x + w) * scale), int((y + h) * scale)
+    return img[y0:y1, x0:x1]
+
+
+def flatten_illumination(gray):
+    """Chia ảnh xám cho nền ước lượng (đóng hình thái học để xóa nét mực), ra ảnh nền trắng đều"""
+    import cv2
+
+    h, w = gray.shape[:2]
+    # Ước lượng nền trên ảnh nhỏ (kernel lớn trên ảnh gốc rất chậm) rồi phóng lại
+    small = resize_max_side(gray, 256)
+    k = max(5, (max(small.shape) // 16) | 1)
+    background = cv2.morphologyEx(small, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k)))
+    background = cv2.medianBlur(background, 5)
+    background = cv2.resize(background, (w, h), interpolation=cv2.INTER_LINEAR)
+    return cv2.divide(gray, background, scale=255)
+
+
+def _ink_mask(gray):
+    import cv2
+
+    block = max(15, (max(gray.shape) // 40) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block, 15)
+
+
+def estimate_skew(gray, max_angle: float = MAX_SKEW) -> float:
+    """
+    Góc nghiêng (độ) của dòng chữ: xoay mặt nạ nét mực và chọn góc có tổng theo hàng "nhọn" nhất
+    (dòng chữ thẳng -> hàng đầy mực xen hàng trống). Tìm thô bước 1° rồi tinh bước 0.2°.
+    """
+    import cv2
+    import numpy as np
+
+    mask = _ink_mask(resize_max_side(gray, 600))
+    if cv2.countNonZero(mask) < 50:
+        return 0.0
+    h, w = mask.shape
+    center = (w / 2, h / 2)
+
+    def score(angle):
+        m = cv2.getRotationMatrix2D(center, angle, 1.0)
+        rows = cv2.warpAffine(mask, m, (w, h), flags=cv2.INTER_NEAREST).sum(axis=1, dtype=np.float64)
+        return float(np.var(rows))
+
+    best = max(np.arange(-max_angle, max_angle + 0.5, 1.0), key=score)
+    best = max(np.arange(best - 1, best + 1.01, 0.2), key=score)
+    return float(best)
+
+
+def rotate(img, angle: float):
+    """Xoay quanh tâm, giữ kích thước, phần trống tô trắng"""
+    import cv2
+
+    h, w = img.shape[:2]
+    m = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    border = (255, 255, 255) if img.ndim == 3 else 255
+    return cv2.warpAffine(img, m, (w, h), flags=cv2.INTER_LINEAR, borderValue=border)
+
+
+def binarize(gray, flattened: bool = False):
+    """Nhị phân hóa: Otsu (như ppocr binarize_img) khi nền đã phẳng, adaptive khi chưa"""
+    import cv2
+
+    if flattened:
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return binary
+    return cv2.bitwise_not(_ink_mask(gray))
+
+
+# ---------------------------------------------------------------------- #
+def preprocess(img, steps: Tuple[str, ...], max_side: int = DEFAULT_MAX_SIDE, angle: Optional[float] = None):
+    """
+    Chạy các bước tiền xử lý được bật trên ảnh BGR (numpy), trả về ảnh BGR uint8 liền bộ nhớ.
+    angle: góc deskew đã biết (bỏ qua bước ước lượng)
+    """
+    import cv2
+    import numpy as np
+
+    if not steps:
+        return img
+    with metrics.stage('preprocess'):
+        img = alpha_to_color(img)
+        if 'resize' in steps:
+            img = resize_max_side(img, max_side)
+        if 'crop' in steps:
+            img = crop_page(img)
+        gray_only = 'flatten' in steps or 'binarize' in steps
+        if gray_only:
+            img = _gray(img)
+        if 'flatten' in steps:
+            img = flatten_illumination(img)
+        if 'deskew' in steps:
+            if angle is None:
+                angle = estimate_skew(_gray(img))
+            if abs(angle) >= 0.5:
+                img = rotate(img, angle)
+        if 'binarize' in steps:
+            img = binarize(img, flattened='flatten' in steps)
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return np.ascontiguousarray(img)
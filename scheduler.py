@@ -0,0 +1,143 @@
+"""
+Scheduler - Lặp lại ngắt quãng (spaced repetition) theo thuật toán SM-2
+- Mỗi card lưu ease, interval (ngày), repetitions và thời điểm đến hạn `due`
+- DueQueue: heap (due, id) cập nhật theo store, lấy N card đến hạn sớm nhất trong O(N log n)
+"""
+
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flashcard_store import StoreIndex
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_MINUTES = 10  # Trả lời sai: ôn lại sau 10 phút (trong cùng buổi học)
+
+
+def grade_from_answer(is_correct: bool) -> int:
+    """Quy đổi đúng/sai sang điểm SM-2 (0-5) khi client không gửi grade"""
+    return 4 if is_correct else 1
+
+
+def review(card: Dict, grade: int, now: Optional[datetime] = None) -> Dict:
+    """
+    Tính lịch ôn tiếp theo (SM-2) sau một lần trả lời.
+
+    Args:
+        card: flashcard hiện tại (có thể chưa có các trường lịch ôn)
+        grade: 0-5, >= 3 là nhớ được
+
+    Returns:
+        dict các trường cần cập nhật: ease, interval, repetitions, due
+    """
+    now = now or datetime.now()
+    grade = max(0, min(5, int(grade)))
+    ease = card.get('ease') or DEFAULT_EASE
+    interval = card.get('interval') or 0
+    repetitions = card.get('repetitions') or 0
+
+    if grade >= 3:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = max(1, round(interval * ease))
+        repetitions += 1
+        due = now + timedelta(days=interval)
+    else:
+        repetitions = 0
+        interval = 0
+        due = now + timedelta(minutes=RELEARN_MINUTES)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+
+    return {
+        'ease': round(ease, 3),
+        'interval': interval,
+        'repetitions': repetitions,
+        'due': due.strftime(DATE_FORMAT),
+    }
+
+
+def due_timestamp(card: Dict) -> float:
+    """Thời điểm đến hạn (epoch); card chưa học đến hạn từ lúc tạo"""
+    value = card.get('due') or card.get('created_at')
+    if value:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return 0.0
+
+
+class DueQueue(StoreIndex):
+    """
+    Hàng đợi card theo thời điểm đến hạn.
+    Heap (due, id) xóa lười: entry cũ (card đã đổi due/bị xóa) bị bỏ qua khi lấy ra.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, float] = {}
+
+    def rebuild(self, cards):
+        with self._lock:
+            self._due = {card['id']: due_timestamp(card) for card in cards}
+            self._heap = [(due, card_id) for card_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def on_change(self, old, new):
+        with self._lock:
+            if new is None:
+                self._due.pop(old['id'], None)
+            else:
+                due = due_timestamp(new)
+                if self._due.get(new['id']) != due:
+                    self._due[new['id']] = due
+                    heapq.heappush(self._heap, (due, new['id']))
+            # Quá nhiều entry cũ -> dựng lại heap cho gọn
+            if len(self._heap) > 2 * len(self._due) + 64:
+                self._heap = [(due, card_id) for card_id, due in self._due.items()]
+                heapq.heapify(self._heap)
+
+    def next(self, limit: int = 20, now: Optional[float] = None,
+             ahead: bool = False) -> Tuple[List[int], Optional[float]]:
+        """
+        Lấy tối đa `limit` id đến hạn sớm nhất (không xóa khỏi hàng đợi).
+
+        Args:
+            now: epoch hiện tại (mặc định time hiện tại)
+            ahead: lấy cả card chưa đến hạn (học trước) nếu không đủ card đến hạn
+
+        Returns:
+            (danh sách id, thời điểm đến hạn của card kế tiếp sau danh sách hoặc None)
+        """
+        now = datetime.now().timestamp() if now is None else now
+        taken = []
+        seen = set()
+        next_due = None
+        with self._lock:
+            while self._heap and len(taken) < limit:
+                due, card_id = heapq.heappop(self._heap)
+                if self._due.get(card_id) != due or card_id in seen:
+                    continue  # Entry cũ / trùng
+                if due > now and not ahead:
+                    heapq.heappush(self._heap, (due, card_id))
+                    break
+                taken.append((due, card_id))
+                seen.add(card_id)
+            # Entry hợp lệ kế tiếp (dọn entry cũ ở đỉnh heap)
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if self._heap:
+                next_due = self._heap[0][0]
+            for item in taken:
+                heapq.heappush(self._heap, item)
+        return [card_id for _, card_id in taken], next_due
+
+    def __len__(self):
+        return len(self._due)
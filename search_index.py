@@ -0,0 +1,190 @@
+"""
+Search Index - Chỉ mục đảo (inverted index) để tìm flashcard
+- Bỏ dấu tiếng Việt khi đánh chỉ mục và khi tìm ("hoc" khớp "học", "dong" khớp "đồng")
+- Tìm theo tiền tố từng từ (gõ tới đâu tìm tới đó), xếp hạng theo trọng số trường + IDF
+- Cập nhật theo từng thay đổi của FlashcardStore, không quét lại toàn bộ
+"""
+
+import re
+import math
+import heapq
+import bisect
+import threading
+import unicodedata
+from typing import Dict, List, Tuple
+
+from flashcard_store import StoreIndex
+
+# Trọng số theo trường: khớp từ gốc quan trọng hơn khớp nghĩa
+FIELD_WEIGHTS = {'original': 3.0, 'translated': 1.0}
+PREFIX_FACTOR = 0.6  # Khớp tiền tố được ít điểm hơn khớp trọn từ
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def fold(text: str) -> str:
+    """Chữ thường + bỏ dấu (tiếng Việt: đ -> d)"""
+    text = text.lower().replace('đ', 'd')
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex(StoreIndex):
+    """
+    Chỉ mục đảo token -> {card_id: trọng số}, kèm danh sách token đã sắp xếp
+    để tìm các token có cùng tiền tố bằng bisect.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._terms: List[str] = []  # Sắp xếp tăng dần
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._heads: Dict[int, str] = {}  # original đã bỏ dấu (để cộng điểm khớp toàn cụm)
+
+    # ------------------------------------------------------------------ #
+    # Cập nhật
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _card_terms(card: Dict) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = card.get(field)
+            if not isinstance(value, str):
+                continue
+            for token in tokenize(value):
+                terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def _add(self, card: Dict):
+        card_id = card['id']
+        terms = self._card_terms(card)
+        self._doc_terms[card_id] = terms
+        self._heads[card_id] = ' '.join(tokenize(card.get('original') or ''))
+        for token, weight in terms.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                bisect.insort(self._terms, token)
+            posting[card_id] = weight
+
+    def _remove(self, card_id: int):
+        terms = self._doc_terms.pop(card_id, None)
+        self._heads.pop(card_id, None)
+        for token in terms or ():
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(card_id, None)
+            if not posting:
+                del self._postings[token]
+                i = bisect.bisect_left(self._terms, token)
+                if i < len(self._terms) and self._terms[i] == token:
+                    del self._terms[i]
+
+    def rebuild(self, cards):
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._heads = {}
+            self._terms = []
+            for card in cards:
+                card_id = card['id']
+                terms = self._card_terms(card)
+                self._doc_terms[card_id] = terms
+                self._heads[card_id] = ' '.join(tokenize(card.get('original') or ''))
+                for token, weight in terms.items():
+                    self._postings.setdefault(token, {})[card_id] = weight
+            self._terms = sorted(self._postings)
+
+    def on_change(self, old, new):
+        if (old is not None and new is not None and old['id'] == new['id']
+                and all(old.get(field) == new.get(field) for field in FIELD_WEIGHTS)):
+            return  # Chỉ đổi trường không được đánh chỉ mục (ôn tập, yêu thích...) -> không tách từ lại
+        with self._lock:
+            if old is not None:
+                self._remove(old['id'])
+            if new is not None:
+                self._add(new)
+
+    # ------------------------------------------------------------------ #
+    # Tìm kiếm
+    # ------------------------------------------------------------------ #
+    def _expand(self, prefix: str) -> List[str]:
+        """Các token bắt đầu bằng prefix"""
+        start = bisect.bisect_left(self._terms, prefix)
+        end = bisect.bisect_left(self._terms, prefix + '\uffff', start)
+        return self._terms[start:end]
+
+    def _factor(self, token: str, term: str) -> float:
+        """IDF của token, giảm nếu chỉ khớp tiền tố"""
+        idf = math.log(1 + len(self._doc_terms) / len(self._postings[token]))
+        return idf * (1.0 if token == term else PREFIX_FACTOR)
+
+    def _term_scores(self, term: str, tokens: List[str]) -> Dict[int, float]:
+        """Điểm của mỗi card cho một từ trong câu truy vấn (lấy token khớp tốt nhất)"""
+        scores: Dict[int, float] = {}
+        for token in tokens:
+            factor = self._factor(token, term)
+            for card_id, weight in self._postings[token].items():
+                score = weight * factor
+                if score > scores.get(card_id, 0.0):
+                    scores[card_id] = score
+        return scores
+
+    def _rescore(self, scores: Dict[int, float], term: str) -> Dict[int, float]:
+        """Giữ các card (đã khớp các từ trước) có token bắt đầu bằng term, cộng thêm điểm"""
+        result = {}
+        for card_id, score in scores.items():
+            best = 0.0
+            for token, weight in self._doc_terms[card_id].items():
+                if token.startswith(term):
+                    best = max(best, weight * self._factor(token, term))
+            if best:
+                result[card_id] = score + best
+        return result
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[int, List[int]]:
+        """
+        Tìm card chứa mọi từ trong query (theo tiền tố, không phân biệt dấu).
+
+        Returns:
+            (tổng số kết quả, danh sách id của trang [offset, offset + limit) theo điểm giảm dần)
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+        with self._lock:
+            # Bắt đầu từ từ hiếm nhất; các từ phổ biến chỉ chấm điểm trên tập ứng viên đã thu hẹp
+            expanded = []
+            for term in terms:
+                tokens = self._expand(term)
+                expanded.append((sum(len(self._postings[t]) for t in tokens), term, tokens))
+            expanded.sort(key=lambda e: e[0])
+            _, term, tokens = expanded[0]
+            scores = self._term_scores(term, tokens)
+            for cost, term, tokens in expanded[1:]:
+                if not scores:
+                    return 0, []
+                if len(scores) < cost:
+                    scores = self._rescore(scores, term)
+                else:
+                    term_scores = self._term_scores(term, tokens)
+                    scores = {card_id: score + term_scores[card_id]
+                              for card_id, score in scores.items() if card_id in term_scores}
+            # Cộng điểm khi từ gốc trùng/bắt đầu bằng cả cụm truy vấn
+            phrase = ' '.join(terms)
+            for card_id in scores:
+                head = self._heads.get(card_id, '')
+                if head == phrase:
+                    scores[card_id] += 10.0
+                elif head.startswith(phrase):
+                    scores[card_id] += 5.0
+        # Cùng điểm thì card mới hơn (id lớn hơn) đứng trước
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return len(scores), [card_id for card_id, _ in top[offset:]]
+
+    def __len__(self):
+        return len(self._doc_terms)
@@ -0,0 +1,222 @@
+"""
+Stats Index - Thống kê flashcard cập nhật dần theo từng thay đổi của store
+- Tổng hợp (tổng số, đã ôn, yêu thích, đúng/sai) cộng/trừ theo delta, không quét lại
+- Ring buffer các card mới tạo gần nhất cho trang chủ
+- Mảng id + vị trí để chọn card ngẫu nhiên O(1) (từ của ngày)
+- Chuỗi hoạt động theo ngày (số lượt ôn, đúng/sai) lưu ra file JSON
+"""
+
+import json
+import random
+import threading
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from flashcard_store import StoreIndex, atomic_write_json, file_lock
+
+RECENT_CAPACITY = 50  # Giữ dư so với số card hiển thị để xóa vài card gần đây không phải nạp lại
+AGGREGATES = ('total', 'reviewed', 'favorites', 'total_correct', 'total_wrong')
+
+
+def _mtime(path: Path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _add(days: Dict[str, Dict[str, int]], day: str, delta: Dict[str, int]):
+    entry = days.setdefault(day, {'reviews': 0, 'correct': 0, 'wrong': 0})
+    for key, value in delta.items():
+        entry[key] += value
+
+
+def _contribution(card: Optional[Dict]) -> Dict[str, int]:
+    if card is None:
+        return dict.fromkeys(AGGREGATES, 0)
+    return {
+        'total': 1,
+        'reviewed': 1 if card.get('review_count', 0) > 0 else 0,
+        'favorites': 1 if card.get('favorite') else 0,
+        'total_correct': card.get('correct_count', 0),
+        'total_wrong': card.get('wrong_count', 0),
+    }
+
+
+class ActivityLog:
+    """
+    Số lượt ôn/đúng/sai theo ngày, ghi ra file sau mỗi `save_every` lượt và khi đóng.
+
+    Mỗi process chỉ ghi các lượt ôn của chính nó: save() cộng phần chưa lưu vào nội dung file hiện tại
+    (shared=True: dưới khóa file), nên nhiều worker gunicorn ghi cùng file không mất số liệu của nhau.
+    """
+
+    def __init__(self, path, save_every: int = 20, shared: bool = False):
+        self.path = Path(path) if path else None
+        self.save_every = save_every
+        self.shared = shared and self.path is not None
+        self._days: Dict[str, Dict[str, int]] = {}  # Trên đĩa + chưa lưu
+        self._pending: Dict[str, Dict[str, int]] = {}  # Chưa lưu
+        self._dirty = 0
+        self._stamp = None
+        self._lock = threading.Lock()
+        if self.path is not None:
+            with self._locked():
+                self._days = self._read()
+
+    def _locked(self):
+        return file_lock(self.path.with_suffix('.lock')) if self.shared else nullcontext()
+
+    def _read(self) -> Dict[str, Dict[str, int]]:
+        """Đọc file (gọi khi giữ khóa) và cộng thêm phần chưa lưu"""
+        days = {}
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    days = json.load(f)
+            except Exception as e:
+                print(f"⚠️  Cannot load activity log: {e}")
+        self._stamp = _mtime(self.path)
+        for day, delta in self._pending.items():
+            _add(days, day, delta)
+        return days
+
+    def record(self, day: str, reviews: int, correct: int, wrong: int):
+        delta = {'reviews': reviews, 'correct': correct, 'wrong': wrong}
+        with self._lock:
+            _add(self._days, day, delta)
+            _add(self._pending, day, delta)
+            self._dirty += 1
+        if self._dirty >= self.save_every:
+            self.save()
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        with self._lock, self._locked():
+            try:
+                days = self._read()
+                atomic_write_json(self.path, days, indent=None)
+            except OSError as e:
+                print(f"⚠️  Cannot save activity log: {e}")
+                return
+            self._days = days
+            self._pending = {}
+            self._stamp = _mtime(self.path)
+            self._dirty = 0
+
+    def _refresh(self):
+        """Shared mode: nạp lại khi process khác đã ghi file"""
+        if not self.shared or _mtime(self.path) == self._stamp:
+            return
+        with self._lock, self._locked():
+            self._days = self._read()
+
+    def series(self, days: int = 30, today: Optional[datetime] = None) -> List[Dict]:
+        """`days` ngày gần nhất (kể cả ngày không ôn), cũ -> mới"""
+        self._refresh()
+        today = today or datetime.now()
+        result = []
+        for offset in range(days - 1, -1, -1):
+            day = (today - timedelta(days=offset)).strftime('%Y-%m-%d')
+            entry = self._days.get(day, {'reviews': 0, 'correct': 0, 'wrong': 0})
+            answered = entry['correct'] + entry['wrong']
+            result.append({
+                'date': day,
+                **entry,
+                'accuracy': round(entry['correct'] / answered * 100, 2) if answered else 0,
+            })
+        return result
+
+
+class StatsIndex(StoreIndex):
+    """
+    Thống kê tổng hợp + card gần đây + chọn ngẫu nhiên, cập nhật O(1) mỗi thay đổi.
+
+    Args:
+        activity_file: file JSON lưu chuỗi hoạt động theo ngày (None = chỉ trong bộ nhớ)
+        shared: nhiều process ghi chung activity_file (xem ActivityLog)
+    """
+
+    def __init__(self, activity_file=None, shared: bool = False):
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(AGGREGATES, 0)
+        self._recent = deque(maxlen=RECENT_CAPACITY)
+        self._ids: List[int] = []
+        self._pos: Dict[int, int] = {}
+        self.activity = ActivityLog(activity_file, shared=shared)
+
+    def rebuild(self, cards):
+        with self._lock:
+            self._totals = dict.fromkeys(AGGREGATES, 0)
+            for card in cards:
+                for key, value in _contribution(card).items():
+                    self._totals[key] += value
+            self._recent = deque((card['id'] for card in cards[-RECENT_CAPACITY:]), maxlen=RECENT_CAPACITY)
+            self._ids = [card['id'] for card in cards]
+            self._pos = {card_id: i for i, card_id in enumerate(self._ids)}
+
+    def on_change(self, old, new):
+        self._apply(old, new, record=True)
+
+    def on_remote_change(self, old, new):
+        # Process ghi thay đổi đã tự ghi lượt ôn vào chuỗi hoạt động
+        self._apply(old, new, record=False)
+
+    def _apply(self, old, new, record: bool):
+        with self._lock:
+            before, after = _contribution(old), _contribution(new)
+            for key in AGGREGATES:
+                self._totals[key] += after[key] - before[key]
+
+            if old is None:
+                self._recent.append(new['id'])
+                self._pos[new['id']] = len(self._ids)
+                self._ids.append(new['id'])
+            elif new is None:
+                if old['id'] in self._recent:
+                    self._recent.remove(old['id'])
+                # Xóa O(1): đưa phần tử cuối vào chỗ trống
+                i = self._pos.pop(old['id'])
+                last = self._ids.pop()
+                if last != old['id']:
+                    self._ids[i] = last
+                    self._pos[last] = i
+
+            # Một lượt ôn mới -> ghi vào chuỗi hoạt động theo ngày
+            if record and old is not None and new is not None:
+                reviews = new.get('review_count', 0) - old.get('review_count', 0)
+                if reviews > 0:
+                    day = (new.get('last_reviewed') or datetime.now().strftime('%Y-%m-%d'))[:10]
+                    self.activity.record(day, reviews, after['total_correct'] - before['total_correct'],
+                                         after['total_wrong'] - before['total_wrong'])
+
+    def totals(self) -> Dict:
+        with self._lock:
+            totals = dict(self._totals)
+        answered = totals['total_correct'] + totals['total_wrong']
+        totals['accuracy'] = round(totals['total_correct'] / answered * 100, 2) if answered else 0
+        return totals
+
+    def recent(self, store, n: int = 10) -> List[Dict]:
+        """n card tạo gần nhất (mới -> cũ)"""
+        with self._lock:
+            short = len(self._recent) < min(n, len(self._ids))
+        if short:
+            # Đã xóa hết phần dư trong ring buffer -> nạp lại từ store (hiếm khi xảy ra)
+            store.refresh(self)
+        with self._lock:
+            ids = list(self._recent)[-n:]
+        ids.reverse()
+        return [card for card in map(store.get, ids) if card is not None]
+
+    def random_id(self) -> Optional[int]:
+        with self._lock:
+            return random.choice(self._ids) if self._ids else None
+
+    def close(self):
+        with self._lock:
+            self.activity.save()
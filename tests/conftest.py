@@ -0,0 +1,65 @@
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import os
+import sys
+import types
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+class _PaddleStub(types.ModuleType):
+    """Any missing attribute is an inert class: enough for module-level imports and base classes"""
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = type(name, (), {"__init__": lambda self, *a, **k: None})
+        setattr(self, name, value)
+        return value
+
+
+class _PaddleFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    def find_spec(self, name, path, target=None):
+        if name == "paddle" or name.startswith("paddle."):
+            return importlib.machinery.ModuleSpec(name, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        return _PaddleStub(spec.name)
+
+    def exec_module(self, module):
+        module.__path__ = []
+        if module.__name__ == "paddle":
+            module.get_device = lambda: "cpu"
+        elif module.__name__ == "paddle.distributed":
+            module.get_rank = lambda: 0
+
+
+def _stub_paddle():
+    """Minimal paddle stand-in so post-processing and inference modules import without the framework"""
+    if any(isinstance(finder, _PaddleFinder) for finder in sys.meta_path):
+        return
+    try:
+        import paddle  # noqa: F401
+
+        return
+    except ImportError:
+        pass
+    sys.meta_path.insert(0, _PaddleFinder())
+
+
+def load_module(name, relpath):
+    """Import a single source file, skipping its package __init__ (which needs all of paddle)"""
+    _stub_paddle()
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relpath))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_module(name):
+    """Import a package module (e.g. tools.infer.predict_det), with the paddle stand-in if needed"""
+    _stub_paddle()
+    return importlib.import_module(name)
@@ -0,0 +1,69 @@
+import pytest
+
+app_module = pytest.importorskip("app")
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize("grade", [9, -4, 6, "x", [3]])
+def test_review_rejects_grade_outside_0_5(client, grade):
+    response = client.post("/api/review", json={"card_id": -1, "grade": grade})
+    assert response.status_code == 400
+    assert "0-5" in response.get_json()["error"]
+
+
+def test_review_unknown_card(client):
+    response = client.post("/api/review", json={"card_id": -1, "grade": 5})
+    assert response.status_code == 404
+
+
+def _png():
+    import cv2
+    import numpy as np
+
+    return cv2.imencode(".png", np.full((32, 32, 3), 200, np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, "JOB_SPOOL_FOLDER", str(tmp_path))
+    monkeypatch.setattr(app_module, "PADDLEOCR_AVAILABLE", True)
+    return tmp_path
+
+
+def _submit(client, count=2):
+    from io import BytesIO
+
+    files = [(BytesIO(_png()), f"{i}.png") for i in range(count)]
+    return client.post("/api/jobs", data={"images": files}, content_type="multipart/form-data")
+
+
+def test_job_uploads_are_spooled_and_removed(client, spool, monkeypatch):
+    from job_queue import JobQueue
+
+    seen = []
+
+    def handler(job, payload):
+        seen.extend((name, path, path.read_bytes() == _png()) for name, path in payload["images"])
+        return {}
+
+    jobs = JobQueue(handler, workers=1, on_finish=app_module.remove_spooled)
+    monkeypatch.setattr(app_module, "ocr_jobs", jobs)
+    assert _submit(client).status_code == 202
+    assert jobs.drain(10)
+    # The queue held paths to spool files, not image bytes, and they are gone once the job ends
+    assert [(name, ok) for name, _, ok in seen] == [("0.png", True), ("1.png", True)]
+    assert all(path.parent == spool for _, path, _ in seen)
+    assert list(spool.iterdir()) == []
+
+
+def test_job_spool_removed_when_queue_is_full(client, spool, monkeypatch):
+    from job_queue import JobQueue
+
+    jobs = JobQueue(lambda job, payload: {}, max_pending=0)
+    monkeypatch.setattr(app_module, "ocr_jobs", jobs)
+    assert _submit(client).status_code == 429
+    assert list(spool.iterdir()) == []
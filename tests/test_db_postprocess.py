@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import load_module
+
+db_postprocess = load_module("db_postprocess", "ppocr/postprocess/db_postprocess.py")
+
+
+def _probability_map(rng, n, height=480, width=720, rotate=True):
+    """Rows of text-line blobs (some rotated, some tiny) with noisy scores"""
+    pred = np.zeros((height, width), np.float32)
+    for k in range(n):
+        row, col = divmod(k, 8)
+        cx, cy = col * 88 + 44 + rng.uniform(-5, 5), row * 24 + 12
+        w, h = rng.uniform(20, 80), rng.uniform(8, 14)
+        if rng.random() < 0.3:
+            w, h = rng.uniform(1, 4), rng.uniform(1, 4)
+        angle = rng.uniform(-8, 8) if rotate and rng.random() < 0.5 else 0
+        pts = cv2.boxPoints(((cx, cy), (w, h), angle)).astype(np.int32)
+        cv2.fillPoly(pred, [pts], float(rng.uniform(0.35, 1.0)))
+    noise = rng.normal(0, 0.05, pred.shape).astype(np.float32)
+    return np.clip(pred + noise * (pred > 0), 0, 1)
+
+
+@pytest.mark.parametrize("score_workers", [0, 4])
+def test_fast_path_matches_reference(score_workers):
+    rng = np.random.default_rng(0)
+    post = db_postprocess.DBPostProcess(
+        box_thresh=0.6, unclip_ratio=1.5, score_workers=score_workers
+    )
+    for trial in range(40):
+        pred = _probability_map(rng, 160, rotate=trial % 4 != 0)
+        bitmap = pred > 0.3
+        height, width = pred.shape
+        ref_boxes, ref_scores = post.boxes_from_bitmap(pred, bitmap, width, height)
+        boxes, scores = post.boxes_from_bitmap_fast(pred, bitmap, width, height)
+
+        assert len(boxes) == len(ref_boxes)
+        if len(ref_boxes):
+            diff = np.abs(boxes.astype(np.int64) - ref_boxes.astype(np.int64))
+            assert diff.max() <= 2
+            np.testing.assert_allclose(scores, ref_scores, atol=1e-3)
+
+
+def test_mini_boxes_match_box_points_order():
+    rng = np.random.default_rng(1)
+    rects = np.array(
+        [
+            (
+                rng.uniform(0, 500),
+                rng.uniform(0, 500),
+                rng.uniform(1, 300),
+                rng.uniform(1, 300),
+                rng.uniform(0, 90),
+            )
+            for _ in range(500)
+        ]
+        + [(10.5, 20, 30, 40, 90.0), (7, 8, 9, 10, 0.0)],
+        np.float32,
+    )
+    fast = db_postprocess.DBPostProcess.mini_boxes(rects)
+    for rect, box in zip(rects, fast):
+        points = cv2.boxPoints(((rect[0], rect[1]), (rect[2], rect[3]), rect[4]))
+        ref, _ = db_postprocess.DBPostProcess().get_mini_boxes(points.reshape(-1, 1, 2))
+        np.testing.assert_allclose(box, np.array(ref), atol=1e-3)
+
+
+def test_empty_bitmap():
+    post = db_postprocess.DBPostProcess()
+    pred = np.zeros((64, 64), np.float32)
+    boxes, scores = post.boxes_from_bitmap_fast(pred, pred > 0.3, 64, 64)
+    assert len(boxes) == 0 and len(scores) == 0
@@ -0,0 +1,52 @@
+import pytest
+
+import dictionary_api
+import kv_cache
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """Disk cache off, API replaced by a table: word -> (info, cacheable)"""
+    dictionary_api.configure_cache(enabled=False)
+    monkeypatch.setattr(dictionary_api, "_get_disk_cache", lambda: None)
+    calls, answers = [], {}
+
+    def fetch(word):
+        calls.append(word)
+        return answers[word]
+
+    monkeypatch.setattr(dictionary_api, "_fetch_word_info", fetch)
+    yield calls, answers
+    dictionary_api._memory_cache.clear()
+
+
+def test_found_word_served_from_memory(fetches):
+    calls, answers = fetches
+    answers["run"] = ({"part_of_speech": "verb"}, True)
+    assert dictionary_api.get_word_info("run") == {"part_of_speech": "verb"}
+    assert dictionary_api.get_word_info(" Run ") == {"part_of_speech": "verb"}
+    assert calls == ["run"]
+
+
+def test_transient_error_not_cached(fetches):
+    calls, answers = fetches
+    answers["run"] = ({}, False)
+    assert dictionary_api.get_word_info("run") == {}
+    answers["run"] = ({"part_of_speech": "verb"}, True)
+    assert dictionary_api.get_word_info("run") == {"part_of_speech": "verb"}
+    assert calls == ["run", "run"]
+
+
+def test_not_found_expires_from_memory(fetches, monkeypatch):
+    calls, answers = fetches
+    answers["qwzx"] = ({}, True)
+    clock = [1000.0]
+    monkeypatch.setattr(kv_cache.time, "monotonic", lambda: clock[0])
+    assert dictionary_api.get_word_info("qwzx") == {}
+    assert dictionary_api.get_word_info("qwzx") == {}
+    assert calls == ["qwzx"]
+
+    clock[0] += dictionary_api.NEGATIVE_MEMORY_TTL + 1
+    answers["qwzx"] = ({"part_of_speech": "noun"}, True)
+    assert dictionary_api.get_word_info("qwzx") == {"part_of_speech": "noun"}
+    assert calls == ["qwzx", "qwzx"]
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from flashcard_index import ALL, FacetIndex
+from flashcard_store import FlashcardStore
+
+
+def _card(i, rng):
+    return {
+        "original": f"word {i}",
+        "category": rng.choice(["", "food", "travel", "work"]),
+        "favorite": rng.random() < 0.3,
+        "learned": rng.random() < 0.5,
+    }
+
+
+def _expected(store, filters):
+    def ok(card):
+        for key in filters:
+            if key == ALL:
+                continue
+            if key[0] == "category" and card.get("category") != key[1]:
+                return False
+            if key[0] != "category" and not card.get(key[0]):
+                return False
+        return True
+
+    return sorted(card["id"] for card in store.all() if ok(card))
+
+
+def _walk(index, store, filters, limit):
+    ids, cursor = [], None
+    while True:
+        cards, cursor, total = index.page(store, filters, cursor=cursor, limit=limit)
+        ids += [card["id"] for card in cards]
+        if cursor is None:
+            return ids, total
+
+
+@pytest.fixture
+def store(tmp_path):
+    rng = random.Random(0)
+    store = FlashcardStore(tmp_path)
+    store.add_many([_card(i, rng) for i in range(200)])
+    return store
+
+
+FILTERS = [
+    [],
+    [("category", "food")],
+    [("favorite", True)],
+    [("category", "travel"), ("learned", True)],
+    [("category", "missing")],
+]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_cursor_pages_cover_matches_in_order(store, filters):
+    index = store.attach(FacetIndex())
+    expected = _expected(store, filters)
+    for limit in (1, 7, 50, 1000):
+        assert _walk(index, store, filters, limit) == (expected, len(expected))
+
+
+def test_index_follows_updates_and_deletes(store):
+    index = store.attach(FacetIndex())
+    rng = random.Random(1)
+    for _ in range(150):
+        card_id = rng.choice([card["id"] for card in store.all()])
+        op = rng.random()
+        if op < 0.2:
+            store.delete(card_id)
+        elif op < 0.4:
+            store.add(_card(card_id, rng))
+        else:
+            store.update(card_id, {"category": rng.choice(["", "food", "work"]), "favorite": rng.random() < 0.5})
+    for filters in FILTERS:
+        assert _walk(index, store, filters, 13) == (_expected(store, filters), len(_expected(store, filters)))
+    assert index.categories() == {
+        c: len(_expected(store, [("category", c)])) for c in {card["category"] for card in store.all()} if c
+    }
+
+
+def test_cursor_survives_changes_between_pages(store):
+    index = store.attach(FacetIndex())
+    cards, cursor, _ = index.page(store, [], limit=10)
+    assert cursor == cards[-1]["id"]
+    # Deleting the cursor card or earlier cards does not shift the next page
+    store.delete(cursor)
+    store.delete(cards[0]["id"])
+    added = store.add({"original": "new"})
+    nxt, _, _ = index.page(store, [], cursor=cursor, limit=10)
+    assert [c["id"] for c in nxt] == list(range(cursor + 1, cursor + 11))
+    ids = []
+    while cursor is not None:
+        page, cursor, _ = index.page(store, [], cursor=cursor, limit=50)
+        ids += [c["id"] for c in page]
+    assert ids[-1] == added["id"] and ids == sorted(ids)
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    app_module = pytest.importorskip("app")
+    monkeypatch.setattr(app_module, "flashcard_store", store)
+    monkeypatch.setattr(app_module, "facet_index", store.attach(FacetIndex()))
+    return app_module.app.test_client()
+
+
+def test_etag_revalidates_until_the_store_changes(client, store):
+    url = "/api/flashcards?category=food&limit=5"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    # Another query string gets its own tag
+    assert client.get("/api/flashcards?limit=5").headers["ETag"] != etag
+
+    store.update(first.get_json()["flashcards"][0]["id"], {"meaning": "changed"})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.get_json()["flashcards"][0]["meaning"] == "changed"
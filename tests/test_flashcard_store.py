@@ -0,0 +1,176 @@
+import json
+
+from flashcard_store import SNAPSHOT_NAME, WAL_NAME, FlashcardStore
+
+
+def _card(word):
+    return {"word": word, "meaning": word.upper()}
+
+
+def _abandon(store):
+    """Simulate a crash: drop the WAL handle without compacting"""
+    if store._wal is not None:
+        store._wal.close()
+        store._wal = None
+
+
+def test_wal_replayed_after_crash(tmp_path):
+    store = FlashcardStore(tmp_path)
+    first = store.add(_card("alpha"))
+    store.add_many([_card("beta"), _card("gamma")])
+    store.update(first["id"], {"meaning": "changed"})
+    store.delete(2)
+    _abandon(store)
+    assert (tmp_path / WAL_NAME).exists()
+
+    reopened = FlashcardStore(tmp_path)
+    assert [c["word"] for c in reopened.all()] == ["alpha", "gamma"]
+    assert reopened.get(first["id"])["meaning"] == "changed"
+    # Replayed entries are folded into the snapshot on load
+    assert not (tmp_path / WAL_NAME).exists()
+    snapshot = json.loads((tmp_path / SNAPSHOT_NAME).read_text(encoding="utf-8"))
+    assert [c["word"] for c in snapshot] == ["alpha", "gamma"]
+
+
+def test_torn_last_wal_line_is_skipped(tmp_path):
+    store = FlashcardStore(tmp_path)
+    store.add(_card("alpha"))
+    _abandon(store)
+    with open(tmp_path / WAL_NAME, "a", encoding="utf-8") as f:
+        f.write('{"op": "put", "card": {"id": 9, "wo')
+
+    reopened = FlashcardStore(tmp_path)
+    assert [c["word"] for c in reopened.all()] == ["alpha"]
+
+
+def test_compaction_after_compact_every(tmp_path):
+    store = FlashcardStore(tmp_path, compact_every=3)
+    store.add(_card("a"))
+    store.add(_card("b"))
+    assert (tmp_path / WAL_NAME).exists()
+    store.add(_card("c"))
+    assert not (tmp_path / WAL_NAME).exists()
+    snapshot = json.loads((tmp_path / SNAPSHOT_NAME).read_text(encoding="utf-8"))
+    assert [c["word"] for c in snapshot] == ["a", "b", "c"]
+
+    # A bulk add counts one operation per card
+    store.add_many([_card("d"), _card("e"), _card("f")])
+    assert not (tmp_path / WAL_NAME).exists()
+    assert len(FlashcardStore(tmp_path)) == 6
+
+
+def test_clear_and_close(tmp_path):
+    store = FlashcardStore(tmp_path)
+    store.add_many([_card("a"), _card("b")])
+    store.clear()
+    store.add(_card("c"))
+    store.close()
+    assert not (tmp_path / WAL_NAME).exists()
+    assert [c["word"] for c in FlashcardStore(tmp_path).all()] == ["c"]
+
+
+def test_duplicate_ids_in_snapshot_are_dropped(tmp_path):
+    cards = [{"id": 1, "word": "a"}, {"id": 1, "word": "dup"}, {"id": 2, "word": "b"}]
+    (tmp_path / SNAPSHOT_NAME).write_text(json.dumps(cards), encoding="utf-8")
+    store = FlashcardStore(tmp_path)
+    assert [c["word"] for c in store.all()] == ["a", "b"]
+
+
+def test_failed_wal_write_changes_nothing(tmp_path, monkeypatch):
+    import flashcard_store
+
+    class Index(flashcard_store.StoreIndex):
+        def rebuild(self, cards):
+            self.words = {c["id"]: c["word"] for c in cards}
+
+        def on_change(self, old, new):
+            if old is not None:
+                self.words.pop(old["id"])
+            if new is not None:
+                self.words[new["id"]] = new["word"]
+
+    store = FlashcardStore(tmp_path)
+    index = store.attach(Index())
+    store.add_many([_card("a"), _card("b")])
+
+    def fail(fd):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(flashcard_store.os, "fsync", fail)
+    for write in (
+        lambda: store.add(_card("c")),
+        lambda: store.update(1, {"word": "changed"}),
+        lambda: store.delete(2),
+        store.clear,
+    ):
+        try:
+            write()
+        except OSError:
+            pass
+        else:
+            raise AssertionError("write should fail")
+        assert [c["word"] for c in store.all()] == ["a", "b"]
+        assert index.words == {1: "a", 2: "b"}
+    monkeypatch.undo()
+
+    # The WAL has no torn line left over: later writes replay cleanly
+    store.add(_card("d"))
+    _abandon(store)
+    assert [(c["id"], c["word"]) for c in FlashcardStore(tmp_path).all()] == [
+        (1, "a"),
+        (2, "b"),
+        (3, "d"),
+    ]
+
+
+def test_shared_stores_see_each_other(tmp_path):
+    one = FlashcardStore(tmp_path, shared=True)
+    two = FlashcardStore(tmp_path, shared=True)
+    one.add(_card("a"))
+    two.sync()
+    assert [c["word"] for c in two.all()] == ["a"]
+    # Writes apply the other process' WAL first, so ids never collide
+    added = two.add(_card("b"))
+    assert added["id"] == 2
+    one.compact()
+    two.sync()
+    assert [c["word"] for c in two.all()] == ["a", "b"]
+    assert one.etag == two.etag
+
+
+def test_deleted_highest_id_is_not_reused(tmp_path):
+    store = FlashcardStore(tmp_path)
+    store.add_many([_card("a"), _card("b"), _card("c")])
+    store.delete(3)
+    assert store.add(_card("d"))["id"] == 4
+    store.delete(4)
+
+    # Still not reused after compaction drops the WAL, nor after reopening
+    store.compact()
+    store.close()
+    reopened = FlashcardStore(tmp_path)
+    assert reopened.next_id() == 5
+    assert reopened.add(_card("e"))["id"] == 5
+
+
+def test_deleted_highest_id_not_reused_after_crash(tmp_path):
+    store = FlashcardStore(tmp_path)
+    store.add_many([_card("a"), _card("b")])
+    store.delete(2)
+    _abandon(store)
+    assert FlashcardStore(tmp_path).add(_card("c"))["id"] == 3
+
+
+def test_add_many_skip_sees_cards_of_the_same_batch(tmp_path):
+    store = FlashcardStore(tmp_path)
+    store.add(_card("a"))
+    words = {c["word"] for c in store.all()}
+
+    def skip(card):
+        if card["word"] in words:
+            return True
+        words.add(card["word"])
+        return False
+
+    added = store.add_many([_card("a"), _card("b"), _card("b"), _card("c")], skip=skip)
+    assert [(c["id"], c["word"]) for c in added] == [(2, "b"), (3, "c")]
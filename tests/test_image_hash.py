@@ -0,0 +1,87 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from image_hash import UploadIndex, dedupe_directory
+
+
+def _photo(word, seed=0):
+    """A handwritten-like word on slightly uneven paper"""
+    rng = np.random.default_rng(seed)
+    img = np.full((600, 900, 3), 235, np.uint8)
+    img = np.clip(img - np.linspace(0, 20, 900)[None, :, None], 0, 255).astype(np.uint8)
+    cv2.putText(img, word, (120, 330), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, 4, (40, 40, 40), 8, cv2.LINE_AA)
+    return np.clip(img + rng.normal(0, 4, img.shape), 0, 255).astype(np.uint8)
+
+
+def _png(img):
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def _jpeg(img, quality=90):
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+@pytest.fixture
+def index(tmp_path):
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    return UploadIndex(tmp_path / "hashes.json", upload_dir)
+
+
+def _store(index, name, data):
+    (index.upload_dir / name).write_bytes(data)
+    index.add(name, index.fingerprint(data))
+
+
+def test_different_words_are_not_duplicates(tmp_path, index):
+    # Every stored image is a pHash candidate: the pixel signature alone must reject them
+    index = UploadIndex(tmp_path / "all.json", index.upload_dir, threshold=64)
+    words = ["apple", "mango", "lemon", "garden", "harbor"]
+    for word in words[:-1]:
+        _store(index, f"{word}.png", _png(_photo(word)))
+    fp = index.fingerprint(_png(_photo(words[-1])))
+    assert index.find(fp) is None
+
+
+def test_same_image_reencoded_or_resized_is_duplicate(index):
+    img = _photo("apple")
+    _store(index, "apple.png", _png(img))
+    assert index.find(index.fingerprint(_png(img))) == "apple.png"
+    assert index.find(index.fingerprint(_jpeg(img, 40))) == "apple.png"
+    small = cv2.resize(img, (450, 300), interpolation=cv2.INTER_AREA)
+    assert index.find(index.fingerprint(_jpeg(small, 60))) == "apple.png"
+
+
+def test_candidate_signature_recomputed_from_file(tmp_path, index):
+    img = _photo("apple")
+    _store(index, "apple.png", _png(img))
+    index.close()
+    reopened = UploadIndex(tmp_path / "hashes.json", index.upload_dir)
+    assert reopened.find(reopened.fingerprint(_jpeg(img, 50))) == "apple.png"
+
+
+def test_removed_file_is_not_matched(index):
+    data = _png(_photo("apple"))
+    _store(index, "apple.png", data)
+    index.remove("apple.png")
+    assert index.find(index.fingerprint(data)) is None
+
+
+def test_dedupe_directory(index):
+    img = _photo("apple")
+    (index.upload_dir / "a.png").write_bytes(_png(img))
+    (index.upload_dir / "b.jpg").write_bytes(_jpeg(img, 50))
+    (index.upload_dir / "c.png").write_bytes(_png(_photo("mango")))
+    for age, name in enumerate(["a.png", "b.jpg", "c.png"]):
+        path = index.upload_dir / name
+        os.utime(path, (1_000_000 + age, 1_000_000 + age))
+
+    assert dedupe_directory(index, dry_run=True) == {"b.jpg": "a.png"}
+    assert len(index) == 0 and (index.upload_dir / "b.jpg").exists()
+
+    assert dedupe_directory(index) == {"b.jpg": "a.png"}
+    assert not (index.upload_dir / "b.jpg").exists()
+    assert "a.png" in index and "c.png" in index
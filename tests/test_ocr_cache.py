@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+
+from ocr_cache import OCRResultCache, image_key
+
+
+def _image(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+
+
+def test_key_depends_on_pixels_shape_dtype_and_config():
+    image = _image()
+    key = image_key(image, {"lang": "en", "steps": ["resize"]})
+    assert key == image_key(image.copy(), {"steps": ["resize"], "lang": "en"})
+
+    changed = image.copy()
+    changed[0, 0, 0] ^= 1
+    assert image_key(changed, {"lang": "en", "steps": ["resize"]}) != key
+    assert image_key(image, {"lang": "en", "steps": []}) != key
+    assert image_key(image.reshape(60, 40, 3)) != image_key(image)
+    assert image_key(image.astype(np.uint16)) != image_key(image)
+
+
+def test_key_ignores_memory_layout():
+    image = _image()
+    view = np.asfortranarray(image)
+    assert not view.flags.c_contiguous
+    assert image_key(view) == image_key(image)
+    assert image_key(image[:, ::2]) == image_key(image[:, ::2].copy())
+
+
+def test_memory_eviction_falls_back_to_disk(tmp_path):
+    cache = OCRResultCache(max_entries=2, disk_dir=tmp_path)
+    for i in range(3):
+        cache.set(f"{i:040x}", [f"line {i}"])
+    assert len(cache.memory) == 2
+    assert cache.get(f"{0:040x}") == ["line 0"]
+    assert cache.stats["disk_hits"] == 1
+    assert cache.get(f"{2:040x}") == ["line 2"]
+    assert cache.stats["memory_hits"] == 1
+    assert cache.get(None) is None and cache.get(f"{9:040x}") is None
+    assert cache.stats["misses"] == 2
+
+
+def test_disk_eviction_removes_least_recently_used(tmp_path):
+    keys = [f"{i:040x}" for i in range(4)]
+    size = len(b'["word 0"]')
+    cache = OCRResultCache(max_entries=1, disk_dir=tmp_path, max_disk_bytes=int(size * 3.5))
+    for i, key in enumerate(keys[:3]):
+        cache.set(key, [f"word {i}"])
+        os.utime(cache._path(key), (1_000_000 + i, 1_000_000 + i))
+    # Reading from disk marks the entry as recently used
+    assert cache.get(keys[0]) == ["word 0"]
+
+    cache.set(keys[3], ["word 3"])
+    assert [cache._path(k).exists() for k in keys] == [True, False, False, True]
+    assert cache.stats["evictions"] == 2
+    assert cache.info()["disk_bytes"] == 2 * size
+
+    reopened = OCRResultCache(disk_dir=tmp_path)
+    assert reopened.info()["disk_bytes"] == 2 * size
+    assert reopened.get(keys[1]) is None and reopened.get(keys[3]) == ["word 3"]
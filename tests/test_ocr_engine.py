@@ -0,0 +1,99 @@
+import numpy as np
+
+import metrics
+import ocr_engine
+
+
+class FakeOCR3:
+    """PaddleOCR 3.x: ocr() forwards **kwargs to predict(), which rejects `cls`"""
+
+    def __init__(self):
+        self.calls = []
+
+    def ocr(self, image, **kwargs):
+        return self.predict(image, **kwargs)
+
+    def predict(self, image, use_textline_orientation=True, **kwargs):
+        if kwargs:
+            raise TypeError(f"unexpected arguments {sorted(kwargs)}")
+        self.calls.append(use_textline_orientation)
+        return [{"rec_texts": [" hello ", "world"]}]
+
+
+class FakeOCR2:
+    def ocr(self, image, cls=True):
+        return [[[[[0, 0]] * 4, (" hello ", 0.9)], [[[0, 0]] * 4, ("world", 0.8)]]]
+
+
+def test_run_ocr_uses_predict_api_first(capsys):
+    ocr = FakeOCR3()
+    assert ocr_engine.run_ocr(ocr, np.zeros((8, 8, 3), np.uint8)) == ["hello", "world"]
+    assert ocr.calls == [False]
+    assert capsys.readouterr().out == ""
+
+
+def test_run_ocr_2x_api():
+    assert ocr_engine.run_ocr(FakeOCR2(), np.zeros((8, 8, 3), np.uint8)) == ["hello", "world"]
+
+
+def test_warmup_uses_predict_api():
+    ocr = FakeOCR3()
+    ocr_engine.warmup_ocr(ocr)
+    assert ocr.calls == [False]
+
+
+def _stage_count(stage):
+    prefix = f'ocrapp_stage_seconds_count{{stage="{stage}"}} '
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0.0
+
+
+class FakePaddleXPipeline:
+    """PaddleX OCR pipeline: sub-models return generators"""
+
+    def __init__(self):
+        self.text_det_model = lambda images: (image for image in images)
+        self.text_rec_model = lambda crops: (crop for crop in crops)
+
+    def predict(self, images):
+        for image in self.text_det_model(images):
+            yield list(self.text_rec_model([image, image]))
+
+
+class FakeOCR3Pipeline:
+    def __init__(self):
+        self.paddlex_pipeline = FakePaddleXPipeline()
+
+
+class FakeTextSystem:
+    """PaddleOCR 2.x: sub-models return (result, elapse) tuples"""
+
+    def __init__(self):
+        self.text_detector = lambda img: ([1, 2], 0.01)
+        self.text_recognizer = lambda crops: (["a", "b"], 0.01)
+
+
+def test_instrument_stages_times_generator_models():
+    ocr = FakeOCR3Pipeline()
+    assert sorted(ocr_engine.instrument_stages(ocr)) == ["det", "rec"]
+    assert sorted(ocr_engine.instrument_stages(ocr)) == ["det", "rec"]  # No double wrapping
+    det, rec = _stage_count("det"), _stage_count("rec")
+    assert list(ocr.paddlex_pipeline.predict(["img1", "img2"])) == [["img1", "img1"], ["img2", "img2"]]
+    assert _stage_count("det") == det + 1
+    assert _stage_count("rec") == rec + 2
+
+
+def test_instrument_stages_times_2x_text_system():
+    ocr = FakeTextSystem()
+    ocr_engine.instrument_stages(ocr)
+    det = _stage_count("det")
+    assert ocr.text_detector("img") == ([1, 2], 0.01)
+    assert _stage_count("det") == det + 1
+
+
+def test_observe_time_dict():
+    det = _stage_count("det")
+    metrics.observe_time_dict({"det": 0.02, "cls": 0, "rec": 0.05, "all": 0.07})
+    assert _stage_count("det") == det + 1
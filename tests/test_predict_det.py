@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+utility = import_module("tools.infer.utility")
+predict_det = import_module("tools.infer.predict_det")
+
+
+class FakeNet:
+    """Per-pixel 'probability map': dark pixels are text, zero padding is background"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, batch):
+        self.batches.append(batch.shape)
+        return [(batch[:, :1] < -1.0).astype(np.float32) * 0.9]
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    monkeypatch.setattr(utility, "create_predictor", lambda args, mode, logger: (None,) * 4)
+    args = utility.init_args().parse_args(["--det_batch_num", "4", "--det_batch_bucket", "64"])
+    detector = predict_det.TextDetector(args)
+    detector._run = FakeNet()
+    return detector
+
+
+def _page(rng, height, width):
+    img = np.full((height, width, 3), 240, np.uint8)
+    for _ in range(rng.integers(2, 6)):
+        x, y = rng.integers(0, width - 60), rng.integers(0, height - 20)
+        cv2.rectangle(img, (x, y), (x + rng.integers(20, 60), y + rng.integers(8, 20)), (20, 20, 20), -1)
+    return img
+
+
+def test_predict_batch_matches_predict_in_input_order(detector):
+    rng = np.random.default_rng(0)
+    shapes = [(200, 300), (170, 300), (200, 300), (480, 640), (96, 400), (470, 630), (200, 300), (100, 100)]
+    images = [_page(rng, h, w) for h, w in shapes]
+    batched, _ = detector.predict_batch(images)
+    assert len(batched) == len(images)
+    # (200, 300) and (170, 300) resize to different shapes in one bucket: padded together
+    assert (4, 3, 192, 288) in detector._run.batches
+    assert len(detector._run.batches) < len(images)
+    for img, boxes in zip(images, batched):
+        expected, _ = detector.predict(img)
+        assert len(expected) > 0
+        np.testing.assert_array_equal(boxes, expected)
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 16])
+def test_predict_batch_size_does_not_change_results(detector, batch_size):
+    rng = np.random.default_rng(1)
+    images = [_page(rng, 200 + 7 * i, 300 - 5 * i) for i in range(7)]
+    reference, _ = detector.predict_batch(images, batch_size=1)
+    batched, _ = detector.predict_batch(images, batch_size=batch_size)
+    for boxes, expected in zip(batched, reference):
+        np.testing.assert_array_equal(boxes, expected)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from conftest import import_module
+
+predict_rec = import_module("tools.infer.predict_rec")
+
+
+class FakeRecognizer:
+    """Reads the crop's label from its first pixel; records each batch it is given"""
+
+    rec_batch_num = 4
+    rec_image_shape = [3, 48, 320]
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, img_list):
+        self.batches.append(len(img_list))
+        time.sleep(0.005)
+        labels = [int(img[0, 0, 0]) for img in img_list]
+        if self.fail_on in labels:
+            raise ValueError("bad crop")
+        return [(str(label), label / 1000.0) for label in labels], 0.005
+
+
+def _crops(rng, labels):
+    return [np.full((32, int(rng.integers(16, 600)), 3), label, np.uint8) for label in labels]
+
+
+def _expected(crops):
+    return [(str(int(c[0, 0, 0])), int(c[0, 0, 0]) / 1000.0) for c in crops]
+
+
+def test_results_follow_each_caller_order():
+    recognizer = FakeRecognizer()
+    batcher = predict_rec.RecognitionBatcher(recognizer, max_wait=0.02, bucket_width=80)
+    rng = np.random.default_rng(0)
+    jobs = [_crops(rng, range(k * 20, k * 20 + int(rng.integers(1, 20)))) for k in range(8)]
+    results = [None] * len(jobs)
+
+    def run(k):
+        results[k], _ = batcher(jobs[k])
+
+    threads = [threading.Thread(target=run, args=(k,)) for k in range(len(jobs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    for crops, res in zip(jobs, results):
+        assert res == _expected(crops)
+    assert sum(recognizer.batches) == sum(map(len, jobs))
+    assert max(recognizer.batches) <= recognizer.rec_batch_num
+    # Crops of different callers share batches
+    assert len(recognizer.batches) < sum(map(len, jobs))
+
+
+def test_empty_call_and_closed_batcher():
+    batcher = predict_rec.RecognitionBatcher(FakeRecognizer())
+    assert batcher([])[0] == []
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit([np.zeros((32, 32, 3), np.uint8)])
+
+
+def test_batch_error_reaches_the_caller():
+    batcher = predict_rec.RecognitionBatcher(FakeRecognizer(fail_on=7), max_wait=0.01)
+    rng = np.random.default_rng(1)
+    with pytest.raises(ValueError):
+        batcher(_crops(rng, [7]))
+    crops = _crops(rng, [1, 2, 3])
+    assert batcher(crops)[0] == _expected(crops)
+    batcher.close()
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+
+from conftest import ROOT, load_module
+
+rec_postprocess = load_module("rec_postprocess", "ppocr/postprocess/rec_postprocess.py")
+
+CH_DICT = os.path.join(ROOT, "ppocr/utils/ppocr_keys_v1.txt")
+EN_DICT = os.path.join(ROOT, "ppocr/utils/en_dict.txt")
+
+
+def _peaked_probs(rng, batch, steps, classes):
+    """Softmax outputs with one dominant class per frame, about half of them blank"""
+    logits = rng.normal(0, 1, (batch, steps, classes)).astype(np.float32)
+    index = rng.integers(0, classes, (batch, steps))
+    index[rng.random((batch, steps)) < 0.5] = 0
+    logits[np.arange(batch)[:, None], np.arange(steps)[None], index] += 12
+    probs = np.exp(logits - logits.max(axis=2, keepdims=True))
+    return probs / probs.sum(axis=2, keepdims=True)
+
+
+def _reference_decode(decoder, text_index, text_prob, return_word_box=False):
+    """Per-row loop decode (list input bypasses decode_batch)"""
+    return rec_postprocess.BaseRecLabelDecode.decode(
+        decoder, list(text_index), list(text_prob), True, return_word_box
+    )
+
+
+def test_greedy_batch_decode_matches_loop():
+    decoder = rec_postprocess.CTCLabelDecode(CH_DICT, True)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        probs = _peaked_probs(rng, 16, 40, len(decoder.character))
+        index, prob = probs.argmax(axis=2), probs.max(axis=2)
+        ref = _reference_decode(decoder, index, prob)
+        out = decoder(probs)
+        assert [text for text, _ in out] == [text for text, _ in ref]
+        np.testing.assert_allclose(
+            [conf for _, conf in out], [conf for _, conf in ref], rtol=1e-5
+        )
+
+
+def test_greedy_batch_decode_word_boxes_match_loop():
+    decoder = rec_postprocess.CTCLabelDecode(CH_DICT, True)
+    probs = _peaked_probs(np.random.default_rng(1), 8, 40, len(decoder.character))
+    index, prob = probs.argmax(axis=2), probs.max(axis=2)
+    ref = _reference_decode(decoder, index, prob, return_word_box=True)
+    out = decoder.decode(index, prob, True, True)
+    for (text, _, boxes), (ref_text, _, ref_boxes) in zip(out, ref):
+        assert text == ref_text
+        assert boxes == ref_boxes
+
+
+def test_greedy_batch_decode_all_blank():
+    decoder = rec_postprocess.CTCLabelDecode(CH_DICT, True)
+    index = np.zeros((2, 5), dtype=np.int64)
+    assert decoder.decode(index) == rec_postprocess.BaseRecLabelDecode.decode(
+        decoder, list(index)
+    )
+
+
+def test_beam_search_without_scorer_equals_greedy():
+    greedy = rec_postprocess.CTCLabelDecode(EN_DICT, True)
+    beam = rec_postprocess.CTCLabelDecode(EN_DICT, True, beam_width=8)
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        probs = _peaked_probs(rng, 4, 25, len(beam.character))
+        assert [text for text, _ in beam(probs)] == [
+            text for text, _ in greedy(probs)
+        ]
+
+
+def test_beam_search_lexicon_fixes_ambiguous_character():
+    decoder = rec_postprocess.CTCLabelDecode(EN_DICT, True, beam_width=8)
+    chars = {c: i for i, c in enumerate(decoder.character)}
+    # "hel?o" where the fourth character is "1" (0.5) or "l" (0.45)
+    frames = ["h", None, "e", "l", None, "1", None, "o"]
+    probs = np.full((len(frames), len(decoder.character)), 1e-4)
+    for t, char in enumerate(frames):
+        if char is None:
+            probs[t, 0] = 0.9
+        else:
+            probs[t, chars[char]] = 0.9
+            probs[t, 0] = 0.1
+    probs[5, chars["1"]] = 0.5
+    probs[5, chars["l"]] = 0.45
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    assert decoder(probs[None])[0][0] == "hel1o"
+    decoder.scorer = rec_postprocess.LexiconScorer(["hello", "world"])
+    assert decoder(probs[None])[0][0] == "hello"
@@ -0,0 +1,37 @@
+from flashcard_store import FlashcardStore
+from search_index import SearchIndex
+
+
+def _store(tmp_path):
+    store = FlashcardStore(tmp_path)
+    index = store.attach(SearchIndex())
+    store.add_many(
+        [
+            {"original": "học bài", "translated": "study"},
+            {"original": "đồng hồ", "translated": "clock"},
+        ]
+    )
+    return store, index
+
+
+def test_search_folds_accents_and_prefixes(tmp_path):
+    store, index = _store(tmp_path)
+    assert index.search("hoc") == (1, [1])
+    assert index.search("dong h") == (1, [2])
+    assert index.search("clo") == (1, [2])
+
+
+def test_review_update_does_not_retokenize(tmp_path, monkeypatch):
+    store, index = _store(tmp_path)
+    calls = []
+    card_terms = SearchIndex._card_terms
+    monkeypatch.setattr(SearchIndex, "_card_terms", staticmethod(lambda card: calls.append(card) or card_terms(card)))
+
+    store.update(1, {"ease": 2.6, "interval": 3, "reviews": 1})
+    assert calls == []
+    assert index.search("hoc") == (1, [1])
+
+    store.update(1, {"original": "ôn tập"})
+    assert len(calls) == 1
+    assert index.search("hoc") == (0, [])
+    assert index.search("on tap") == (1, [1])
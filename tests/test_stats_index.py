@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+
+from flashcard_store import FlashcardStore
+from stats_index import StatsIndex
+
+
+def _recompute(cards):
+    """Full scan, as the stats endpoint did before the incremental index"""
+    reviewed = [c for c in cards if c.get("review_count", 0) > 0]
+    correct = sum(c.get("correct_count", 0) for c in cards)
+    wrong = sum(c.get("wrong_count", 0) for c in cards)
+    return {
+        "total": len(cards),
+        "reviewed": len(reviewed),
+        "favorites": sum(1 for c in cards if c.get("favorite")),
+        "total_correct": correct,
+        "total_wrong": wrong,
+        "accuracy": round(correct / (correct + wrong) * 100, 2) if correct + wrong else 0,
+    }
+
+
+def _review(card, rng):
+    right = rng.random() < 0.6
+    return {
+        "review_count": card.get("review_count", 0) + 1,
+        "correct_count": card.get("correct_count", 0) + right,
+        "wrong_count": card.get("wrong_count", 0) + (not right),
+        "last_reviewed": "2024-05-0%d 10:00:00" % rng.randint(1, 3),
+    }
+
+
+def test_incremental_totals_match_full_recompute(tmp_path):
+    rng = random.Random(0)
+    store = FlashcardStore(tmp_path)
+    stats = store.attach(StatsIndex())
+    store.add_many([{"original": f"w{i}", "favorite": i % 4 == 0} for i in range(30)])
+    reviews = {}
+    for _ in range(300):
+        ids = [card["id"] for card in store.all()]
+        op = rng.random()
+        if op < 0.15 or not ids:
+            store.add({"original": "new", "favorite": rng.random() < 0.3})
+        elif op < 0.3:
+            store.delete(rng.choice(ids))
+        elif op < 0.45:
+            store.update(rng.choice(ids), {"favorite": rng.random() < 0.5})
+        else:
+            card = store.get(rng.choice(ids))
+            fields = _review(card, rng)
+            store.update(card["id"], fields)
+            day = fields["last_reviewed"][:10]
+            reviews[day] = reviews.get(day, 0) + 1
+
+        cards = store.all()
+        assert stats.totals() == _recompute(cards)
+    assert sorted(stats._ids) == sorted(card["id"] for card in cards)
+
+    rebuilt = StatsIndex()
+    rebuilt.rebuild(store.all())
+    assert rebuilt.totals() == stats.totals()
+
+    newest = sorted(card["id"] for card in cards)[-10:][::-1]
+    assert [card["id"] for card in stats.recent(store, 10)] == newest
+    assert stats.random_id() in {card["id"] for card in cards}
+
+    series = stats.activity.series(3, today=datetime(2024, 5, 3))
+    assert {entry["date"]: entry["reviews"] for entry in series} == {
+        day: reviews.get(day, 0) for day in ("2024-05-01", "2024-05-02", "2024-05-03")
+    }
+
+
+def test_recent_reloads_after_ring_buffer_is_exhausted(tmp_path):
+    store = FlashcardStore(tmp_path)
+    stats = store.attach(StatsIndex())
+    added = store.add_many([{"original": f"w{i}"} for i in range(80)])
+    for card in added[-50:]:
+        store.delete(card["id"])
+    assert [card["id"] for card in stats.recent(store, 5)] == [30, 29, 28, 27, 26]
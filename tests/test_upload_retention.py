@@ -0,0 +1,84 @@
+import os
+import time
+
+import pytest
+
+from flashcard_store import FlashcardStore
+from upload_retention import UploadRefIndex, UploadRetention, upload_name
+
+DAY = 86400
+
+
+@pytest.fixture
+def setup(tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    store = FlashcardStore(tmp_path / "cards")
+    refs = store.attach(UploadRefIndex())
+    deleted = []
+    retention = UploadRetention(uploads, refs, ttl=DAY, max_bytes=1000, on_delete=deleted.append)
+    return store, retention, deleted
+
+
+def _upload(retention, name, size, age):
+    path = retention.upload_dir / name
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_upload_name_accepts_windows_and_posix_paths():
+    assert upload_name("C:\\app\\uploads\\a.png") == "a.png"
+    assert upload_name("/srv/uploads/b.jpg") == "b.jpg"
+    assert upload_name(None) == ""
+
+
+def test_collect_keeps_referenced_and_recent_files(setup):
+    store, retention, deleted = setup
+    _upload(retention, "used.png", 100, 3 * DAY)
+    _upload(retention, "old.png", 100, 2 * DAY)
+    _upload(retention, "new.png", 100, 60)
+    _upload(retention, "moved.png", 100, 3 * DAY)
+    card = store.add({"original": "a", "image": "uploads\\used.png"})
+    other = store.add({"original": "b", "image": "/x/uploads/moved.png"})
+
+    assert retention.collect(dry_run=True) == {"old.png": 100}
+    assert deleted == [] and (retention.upload_dir / "old.png").exists()
+
+    # Dropping the last reference makes an expired file collectable
+    store.update(other["id"], {"image": "uploads/used.png"})
+    assert retention.collect() == {"old.png": 100, "moved.png": 100}
+    assert sorted(deleted) == ["moved.png", "old.png"]
+    store.delete(card["id"])
+    assert retention.collect() == {}
+    store.delete(other["id"])
+    assert retention.collect() == {"used.png": 100}
+    assert sorted(p.name for p in retention.upload_dir.iterdir()) == ["new.png"]
+
+
+def test_reserve_collects_before_rejecting(setup):
+    store, retention, deleted = setup
+    _upload(retention, "kept.png", 500, 3 * DAY)
+    _upload(retention, "recent.png", 300, 60)
+    _upload(retention, "stale.png", 150, 3 * DAY)
+    store.add({"original": "a", "image": "uploads/kept.png"})
+
+    assert retention.usage() == 950
+    assert retention.reserve(50)
+    _upload(retention, "first.png", 50, 0)
+    # Over quota: only the unreferenced, expired file is given up to make room
+    assert retention.reserve(100)
+    _upload(retention, "second.png", 100, 0)
+    assert deleted == ["stale.png"]
+    assert retention.usage() == 950
+    # Referenced and recent files are never evicted, so the upload is refused
+    assert not retention.reserve(100)
+    assert deleted == ["stale.png"]
+    assert retention.reserve(50)
+
+
+def test_touch_restarts_ttl(setup):
+    _, retention, _ = setup
+    _upload(retention, "dup.png", 10, 3 * DAY)
+    retention.touch("dup.png")
+    assert retention.collect() == {}
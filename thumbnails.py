@@ -0,0 +1,183 @@
+"""
+Thumbnails - Ảnh thu nhỏ (WebP/JPEG) của ảnh upload, tạo khi cần và cache trên đĩa
+- Tên file theo hash nội dung ảnh gốc: cùng một ảnh chỉ tạo thumbnail một lần
+- Thread nền định kỳ xóa thumbnail ít dùng nhất khi cache vượt dung lượng cho phép
+"""
+
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from flashcard_store import try_file_lock
+from kv_cache import LRUCache
+
+# Kích thước cố định (cạnh dài nhất, pixel) - không nhận kích thước tùy ý để cache không phình
+SIZES = {'sm': 160, 'md': 480, 'lg': 1280}
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+QUALITY = 80
+VERSION_LENGTH = 16  # Số ký tự hash nội dung đặt trong URL (?v=)
+
+
+def _hash_file(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=12)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def render_thumbnail(source: Path, target: Path, max_side: int, fmt: str):
+    """Thu nhỏ ảnh gốc (giữ tỉ lệ, xoay theo EXIF) và ghi atomic ra target"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        # JPEG: giải mã thẳng ở kích thước nhỏ hơn (nhanh hơn nhiều với ảnh điện thoại)
+        img.draft('RGB', (max_side * 2, max_side * 2))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        tmp = target.with_name(target.name + f'.{threading.get_ident()}.tmp')
+        pil_format = FORMATS[fmt][0]
+        if pil_format == 'JPEG':
+            img.save(tmp, pil_format, quality=QUALITY, optimize=True, progressive=True)
+        else:
+            img.save(tmp, pil_format, quality=QUALITY, method=4)
+    os.replace(tmp, target)
+
+
+class ThumbnailCache:
+    """
+    Cache thumbnail trên đĩa.
+
+    Args:
+        source_dir: thư mục ảnh gốc (uploads/)
+        cache_dir: thư mục chứa thumbnail
+        max_bytes: dung lượng tối đa, vượt quá thì sweeper xóa file ít dùng nhất (theo mtime)
+        max_hashes: số hash nội dung ảnh gốc nhớ trong bộ nhớ (LRU)
+    """
+
+    def __init__(self, source_dir, cache_dir, max_bytes: int = 256 * 1024 * 1024, max_hashes: int = 4096):
+        self.source_dir = Path(source_dir)
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._hashes = LRUCache(max_entries=max_hashes)  # (tên, inode, mtime, size) -> hash nội dung
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def content_hash(self, source: Path) -> str:
+        """Hash nội dung ảnh gốc (nhớ theo tên + inode + mtime + size để không đọc lại file)"""
+        st = source.stat()
+        key = (source.name, st.st_ino, st.st_mtime_ns, st.st_size)
+        digest = self._hashes.get(key)
+        if digest is None:
+            digest = _hash_file(source)
+            self._hashes.set(key, digest)
+        return digest
+
+    def version(self, filename: str) -> Optional[str]:
+        """Giá trị ?v= cho URL thumbnail (theo nội dung ảnh gốc), None nếu ảnh gốc không tồn tại"""
+        source = self.source_dir / Path(filename).name
+        try:
+            return self.content_hash(source)[:VERSION_LENGTH]
+        except OSError:
+            return None
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, filename: str, size: str, fmt: str) -> Optional[Tuple[Path, str]]:
+        """
+        Đường dẫn thumbnail (tạo nếu chưa có) và ETag, None nếu ảnh gốc không tồn tại.
+        Raise ValueError nếu size/fmt không hợp lệ.
+        """
+        if size not in SIZES or fmt not in FORMATS:
+            raise ValueError(f"Invalid thumbnail size/format: {size}/{fmt}")
+        source = self.source_dir / Path(filename).name
+        if not source.is_file():
+            return None
+        digest = self.content_hash(source)
+        name = f"{digest}_{size}.{fmt}"
+        target = self.cache_dir / digest[:2] / name
+        if target.exists():
+            try:
+                os.utime(target)  # Đánh dấu vừa dùng (cho sweeper)
+            except OSError:
+                pass
+        else:
+            with self._lock_for(name):
+                if not target.exists():
+                    target.parent.mkdir(exist_ok=True)
+                    render_thumbnail(source, target, SIZES[size], fmt)
+            with self._locks_guard:
+                self._locks.pop(name, None)
+        return target, name
+
+    # ------------------------------------------------------------------ #
+    # Sweeper
+    # ------------------------------------------------------------------ #
+    def sweep(self) -> int:
+        """Xóa thumbnail cũ nhất tới khi còn ~80% dung lượng cho phép, trả về số file đã xóa"""
+        files = []
+        for f in self.cache_dir.glob('*/*'):
+            if f.name.endswith('.tmp'):
+                continue  # Đang được ghi
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+        files.sort()
+        target = int(self.max_bytes * 0.8)
+        removed = 0
+        for _, size, f in files:
+            if total <= target:
+                break
+            try:
+                f.unlink()
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def start_sweeper(self, interval: float = 300, lock_path=None):
+        """
+        Chạy sweep() định kỳ trên thread nền.
+        lock_path (nhiều process dùng chung thư mục cache, chỉ POSIX): chỉ process giữ được khóa file này mới dọn.
+        """
+        if self._sweeper is not None:
+            return
+
+        def loop():
+            leader = None if lock_path is not None else True
+            try:
+                while not self._stop.wait(interval):
+                    if leader is None:
+                        leader = try_file_lock(lock_path)
+                        if leader is None:
+                            continue
+                    try:
+                        removed = self.sweep()
+                        if removed:
+                            print(f"🧹 Removed {removed} cached thumbnails")
+                    except Exception as e:
+                        print(f"⚠️  Thumbnail sweep failed: {e}")
+            finally:
+                if leader not in (None, True):
+                    leader.close()  # Đóng file -> nhả khóa cho process khác
+
+        self._sweeper = threading.Thread(target=loop, name='thumbnail-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop(self):
+        self._stop.set()
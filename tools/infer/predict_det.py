@@ -79,6 +79,8 @@ class TextDetector(object):
             postprocess_params["use_dilation"] = args.use_dilation
             postprocess_params["score_mode"] = args.det_db_score_mode
             postprocess_params["box_type"] = args.det_box_type
+            postprocess_params["fast_boxes"] = args.det_db_fast_boxes
+            postprocess_params["score_workers"] = args.det_db_score_workers
         elif self.det_algorithm == "DB++":
             postprocess_params["name"] = "DBPostProcess"
             postprocess_params["thresh"] = args.det_db_thresh
@@ -88,6 +90,8 @@ class TextDetector(object):
             postprocess_params["use_dilation"] = args.use_dilation
             postprocess_params["score_mode"] = args.det_db_score_mode
             postprocess_params["box_type"] = args.det_box_type
+            postprocess_params["fast_boxes"] = args.det_db_fast_boxes
+            postprocess_params["score_workers"] = args.det_db_score_workers
             pre_process_list[1] = {
                 "NormalizeImage": {
                     "std": [1.0, 1.0, 1.0],
@@ -257,6 +261,19 @@ class TextDetector(object):
 
         if self.args.benchmark:
             self.autolog.times.stamp()
+        outputs = self._run(img)
+        preds = self._outputs_to_preds(outputs)
+
+        post_result = self.postprocess_op(preds, shape_list)
+        dt_boxes = post_result[0]["points"]
+        dt_boxes = self._filter_boxes(dt_boxes, ori_im.shape)
+
+        if self.args.benchmark:
+            self.autolog.times.end(stamp=True)
+        et = time.time()
+        return dt_boxes, et - st
+
+    def _run(self, img):
         if self.use_onnx:
             input_dict = {}
             input_dict[self.input_tensor.name] = img
@@ -270,7 +287,9 @@ class TextDetector(object):
                 outputs.append(output)
             if self.args.benchmark:
                 self.autolog.times.stamp()
+        return outputs
 
+    def _outputs_to_preds(self, outputs):
         preds = {}
         if self.det_algorithm == "EAST":
             preds["f_geo"] = outputs[0]
@@ -290,19 +309,82 @@ class TextDetector(object):
             preds["score"] = outputs[1]
         else:
             raise NotImplementedError
+        return preds
 
-        post_result = self.postprocess_op(preds, shape_list)
-        dt_boxes = post_result[0]["points"]
-
+    def _filter_boxes(self, dt_boxes, image_shape):
         if self.args.det_box_type == "poly":
-            dt_boxes = self.filter_tag_det_res_only_clip(dt_boxes, ori_im.shape)
-        else:
-            dt_boxes = self.filter_tag_det_res(dt_boxes, ori_im.shape)
+            return self.filter_tag_det_res_only_clip(dt_boxes, image_shape)
+        return self.filter_tag_det_res(dt_boxes, image_shape)
+
+    def predict_batch(self, img_list, batch_size=None, bucket_size=None):
+        """
+        Detect text in several images with one forward pass per shape bucket.
+        Each image is resized as in predict(); images whose resized shape rounds
+        up to the same multiple of `bucket_size` share a bucket, and up to
+        `batch_size` of them are zero-padded to their largest shape and stacked. The probability maps are
+        cropped back to each image's own size before postprocessing, so boxes
+        are computed per image exactly as in predict(). Images of the same size
+        give the same boxes as predict(); padded ones may differ slightly at the
+        padded border.
+        Only DB/DB++ with the paddle predictor are batched; other algorithms and
+        ONNX models fall back to predict() per image.
+        args:
+            img_list(list): BGR images
+            batch_size(int): max images per forward pass, defaults to det_batch_num
+            bucket_size(int): padding granularity in pixels, defaults to det_batch_bucket
+        return:
+            (list of dt_boxes per image (None if preprocessing failed), elapse)
+        """
+        st = time.time()
+        batch_size = max(1, batch_size or self.args.det_batch_num)
+        bucket_size = max(32, bucket_size or self.args.det_batch_bucket)
+        if self.det_algorithm not in ["DB", "DB++"] or self.use_onnx:
+            return [self.predict(img)[0] for img in img_list], time.time() - st
+
+        if self.args.benchmark:
+            self.autolog.times.start()
+        results = [None] * len(img_list)
+        buckets = {}
+        for i, img in enumerate(img_list):
+            norm_img, shape = transform({"image": img}, self.preprocess_op)
+            if norm_img is None:
+                continue
+            h, w = norm_img.shape[1:]
+            key = (
+                -(-h // bucket_size) * bucket_size,
+                -(-w // bucket_size) * bucket_size,
+            )
+            buckets.setdefault(key, []).append((i, norm_img, shape))
+        if self.args.benchmark:
+            self.autolog.times.stamp()
 
+        for items in buckets.values():
+            # Unpadded when every image in the chunk has the same resized shape
+            for beg in range(0, len(items), batch_size):
+                chunk = items[beg : beg + batch_size]
+                pad_h = max(norm_img.shape[1] for _, norm_img, _ in chunk)
+                pad_w = max(norm_img.shape[2] for _, norm_img, _ in chunk)
+                batch = np.zeros(
+                    (len(chunk), chunk[0][1].shape[0], pad_h, pad_w), dtype=np.float32
+                )
+                for k, (_, norm_img, _) in enumerate(chunk):
+                    batch[k, :, : norm_img.shape[1], : norm_img.shape[2]] = norm_img
+                preds = self._outputs_to_preds(self._run(batch))
+                for k, (i, norm_img, shape) in enumerate(chunk):
+                    h, w = norm_img.shape[1:]
+                    item_preds = {
+                        name: pred[k : k + 1, ..., :h, :w]
+                        for name, pred in preds.items()
+                    }
+                    post_result = self.postprocess_op(
+                        item_preds, np.expand_dims(shape, axis=0)
+                    )
+                    results[i] = self._filter_boxes(
+                        post_result[0]["points"], img_list[i].shape
+                    )
         if self.args.benchmark:
             self.autolog.times.end(stamp=True)
-        et = time.time()
-        return dt_boxes, et - st
+        return results, time.time() - st
 
     def __call__(self, img, use_slice=False):
         # For image like poster with one side much greater than the other side,
@@ -432,6 +514,41 @@ if __name__ == "__main__":
             res = text_detector(img)
 
     save_results = []
+    if args.det_batch_num > 1:
+        # Bulk mode: detect every image with batched forward passes, report per image
+        batch_names, batch_imgs = [], []
+        for image_file in image_file_list:
+            img, flag_gif, flag_pdf = check_and_read(image_file)
+            if not flag_gif and not flag_pdf:
+                img = cv2.imread(image_file)
+            if img is None:
+                logger.debug("error in loading image:{}".format(image_file))
+                continue
+            if not flag_pdf:
+                batch_names.append(os.path.basename(image_file))
+                batch_imgs.append(img)
+                continue
+            page_num = args.page_num
+            if page_num > len(img) or page_num == 0:
+                page_num = len(img)
+            for index, page in enumerate(img[:page_num]):
+                batch_names.append(os.path.basename(image_file) + "_" + str(index))
+                batch_imgs.append(page)
+        batch_boxes, total_time = text_detector.predict_batch(batch_imgs)
+        for name, dt_boxes in zip(batch_names, batch_boxes):
+            if dt_boxes is None:
+                continue
+            save_results.append(
+                name
+                + "\t"
+                + str(json.dumps([x.tolist() for x in dt_boxes]))
+                + "\n"
+            )
+        logger.info(
+            "The predict time of {} images: {}".format(len(batch_imgs), total_time)
+        )
+        image_file_list = []
+
     for idx, image_file in enumerate(image_file_list):
         img, flag_gif, flag_pdf = check_and_read(image_file)
         if not flag_gif and not flag_pdf:
@@ -25,6 +25,7 @@ import cv2
 import numpy as np
 import math
 import time
+import threading
 import traceback
 import paddle
 
@@ -74,6 +75,10 @@ class TextRecognizer(object):
             "name": "CTCLabelDecode",
             "character_dict_path": args.rec_char_dict_path,
             "use_space_char": args.use_space_char,
+            "beam_width": args.rec_beam_width,
+            "lexicon_path": args.rec_lexicon_path,
+            "lm_alpha": args.rec_lm_alpha,
+            "lm_beta": args.rec_lm_beta,
         }
         if self.rec_algorithm == "SRN":
             postprocess_params = {
@@ -858,6 +863,145 @@ class TextRecognizer(object):
         return rec_res, time.time() - st
 
 
+class _RecRequest(object):
+    def __init__(self, num):
+        self.rec_res = [["", 0.0]] * num
+        self.remaining = num
+        self.error = None
+        self.start = time.time()
+        self.done = threading.Event()
+
+
+class RecognitionBatcher(object):
+    """
+    Dynamic batching for TextRecognizer across images and callers.
+
+    Crops submitted by concurrent callers (threads running TextSystem, server
+    requests...) are grouped into buckets by their width after resizing to the
+    model height, so a batch holds crops of similar width and resize_norm_img
+    pads little. A bucket is flushed when it holds `batch_size` crops, or when
+    its oldest crop has waited `max_wait` seconds. Results are routed back to
+    each caller in its original order.
+
+    The recognizer is only used from the batcher thread, so a single predictor
+    serves every caller. Calling the batcher has the same signature as calling
+    TextRecognizer: batcher(img_list) -> (rec_res, elapse).
+    args:
+        text_recognizer(TextRecognizer): recognizer running the batches
+        batch_size(int): crops per batch, defaults to rec_batch_num
+        max_wait(float): seconds a crop may wait for its batch to fill up
+        bucket_width(int): width (px, after resizing to the model height) of a bucket
+    """
+
+    def __init__(self, text_recognizer, batch_size=None, max_wait=0.01, bucket_width=80):
+        self.text_recognizer = text_recognizer
+        self.batch_size = max(1, batch_size or text_recognizer.rec_batch_num)
+        self.max_wait = max_wait
+        self.bucket_width = max(1, bucket_width)
+        imgC, imgH, imgW = text_recognizer.rec_image_shape[:3]
+        self.img_h = imgH
+        # Narrower crops are padded to the model width anyway: one bucket for all of them
+        self.min_bucket = int(math.ceil(imgW / self.bucket_width))
+        self.stats = {"batches": 0, "crops": 0}
+        self._buckets = {}  # bucket -> [(enqueue time, request, index, img), ...]
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="rec-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def __getattr__(self, name):
+        # rec_batch_num, autolog... of the wrapped recognizer
+        return getattr(self.text_recognizer, name)
+
+    def _bucket(self, img):
+        h, w = img.shape[0:2]
+        width = self.img_h * w / float(max(h, 1))
+        return max(self.min_bucket, int(math.ceil(width / self.bucket_width)))
+
+    def __call__(self, img_list):
+        request = self.submit(img_list)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.rec_res, time.time() - request.start
+
+    def submit(self, img_list):
+        """Queue the crops of one caller, return a request whose `done` event is set when all are recognized"""
+        request = _RecRequest(len(img_list))
+        if not img_list:
+            request.done.set()
+            return request
+        now = time.time()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("RecognitionBatcher is closed")
+            for index, img in enumerate(img_list):
+                self._buckets.setdefault(self._bucket(img), []).append(
+                    (now, request, index, img)
+                )
+            self._cond.notify()
+        return request
+
+    def _next_batch(self):
+        """Wait for a full bucket or an expired deadline; return the crops to run (None when closed and empty)"""
+        with self._cond:
+            while True:
+                now = time.time()
+                expired, deadline = None, None
+                for key, items in self._buckets.items():
+                    if len(items) >= self.batch_size:
+                        expired = key
+                        break
+                    first = items[0][0] + self.max_wait
+                    if first <= now or self._closed:
+                        if expired is None or items[0][0] < self._buckets[expired][0][0]:
+                            expired = key
+                    elif deadline is None or first < deadline:
+                        deadline = first
+                if expired is not None:
+                    items = self._buckets[expired]
+                    batch = items[: self.batch_size]
+                    if len(items) > self.batch_size:
+                        self._buckets[expired] = items[self.batch_size :]
+                    else:
+                        del self._buckets[expired]
+                    return batch
+                if self._closed:
+                    return None
+                self._cond.wait(None if deadline is None else deadline - now)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                rec_res, _ = self.text_recognizer([item[3] for item in batch])
+                error = None
+            except Exception as e:
+                logger.error("recognition batch failed: {}".format(e))
+                rec_res, error = [["", 0.0]] * len(batch), e
+            self.stats["batches"] += 1
+            self.stats["crops"] += len(batch)
+            for (_, request, index, _), res in zip(batch, rec_res):
+                if error is not None:
+                    request.error = error
+                else:
+                    request.rec_res[index] = res
+                request.remaining -= 1
+                if request.remaining == 0:
+                    request.done.set()
+
+    def close(self):
+        """Stop accepting crops, run what is queued, then stop the batcher thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
 def main(args):
     image_file_list = get_image_file_list(args.image_dir)
     valid_image_file_list = []
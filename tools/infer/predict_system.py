@@ -26,7 +26,9 @@ import copy
 import numpy as np
 import json
 import time
+import queue
 import logging
+import threading
 from PIL import Image
 import tools.infer.utility as utility
 import tools.infer.predict_rec as predict_rec
@@ -81,6 +83,27 @@ class TextSystem(object):
             return None, None, time_dict
 
         start = time.time()
+        dt_boxes, img_crop_list, time_dict["det"] = self.detect(img, slice)
+        if dt_boxes is None:
+            time_dict["all"] = time.time() - start
+            return None, None, time_dict
+        if self.use_angle_cls and cls:
+            img_crop_list, time_dict["cls"] = self.classify(img_crop_list)
+        filter_boxes, filter_rec_res, rec_res, time_dict["rec"] = self.recognize(
+            dt_boxes, img_crop_list
+        )
+        if self.args.save_crop_res:
+            self.draw_crop_rec_res(self.args.crop_res_save_dir, img_crop_list, rec_res)
+        end = time.time()
+        time_dict["all"] = end - start
+        return filter_boxes, filter_rec_res, time_dict
+
+    def detect(self, img, slice={}):
+        """
+        Detection stage: detect and sort text boxes, then crop them from the image.
+        return:
+            (dt_boxes, img_crop_list, elapse); dt_boxes is None when nothing is found
+        """
         ori_im = img.copy()
         if slice:
             slice_gen = slice_generator(
@@ -108,13 +131,9 @@ class TextSystem(object):
         else:
             dt_boxes, elapse = self.text_detector(img)
 
-        time_dict["det"] = elapse
-
         if dt_boxes is None:
             logger.debug("no dt_boxes found, elapsed : {}".format(elapse))
-            end = time.time()
-            time_dict["all"] = end - start
-            return None, None, time_dict
+            return None, [], elapse
         else:
             logger.debug(
                 "dt_boxes num : {}, elapsed : {}".format(len(dt_boxes), elapse)
@@ -130,31 +149,255 @@ class TextSystem(object):
             else:
                 img_crop = get_minarea_rect_crop(ori_im, tmp_box)
             img_crop_list.append(img_crop)
-        if self.use_angle_cls and cls:
-            img_crop_list, angle_list, elapse = self.text_classifier(img_crop_list)
-            time_dict["cls"] = elapse
-            logger.debug(
-                "cls num  : {}, elapsed : {}".format(len(img_crop_list), elapse)
-            )
+        return dt_boxes, img_crop_list, elapse
+
+    def classify(self, img_crop_list):
+        """Angle classification stage: return (rotated img_crop_list, elapse)"""
+        img_crop_list, angle_list, elapse = self.text_classifier(img_crop_list)
+        logger.debug("cls num  : {}, elapsed : {}".format(len(img_crop_list), elapse))
+        return img_crop_list, elapse
+
+    def recognize(self, dt_boxes, img_crop_list):
+        """
+        Recognition stage: recognize the crops and drop results below drop_score.
+        return:
+            (filter_boxes, filter_rec_res, rec_res, elapse)
+        """
         if len(img_crop_list) > 1000:
             logger.debug(
                 f"rec crops num: {len(img_crop_list)}, time and memory cost may be large."
             )
 
         rec_res, elapse = self.text_recognizer(img_crop_list)
-        time_dict["rec"] = elapse
         logger.debug("rec_res num  : {}, elapsed : {}".format(len(rec_res), elapse))
-        if self.args.save_crop_res:
-            self.draw_crop_rec_res(self.args.crop_res_save_dir, img_crop_list, rec_res)
         filter_boxes, filter_rec_res = [], []
         for box, rec_result in zip(dt_boxes, rec_res):
             text, score = rec_result[0], rec_result[1]
             if score >= self.drop_score:
                 filter_boxes.append(box)
                 filter_rec_res.append(rec_result)
-        end = time.time()
-        time_dict["all"] = end - start
-        return filter_boxes, filter_rec_res, time_dict
+        return filter_boxes, filter_rec_res, rec_res, elapse
+
+
+class _PipelineStop(Exception):
+    pass
+
+
+class PipelinedTextSystem(object):
+    """
+    Run the TextSystem stages on different images at the same time:
+    reading the input (the `items` iterable) -> det (+crop) -> cls -> rec.
+    Stages are connected by bounded queues, so while rec works on image i,
+    det already works on image i+1 and the next image is being read.
+    Results are yielded in input order and are identical to TextSystem.__call__.
+
+    Each extra worker of a stage gets its own predictor (paddle/onnx predictors
+    are not thread-safe), so a stage with N workers holds N copies of its model.
+    With rec_batch_wait > 0 the rec workers share one predictor through a
+    RecognitionBatcher, which merges the crops of the images they work on
+    into width-bucketed batches (fewer, fuller batches for pages with few lines).
+    Each rec worker blocks until the batch holding its image returns, so the
+    batcher only sees as many images at once as there are rec workers: with
+    batching on, rec_workers is raised to at least max(2, queue_size)
+    (the workers hold no model of their own, so this is cheap).
+    args:
+        text_system(TextSystem): the system whose predictors are used by the first worker of each stage
+        det_workers/cls_workers/rec_workers(int): worker threads per stage
+        queue_size(int): max images waiting in front of each stage
+        rec_batch_wait(float): seconds a crop may wait for a cross-image batch, 0 disables batching
+    """
+
+    def __init__(
+        self,
+        text_system,
+        det_workers=1,
+        cls_workers=1,
+        rec_workers=1,
+        queue_size=4,
+        rec_batch_wait=0,
+    ):
+        self.text_system = text_system
+        self.queue_size = max(1, queue_size)
+        args = text_system.args
+        self.det_systems = self._replicas(
+            det_workers, "text_detector", lambda: predict_det.TextDetector(args)
+        )
+        self.cls_systems = (
+            self._replicas(
+                cls_workers, "text_classifier", lambda: predict_cls.TextClassifier(args)
+            )
+            if text_system.use_angle_cls
+            else []
+        )
+        self.rec_batcher = None
+        if rec_batch_wait > 0:
+            self.rec_batcher = predict_rec.RecognitionBatcher(
+                text_system.text_recognizer, max_wait=rec_batch_wait
+            )
+            self.rec_systems = []
+            for _ in range(max(2, self.queue_size, rec_workers)):
+                replica = copy.copy(text_system)
+                replica.text_recognizer = self.rec_batcher
+                self.rec_systems.append(replica)
+        else:
+            self.rec_systems = self._replicas(
+                rec_workers, "text_recognizer", lambda: predict_rec.TextRecognizer(args)
+            )
+        self._draw_lock = threading.Lock()
+
+    def _replicas(self, workers, attr, build):
+        systems = [self.text_system]
+        for _ in range(max(1, workers) - 1):
+            replica = copy.copy(self.text_system)
+            setattr(replica, attr, build())
+            systems.append(replica)
+        return systems
+
+    def close(self):
+        if self.rec_batcher is not None:
+            self.rec_batcher.close()
+
+    def __call__(self, items, cls=True, slice={}):
+        """
+        args:
+            items(iterable): (tag, img) pairs; the iterable is consumed on a
+                background thread, so decoding inside a generator overlaps with OCR
+        return:
+            generator of (tag, dt_boxes, rec_res, time_dict) in input order
+        """
+        stop = threading.Event()
+        errors = []
+
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            raise _PipelineStop()
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            raise _PipelineStop()
+
+        def run(target, *target_args):
+            try:
+                target(*target_args)
+            except _PipelineStop:
+                pass
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+        def feed(q_out, workers):
+            for seq, (tag, img) in enumerate(items):
+                put(q_out, (seq, tag, img, {"det": 0, "rec": 0, "cls": 0, "all": 0}))
+            for _ in range(workers):
+                put(q_out, None)
+
+        def stage(process, system, q_in, q_out, finished, next_workers):
+            while True:
+                job = get(q_in)
+                if job is None:
+                    break
+                put(q_out, process(system, job))
+            with finished["lock"]:
+                finished["count"] -= 1
+                last = finished["count"] == 0
+            if last:  # the last worker of a stage closes the next one
+                for _ in range(next_workers):
+                    put(q_out, None)
+
+        def det(system, job):
+            seq, tag, img, time_dict = job
+            time_dict["start"] = time.time()
+            if img is None:
+                logger.debug("no valid image provided")
+                return seq, tag, None, None, time_dict
+            dt_boxes, img_crop_list, time_dict["det"] = system.detect(img, slice)
+            return seq, tag, dt_boxes, img_crop_list, time_dict
+
+        def cls_(system, job):
+            seq, tag, dt_boxes, img_crop_list, time_dict = job
+            if dt_boxes is not None:
+                img_crop_list, time_dict["cls"] = system.classify(img_crop_list)
+            return seq, tag, dt_boxes, img_crop_list, time_dict
+
+        def rec(system, job):
+            seq, tag, dt_boxes, img_crop_list, time_dict = job
+            start = time_dict.pop("start")
+            if dt_boxes is None:
+                time_dict["all"] = time.time() - start
+                return seq, tag, None, None, time_dict
+            filter_boxes, filter_rec_res, rec_res, time_dict["rec"] = system.recognize(
+                dt_boxes, img_crop_list
+            )
+            if system.args.save_crop_res:
+                with self._draw_lock:
+                    self.text_system.draw_crop_rec_res(
+                        system.args.crop_res_save_dir, img_crop_list, rec_res
+                    )
+            time_dict["all"] = time.time() - start
+            return seq, tag, filter_boxes, filter_rec_res, time_dict
+
+        stages = [(det, self.det_systems)]
+        if self.cls_systems and cls:
+            stages.append((cls_, self.cls_systems))
+        stages.append((rec, self.rec_systems))
+
+        queues = [queue.Queue(self.queue_size) for _ in range(len(stages) + 1)]
+        threads = [
+            threading.Thread(
+                target=run, args=(feed, queues[0], len(stages[0][1])), daemon=True
+            )
+        ]
+        for k, (process, systems) in enumerate(stages):
+            next_workers = len(stages[k + 1][1]) if k + 1 < len(stages) else 1
+            finished = {"lock": threading.Lock(), "count": len(systems)}
+            for system in systems:
+                threads.append(
+                    threading.Thread(
+                        target=run,
+                        args=(
+                            stage,
+                            process,
+                            system,
+                            queues[k],
+                            queues[k + 1],
+                            finished,
+                            next_workers,
+                        ),
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+
+        # Stages with several workers may finish images out of order: reorder by seq
+        pending, next_seq = {}, 0
+        try:
+            while True:
+                try:
+                    result = get(queues[-1])
+                except _PipelineStop:
+                    break
+                if result is None:
+                    break
+                pending[result[0]] = result[1:]
+                while next_seq in pending:
+                    yield pending.pop(next_seq)
+                    next_seq += 1
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
 
 
 def sorted_boxes(dt_boxes):
@@ -208,94 +451,116 @@ def main(args):
     cpu_mem, gpu_mem, gpu_util = 0, 0, 0
     _st = time.time()
     count = 0
-    for idx, image_file in enumerate(image_file_list):
-        img, flag_gif, flag_pdf = check_and_read(image_file)
-        if not flag_gif and not flag_pdf:
-            img = cv2.imread(image_file)
-        if not flag_pdf:
-            if img is None:
-                logger.debug("error in loading image:{}".format(image_file))
-                continue
-            imgs = [img]
-        else:
-            page_num = args.page_num
-            if page_num > len(img) or page_num == 0:
-                page_num = len(img)
-            imgs = img[:page_num]
-        for index, img in enumerate(imgs):
-            starttime = time.time()
-            dt_boxes, rec_res, time_dict = text_sys(img)
-            elapse = time.time() - starttime
-            total_time += elapse
-            if len(imgs) > 1:
-                logger.debug(
-                    str(idx)
-                    + "_"
-                    + str(index)
-                    + "  Predict time of %s: %.3fs" % (image_file, elapse)
-                )
+
+    def read_images():
+        for idx, image_file in enumerate(image_file_list):
+            img, flag_gif, flag_pdf = check_and_read(image_file)
+            if not flag_gif and not flag_pdf:
+                img = cv2.imread(image_file)
+            if not flag_pdf:
+                if img is None:
+                    logger.debug("error in loading image:{}".format(image_file))
+                    continue
+                imgs = [img]
             else:
-                logger.debug(
-                    str(idx) + "  Predict time of %s: %.3fs" % (image_file, elapse)
-                )
-            for text, score in rec_res:
-                logger.debug("{}, {:.3f}".format(text, score))
-
-            res = [
-                {
-                    "transcription": rec_res[i][0],
-                    "points": np.array(dt_boxes[i]).astype(np.int32).tolist(),
-                }
-                for i in range(len(dt_boxes))
-            ]
-            if len(imgs) > 1:
-                save_pred = (
-                    os.path.basename(image_file)
-                    + "_"
-                    + str(index)
-                    + "\t"
-                    + json.dumps(res, ensure_ascii=False)
-                    + "\n"
-                )
+                page_num = args.page_num
+                if page_num > len(img) or page_num == 0:
+                    page_num = len(img)
+                imgs = img[:page_num]
+            for index, img in enumerate(imgs):
+                yield (idx, image_file, index, len(imgs), flag_gif, flag_pdf, img), img
+
+    if args.use_pipeline:
+        # det/cls/rec of consecutive images overlap; results still come in input order
+        pipeline = PipelinedTextSystem(
+            text_sys,
+            det_workers=args.pipeline_det_workers,
+            cls_workers=args.pipeline_cls_workers,
+            rec_workers=args.pipeline_rec_workers,
+            queue_size=args.pipeline_queue_size,
+            rec_batch_wait=args.pipeline_rec_batch_wait_ms / 1000.0,
+        )
+        results = pipeline(read_images())
+    else:
+        results = (
+            (tag,) + tuple(text_sys(img)) for tag, img in read_images()
+        )
+
+    for tag, dt_boxes, rec_res, time_dict in results:
+        idx, image_file, index, num_pages, flag_gif, flag_pdf, img = tag
+        elapse = time_dict["all"]
+        total_time += elapse
+        if num_pages > 1:
+            logger.debug(
+                str(idx)
+                + "_"
+                + str(index)
+                + "  Predict time of %s: %.3fs" % (image_file, elapse)
+            )
+        else:
+            logger.debug(
+                str(idx) + "  Predict time of %s: %.3fs" % (image_file, elapse)
+            )
+        for text, score in rec_res:
+            logger.debug("{}, {:.3f}".format(text, score))
+
+        res = [
+            {
+                "transcription": rec_res[i][0],
+                "points": np.array(dt_boxes[i]).astype(np.int32).tolist(),
+            }
+            for i in range(len(dt_boxes))
+        ]
+        if num_pages > 1:
+            save_pred = (
+                os.path.basename(image_file)
+                + "_"
+                + str(index)
+                + "\t"
+                + json.dumps(res, ensure_ascii=False)
+                + "\n"
+            )
+        else:
+            save_pred = (
+                os.path.basename(image_file)
+                + "\t"
+                + json.dumps(res, ensure_ascii=False)
+                + "\n"
+            )
+        save_results.append(save_pred)
+
+        if is_visualize:
+            image = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+            boxes = dt_boxes
+            txts = [rec_res[i][0] for i in range(len(rec_res))]
+            scores = [rec_res[i][1] for i in range(len(rec_res))]
+
+            draw_img = draw_ocr_box_txt(
+                image,
+                boxes,
+                txts,
+                scores,
+                drop_score=drop_score,
+                font_path=font_path,
+            )
+            if flag_gif:
+                save_file = image_file[:-3] + "png"
+            elif flag_pdf:
+                save_file = image_file.replace(".pdf", "_" + str(index) + ".png")
             else:
-                save_pred = (
-                    os.path.basename(image_file)
-                    + "\t"
-                    + json.dumps(res, ensure_ascii=False)
-                    + "\n"
-                )
-            save_results.append(save_pred)
-
-            if is_visualize:
-                image = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-                boxes = dt_boxes
-                txts = [rec_res[i][0] for i in range(len(rec_res))]
-                scores = [rec_res[i][1] for i in range(len(rec_res))]
-
-                draw_img = draw_ocr_box_txt(
-                    image,
-                    boxes,
-                    txts,
-                    scores,
-                    drop_score=drop_score,
-                    font_path=font_path,
-                )
-                if flag_gif:
-                    save_file = image_file[:-3] + "png"
-                elif flag_pdf:
-                    save_file = image_file.replace(".pdf", "_" + str(index) + ".png")
-                else:
-                    save_file = image_file
-                cv2.imwrite(
-                    os.path.join(draw_img_save_dir, os.path.basename(save_file)),
-                    draw_img[:, :, ::-1],
-                )
-                logger.debug(
-                    "The visualized image saved in {}".format(
-                        os.path.join(draw_img_save_dir, os.path.basename(save_file))
-                    )
+                save_file = image_file
+            cv2.imwrite(
+                os.path.join(draw_img_save_dir, os.path.basename(save_file)),
+                draw_img[:, :, ::-1],
+            )
+            logger.debug(
+                "The visualized image saved in {}".format(
+                    os.path.join(draw_img_save_dir, os.path.basename(save_file))
                 )
+            )
 
+    if args.use_pipeline:
+        pipeline.close()
     logger.info("The predict total time is {}".format(time.time() - _st))
     if args.benchmark:
         text_sys.text_detector.autolog.report()
@@ -69,8 +69,14 @@ def init_args():
     parser.add_argument("--det_db_box_thresh", type=float, default=0.6)
     parser.add_argument("--det_db_unclip_ratio", type=float, default=1.5)
     parser.add_argument("--max_batch_size", type=int, default=10)
+    # TextDetector.predict_batch: images per forward pass and padding granularity (px)
+    parser.add_argument("--det_batch_num", type=int, default=1)
+    parser.add_argument("--det_batch_bucket", type=int, default=128)
     parser.add_argument("--use_dilation", type=str2bool, default=False)
     parser.add_argument("--det_db_score_mode", type=str, default="fast")
+    # vectorized DBPostProcess.boxes_from_bitmap_fast (quad boxes, fast score mode)
+    parser.add_argument("--det_db_fast_boxes", type=str2bool, default=False)
+    parser.add_argument("--det_db_score_workers", type=int, default=0)
 
     # EAST params
     parser.add_argument("--det_east_score_thresh", type=float, default=0.8)
@@ -104,6 +110,11 @@ def init_args():
         "--rec_char_dict_path", type=str, default="./ppocr/utils/ppocr_keys_v1.txt"
     )
     parser.add_argument("--use_space_char", type=str2bool, default=True)
+    # CTC prefix beam search (0 = greedy) with an optional word list scorer
+    parser.add_argument("--rec_beam_width", type=int, default=0)
+    parser.add_argument("--rec_lexicon_path", type=str, default=None)
+    parser.add_argument("--rec_lm_alpha", type=float, default=1.0)
+    parser.add_argument("--rec_lm_beta", type=float, default=0.0)
     parser.add_argument("--vis_font_path", type=str, default="./doc/fonts/simfang.ttf")
     parser.add_argument("--drop_score", type=float, default=0.5)
 
@@ -149,6 +160,16 @@ def init_args():
     parser.add_argument("--total_process_num", type=int, default=1)
     parser.add_argument("--process_id", type=int, default=0)
 
+    # pipelined det -> cls -> rec across images (see PipelinedTextSystem)
+    parser.add_argument("--use_pipeline", type=str2bool, default=False)
+    parser.add_argument("--pipeline_det_workers", type=int, default=1)
+    parser.add_argument("--pipeline_cls_workers", type=int, default=1)
+    parser.add_argument("--pipeline_rec_workers", type=int, default=1)
+    parser.add_argument("--pipeline_queue_size", type=int, default=4)
+    # > 0: rec workers share one recognizer that batches crops across images;
+    # rec workers are then raised to max(2, pipeline_queue_size) so batches can fill
+    parser.add_argument("--pipeline_rec_batch_wait_ms", type=float, default=0)
+
     parser.add_argument("--benchmark", type=str2bool, default=False)
     parser.add_argument("--save_log_path", type=str, default="./log_output/")
 
@@ -0,0 +1,333 @@
+"""
+Translation Service - Dịch nhiều dòng theo lô, có cache và giới hạn tốc độ
+- Loại bỏ dòng trùng, gộp các dòng chưa có trong cache thành vài request lớn
+- Cache (câu nguồn, cặp ngôn ngữ) -> bản dịch: LRU trong bộ nhớ + SQLite trên đĩa
+- Token bucket dùng chung giữa các request thay cho sleep cố định
+- Backend có thể thay thế (Google / stub cho test)
+"""
+
+import os
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+import metrics
+from kv_cache import LRUCache, SQLiteCache
+
+# Dấu phân cách giữa các dòng khi gộp request; Google Translate giữ nguyên xuống dòng
+LINE_DELIMITER = '\n'
+# Google Translate giới hạn 5000 ký tự mỗi request
+MAX_BATCH_CHARS = 4500
+MAX_BATCH_LINES = 100
+
+
+class TranslationError(Exception):
+    """Lỗi dịch chung"""
+
+
+class TranslationUnavailableError(TranslationError):
+    """Không khởi tạo được backend dịch"""
+
+
+class RateLimitedError(TranslationError):
+    """Backend trả về 429 / bị chặn"""
+
+
+class TokenBucket:
+    """Token bucket: cho phép `rate` request/giây, dồn tối đa `capacity` request"""
+
+    def __init__(self, rate: float = 2.0, capacity: float = 5.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Chờ tới khi đủ token; trả về False nếu quá timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Sau khi bị 429: rút cạn bucket để mọi request cùng chờ `seconds` giây"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+# ---------------------------------------------------------------------- #
+# Backends
+# ---------------------------------------------------------------------- #
+class TranslationBackend:
+    """Interface backend dịch: dịch một đoạn text (có thể nhiều dòng)"""
+
+    name = 'base'
+
+    def translate(self, text: str, source: str, target: str) -> str:
+        raise NotImplementedError
+
+    def reset(self):
+        """Tạo lại client sau lỗi token/kết nối"""
+
+
+class GoogleBackend(TranslationBackend):
+    """Google Translate qua deep-translator, fallback sang googletrans"""
+
+    name = 'google'
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _client(self, source, target):
+        key = (source, target)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(source, target)
+                self._clients[key] = client
+            return client
+
+    def _create(self, source, target):
+        # Clear SSL certificate paths để tránh lỗi
+        for var in ('SSL_CERT_FILE', 'REQUESTS_CA_BUNDLE'):
+            if 'PostgreSQL' in os.environ.get(var, ''):
+                os.environ.pop(var, None)
+        try:
+            # deep-translator ổn định hơn, không có TKK token issue
+            from deep_translator import GoogleTranslator
+            return GoogleTranslator(source=source, target=target)
+        except ImportError:
+            print("⚠️  deep-translator not available, trying googletrans...")
+        except Exception as e:
+            print(f"⚠️  deep-translator error: {e}, trying googletrans...")
+        try:
+            from googletrans import Translator
+            return Translator()
+        except Exception as e:
+            raise TranslationUnavailableError(f"googletrans also failed: {e}")
+
+    def translate(self, text, source, target):
+        client = self._client(source, target)
+        # deep-translator: translate() trả về string trực tiếp
+        # googletrans: translate() trả về object có .text
+        if client.__class__.__module__.startswith('deep_translator'):
+            result = client.translate(text)
+        else:
+            result = client.translate(text, src=source, dest=target, timeout=15)
+            result = result.text if result is not None and hasattr(result, 'text') else None
+        if not isinstance(result, str) or not result.strip():
+            raise TranslationError("Empty translation result")
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._clients.clear()
+
+
+class StubBackend(TranslationBackend):
+    """Backend offline cho test: tra bảng `mapping`, nếu không có thì thêm tiền tố [target]"""
+
+    name = 'stub'
+
+    def __init__(self, mapping: Optional[Dict[str, str]] = None):
+        self.mapping = mapping or {}
+        self.calls = 0
+
+    def translate(self, text, source, target):
+        self.calls += 1
+        return LINE_DELIMITER.join(
+            self.mapping.get(line, f"[{target}] {line}") for line in text.split(LINE_DELIMITER)
+        )
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'stub': StubBackend,
+}
+
+
+def create_backend(name: str) -> TranslationBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown translation backend: {name}")
+    return BACKENDS[name]()
+
+
+# ---------------------------------------------------------------------- #
+# Service
+# ---------------------------------------------------------------------- #
+class TranslationService:
+    """
+    Dịch danh sách dòng với cache + batching + rate limit.
+
+    Args:
+        backend: TranslationBackend
+        cache_path: file SQLite lưu cache (None = chỉ cache trong bộ nhớ)
+        max_entries: số bản dịch tối đa giữ trong cache trên đĩa
+        rate / burst: tham số token bucket (request/giây, số request dồn tối đa)
+        max_retries: số lần thử lại mỗi lô
+    """
+
+    def __init__(self, backend: TranslationBackend, cache_path=None, max_entries: int = 100000,
+                 rate: float = 2.0, burst: float = 5.0, max_retries: int = 3):
+        self.backend = backend
+        self.memory = LRUCache(max_entries=min(max_entries, 10000))
+        self.disk = SQLiteCache(cache_path, table='translations', max_entries=max_entries) if cache_path else None
+        self.limiter = TokenBucket(rate=rate, capacity=burst)
+        self.max_retries = max_retries
+        self.stats = {'hits': 0, 'misses': 0, 'backend_calls': 0, 'failures': 0}
+
+    @staticmethod
+    def _key(text: str, source: str, target: str) -> str:
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return f"{source}:{target}:{digest}"
+
+    # ------------------------------------------------------------------ #
+    def _lookup(self, texts: List[str], source: str, target: str) -> Dict[str, str]:
+        found = {}
+        missing_keys = {}
+        for text in texts:
+            key = self._key(text, source, target)
+            value = self.memory.get(key)
+            if value is not None:
+                found[text] = value
+            else:
+                missing_keys[key] = text
+        if missing_keys and self.disk is not None:
+            for key, value in self.disk.get_many(missing_keys).items():
+                self.memory.set(key, value)
+                found[missing_keys[key]] = value
+        return found
+
+    def _store(self, results: Dict[str, str], source: str, target: str):
+        items = {}
+        for text, value in results.items():
+            key = self._key(text, source, target)
+            self.memory.set(key, value)
+            items[key] = value
+        if self.disk is not None:
+            self.disk.set_many(items)
+
+    @staticmethod
+    def _batches(texts: List[str]):
+        """Chia các dòng thành lô theo số ký tự / số dòng"""
+        batch, size = [], 0
+        for text in texts:
+            if batch and (size + len(text) + 1 > MAX_BATCH_CHARS or len(batch) >= MAX_BATCH_LINES):
+                yield batch
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text) + 1
+        if batch:
+            yield batch
+
+    def _call(self, text: str, source: str, target: str) -> str:
+        """Gọi backend có rate limit + retry với backoff"""
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            self.limiter.acquire()
+            self.stats['backend_calls'] += 1
+            try:
+                with metrics.stage('translate_call'):
+                    return self.backend.translate(text, source, target)
+            except TranslationUnavailableError:
+                metrics.STAGE_ERRORS.inc(stage='translate_call', reason='unavailable')
+                raise
+            except Exception as e:
+                last_error = e
+                msg = str(e)
+                if '429' in msg or 'Too Many Requests' in msg:
+                    metrics.STAGE_ERRORS.inc(stage='translate_call', reason='rate_limited')
+                    print("  ⚠️  Rate limit, waiting 3 seconds...")
+                    self.limiter.penalize(3)
+                elif 'TKK' in msg or 'token' in msg.lower():
+                    metrics.STAGE_ERRORS.inc(stage='translate_call', reason='token')
+                    print("  ⚠️  TKK token issue, resetting translator...")
+                    self.backend.reset()
+                else:
+                    metrics.STAGE_ERRORS.inc(stage='translate_call', reason='error')
+                    print(f"  ⚠️  Translation error (attempt {attempt}/{self.max_retries}): {msg[:100]}")
+                    if attempt < self.max_retries:
+                        time.sleep(0.5 * 2 ** (attempt - 1))  # Exponential backoff: 0.5s, 1s, 2s...
+        msg = str(last_error)
+        if '429' in msg or 'Too Many Requests' in msg or 'blocked' in msg.lower():
+            raise RateLimitedError(msg)
+        raise TranslationError(msg)
+
+    def _translate_batch(self, batch: List[str], source: str, target: str) -> Dict[str, str]:
+        """Dịch một lô; nếu số dòng trả về không khớp thì dịch lại từng dòng"""
+        if len(batch) > 1:
+            try:
+                parts = self._call(LINE_DELIMITER.join(batch), source, target).split(LINE_DELIMITER)
+                if len(parts) == len(batch):
+                    return {src: dst.strip() for src, dst in zip(batch, parts)}
+                print(f"  ⚠️  Batch split mismatch ({len(parts)}/{len(batch)}), translating line by line")
+            except (TranslationUnavailableError, RateLimitedError):
+                raise
+            except TranslationError as e:
+                print(f"  ⚠️  Batch failed: {e}, translating line by line")
+        results = {}
+        for text in batch:
+            try:
+                results[text] = self._call(text, source, target).strip()
+            except (TranslationUnavailableError, RateLimitedError):
+                raise
+            except TranslationError as e:
+                print(f"  ❌ Failed: {text}: {e}")
+                self.stats['failures'] += 1
+        return results
+
+    # ------------------------------------------------------------------ #
+    def translate_lines(self, lines: List[str], source: str = 'en', target: str = 'vi') -> List[str]:
+        """
+        Dịch danh sách dòng, giữ nguyên vị trí.
+        Dòng trống -> '', dòng dịch lỗi -> '[Lỗi dịch: ...]'
+        """
+        # Xuống dòng bên trong một dòng sẽ làm lệch khi tách lô -> thay bằng khoảng trắng
+        cleaned = [' '.join(line.split()) if isinstance(line, str) else '' for line in lines]
+        unique = [text for text in dict.fromkeys(cleaned) if text]
+
+        found = self._lookup(unique, source, target)
+        missing = [text for text in unique if text not in found]
+        self.stats['hits'] += len(unique) - len(missing)
+        self.stats['misses'] += len(missing)
+        metrics.CACHE_REQUESTS.inc(len(unique) - len(missing), cache='translation', result='hit')
+        metrics.CACHE_REQUESTS.inc(len(missing), cache='translation', result='miss')
+
+        if missing:
+            print(f"🔄 Translating {len(missing)} new lines ({len(unique) - len(missing)} cached)...")
+            for batch in self._batches(missing):
+                results = self._translate_batch(batch, source, target)
+                self._store(results, source, target)
+                found.update(results)
+
+        return [found.get(text, f"[Lỗi dịch: {text}]") if text else '' for text in cleaned]
+
+    def translate_text(self, text: str, source: str = 'en', target: str = 'vi') -> str:
+        """Dịch một đoạn text (có cache), raise TranslationError nếu thất bại"""
+        text = text.strip()
+        found = self._lookup([text], source, target)
+        if text in found:
+            self.stats['hits'] += 1
+            metrics.CACHE_REQUESTS.inc(cache='translation', result='hit')
+            return found[text]
+        self.stats['misses'] += 1
+        metrics.CACHE_REQUESTS.inc(cache='translation', result='miss')
+        result = self._call(text, source, target).strip()
+        self._store({text: result}, source, target)
+        return result
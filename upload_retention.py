@@ -0,0 +1,185 @@
+"""
+Upload Retention - Dọn ảnh upload không còn flashcard nào dùng
+- UploadRefIndex: đếm số flashcard tham chiếu tới mỗi file (trường `image`), cập nhật theo store
+- UploadRetention: thread nền xóa file không được tham chiếu và cũ hơn `ttl`; giới hạn dung lượng uploads/
+"""
+
+import os
+import time
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from flashcard_store import StoreIndex, try_file_lock
+
+
+def upload_name(image_path) -> str:
+    """Tên file trong uploads/ từ trường `image` của flashcard (đường dẫn Windows hoặc POSIX)"""
+    if not image_path:
+        return ''
+    return str(image_path).replace('\\', '/').rsplit('/', 1)[-1]
+
+
+class UploadRefIndex(StoreIndex):
+    """Số flashcard tham chiếu tới mỗi file upload"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def rebuild(self, cards):
+        counts = Counter(upload_name(card.get('image')) for card in cards)
+        counts.pop('', None)
+        with self._lock:
+            self._counts = counts
+
+    def on_change(self, old, new):
+        before = upload_name(old.get('image')) if old else ''
+        after = upload_name(new.get('image')) if new else ''
+        if before == after:
+            return
+        with self._lock:
+            if before:
+                self._counts[before] -= 1
+                if self._counts[before] <= 0:
+                    del self._counts[before]
+            if after:
+                self._counts[after] += 1
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return self._counts.get(name, 0)
+
+
+class UploadRetention:
+    """
+    Thu gom ảnh upload.
+
+    Args:
+        upload_dir: thư mục uploads/
+        refs: UploadRefIndex gắn vào kho flashcard
+        ttl: file không được flashcard nào dùng và cũ hơn ttl giây (theo mtime) thì bị xóa
+        max_bytes: dung lượng tối đa của uploads/; reserve() từ chối upload mới khi vượt.
+            Mỗi process tự đếm dung lượng (đếm lại từ đĩa sau RESCAN_INTERVAL) nên với nhiều worker
+            giới hạn chỉ gần đúng: có thể vượt thêm phần các worker khác vừa ghi từ lần đếm trước
+        sync: hàm gọi trước mỗi lần thu gom để refs mới nhất (FlashcardStore.sync khi nhiều process)
+        on_delete: hàm on_delete(filename) sau khi xóa một file (ví dụ bỏ khỏi chỉ mục ảnh gần trùng)
+    """
+
+    RESCAN_INTERVAL = 60  # Giây; dung lượng đã dùng được đếm lại từ đĩa sau khoảng này
+
+    def __init__(self, upload_dir, refs: UploadRefIndex, ttl: float = 86400,
+                 max_bytes: int = 2 * 1024 * 1024 * 1024, sync: Optional[Callable] = None,
+                 on_delete: Optional[Callable[[str], None]] = None):
+        self.upload_dir = Path(upload_dir)
+        self.refs = refs
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sync = sync
+        self.on_delete = on_delete
+        self._lock = threading.Lock()
+        self._used = 0
+        self._scanned_at = 0.0
+        self._collector = None
+        self._stop = threading.Event()
+
+    def _scan(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.upload_dir) as it:
+                return [entry for entry in it if entry.is_file() and not entry.name.startswith('.')]
+        except FileNotFoundError:
+            return []
+
+    # ------------------------------------------------------------------ #
+    # Quota
+    # ------------------------------------------------------------------ #
+    def usage(self) -> int:
+        """Dung lượng uploads/ (byte), đếm lại từ đĩa nếu lần đếm trước đã cũ"""
+        with self._lock:
+            if time.time() - self._scanned_at > self.RESCAN_INTERVAL:
+                self._used = sum(entry.stat().st_size for entry in self._scan())
+                self._scanned_at = time.time()
+            return self._used
+
+    def reserve(self, size: int) -> bool:
+        """Giữ chỗ cho file mới `size` byte; False nếu vượt max_bytes kể cả sau khi thu gom"""
+        if self.usage() + size > self.max_bytes:
+            self.collect()
+            if self.usage() + size > self.max_bytes:
+                return False
+        with self._lock:
+            self._used += size
+        return True
+
+    def touch(self, name: str):
+        """Đánh dấu file vừa được dùng lại (upload trùng) để tính lại ttl"""
+        try:
+            os.utime(self.upload_dir / name)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------ #
+    # Thu gom
+    # ------------------------------------------------------------------ #
+    def collect(self, dry_run: bool = False, now: Optional[float] = None) -> Dict[str, int]:
+        """Xóa file không được tham chiếu và cũ hơn ttl, trả về {tên file: số byte}"""
+        if self.sync is not None:
+            self.sync()
+        now = time.time() if now is None else now
+        removed, used = {}, 0
+        for entry in self._scan():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if self.refs.count(entry.name) or now - st.st_mtime <= self.ttl:
+                used += st.st_size
+                continue
+            if not dry_run:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    used += st.st_size
+                    continue
+                if self.on_delete is not None:
+                    self.on_delete(entry.name)
+            removed[entry.name] = st.st_size
+        if not dry_run:
+            with self._lock:
+                self._used = used
+                self._scanned_at = time.time()
+        return removed
+
+    def start_collector(self, interval: float = 3600, lock_path=None):
+        """
+        Chạy collect() định kỳ trên thread nền.
+        lock_path (nhiều process, chỉ POSIX): chỉ process giữ được khóa file này (flock không chờ) mới thu gom;
+        các process khác thử lại mỗi chu kỳ và thay thế nếu process đang giữ khóa đã thoát.
+        """
+        if self._collector is not None:
+            return
+
+        def loop():
+            leader = None if lock_path is not None else True
+            try:
+                while not self._stop.wait(interval):
+                    if leader is None:
+                        leader = try_file_lock(lock_path)
+                        if leader is None:
+                            continue
+                    try:
+                        removed = self.collect()
+                        if removed:
+                            print(f"🧹 Removed {len(removed)} unused uploads ({sum(removed.values()) // 1024} KB)")
+                    except Exception as e:
+                        print(f"⚠️  Upload GC failed: {e}")
+            finally:
+                if leader not in (None, True):
+                    leader.close()  # Đóng file -> nhả khóa cho process khác
+
+        self._collector = threading.Thread(target=loop, name='upload-gc', daemon=True)
+        self._collector.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,21 @@
+"""
+WSGI entry point cho chạy thật với nhiều worker process:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Model OCR được nạp một lần trong master process trước khi fork (gunicorn.conf.py bật preload_app),
+các worker dùng chung bộ nhớ model theo copy-on-write. Kho flashcard và trạng thái job được đồng bộ
+giữa các worker qua đĩa (SHARED_STATE).
+"""
+
+import os
+
+# Phải đặt trước khi import app: kho flashcard/hàng đợi job được tạo lúc import
+os.environ.setdefault('SHARED_STATE', 'true')
+
+import app as ocr_app  # noqa: E402
+
+app = ocr_app.app
+
+if os.environ.get('OCR_PRELOAD', 'true').lower() != 'false':
+    ocr_app.preload_ocr()